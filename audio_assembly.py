@@ -0,0 +1,147 @@
+# In-memory audio assembly for synthesized segments
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+_output_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="output-writer")
+
+
+def to_pcm16(samples):
+    # Same peak normalisation XTTS applies when it saves a wav file
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.size == 0:
+        return np.zeros(0, dtype=np.int16)
+    peak = max(0.01, float(np.max(np.abs(samples))))
+    return (samples * (32767 / peak)).astype(np.int16)
+
+
+def silence(duration_ms, sample_rate):
+    return np.zeros(int(sample_rate * duration_ms / 1000), dtype=np.int16)
+
+
+# ---------- Silence Trimming ----------
+# Same results as the pydub loops they replace: audio is cut into chunk_size
+# ms slices on pydub's millisecond grid and a slice counts as sound when its
+# dBFS (integer RMS against full scale) is above silence_thresh. Slice
+# energies are computed a window at a time with NumPy, starting small and
+# doubling, so the cost follows the length of the silence rather than the
+# clip, and the end is scanned in place instead of on a reversed copy.
+
+def _chunk_bounds(length_ms, sample_rate, chunk_size, n):
+    frames_per_ms = sample_rate / 1000.0
+    starts_ms = np.arange(0, length_ms, chunk_size)
+    ends_ms = np.minimum(starts_ms + chunk_size, length_ms)
+    starts = (starts_ms * frames_per_ms).astype(np.int64)
+    ends = (ends_ms * frames_per_ms).astype(np.int64)
+    # pydub pads a short last slice with silence, so divide by the nominal size
+    counts = ends - starts
+    return np.minimum(starts, n), np.minimum(ends, n), counts
+
+
+def _first_loud_ms(samples, bounds, silence_thresh, chunk_size, from_end=False, window=32):
+    starts, ends, counts = bounds
+    n = len(samples)
+    k = 0
+    while k < len(starts):
+        stop = min(k + window, len(starts))
+        lo, hi = starts[k:stop], ends[k:stop]
+        if from_end:
+            # Slice k of audio.reverse() covers these frames of the original
+            lo, hi = n - hi, n - lo
+        base = lo.min()
+        energy = np.zeros(hi.max() - base + 1, dtype=np.float64)
+        np.cumsum(np.square(samples[base:hi.max()], dtype=np.float64), out=energy[1:])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rms = np.floor(np.sqrt((energy[hi - base] - energy[lo - base]) / counts[k:stop]))
+            loud = np.flatnonzero(20 * np.log10(rms / 32768) > silence_thresh)
+        if loud.size:
+            return int(k + loud[0]) * chunk_size
+        k = stop
+        window *= 2
+    return len(starts) * chunk_size
+
+
+def _length_ms(samples, sample_rate):
+    return round(1000 * (len(samples) / sample_rate))
+
+
+def detect_leading_silence(samples, silence_thresh=-40, chunk_size=10, sample_rate=24000):
+    """Milliseconds of silence at the start of int16 ``samples``."""
+    bounds = _chunk_bounds(_length_ms(samples, sample_rate), sample_rate, chunk_size, len(samples))
+    return _first_loud_ms(samples, bounds, silence_thresh, chunk_size)
+
+
+def trim_silence(samples, silence_thresh=-40, chunk_size=10, sample_rate=24000):
+    """Drop leading and trailing silence; returns a view into ``samples``."""
+    length_ms = _length_ms(samples, sample_rate)
+    bounds = _chunk_bounds(length_ms, sample_rate, chunk_size, len(samples))
+    lead = _first_loud_ms(samples, bounds, silence_thresh, chunk_size)
+    trail = _first_loud_ms(samples, bounds, silence_thresh, chunk_size, from_end=True)
+    end_ms = length_ms - trail
+    if end_ms < 0:
+        # The two scans can disagree on a clip that is silent but for one
+        # edge chunk; pydub then reads the negative end from the back
+        end_ms += length_ms
+    frames_per_ms = sample_rate / 1000.0
+    start = int(min(lead, length_ms) * frames_per_ms)
+    end = int(max(end_ms, 0) * frames_per_ms)
+    return samples[start:max(start, min(end, len(samples)))]
+
+
+class AudioAssembler:
+    """Lays out trimmed segments with a leading pause and gaps between them.
+
+    Every segment is rendered into one pre-sized int16 buffer (silence, faded
+    speech, gap) that the caller forwards or collects, so assembly is linear
+    in the total length instead of re-copying the whole story on every
+    append; ``encode_wav`` joins collected chunks once at the end.
+    """
+
+    def __init__(self, sample_rate, lead_ms=500, gap_ms=300, fade_ms=20):
+        self.sample_rate = sample_rate
+        self.rendered = 0
+        self.lead = int(sample_rate * lead_ms / 1000)
+        self.gap = int(sample_rate * gap_ms / 1000)
+        self.fade = int(sample_rate * fade_ms / 1000)
+
+    def render(self, pcm):
+        lead = self.lead if not self.rendered else 0
+        out = np.zeros(lead + len(pcm) + self.gap, dtype=np.int16)
+        body = out[lead:lead + len(pcm)]
+        body[:] = pcm
+        fade = min(self.fade, len(pcm) // 2)
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, endpoint=False, dtype=np.float32)
+            body[:fade] = body[:fade] * ramp
+            body[-fade:] = body[-fade:] * ramp[::-1]
+        self.rendered += 1
+        return out
+
+
+def wav_header(data_size, sample_rate, channels=1, sample_width=2):
+    byte_rate = sample_rate * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b"data", data_size,
+    )
+
+
+def encode_wav(chunks, sample_rate):
+    """Build a 16-bit mono WAV from PCM chunks with a single copy of the samples."""
+    chunks = [memoryview(chunk).cast("B") for chunk in chunks]
+    data_size = sum(len(chunk) for chunk in chunks)
+    return b"".join([wav_header(data_size, sample_rate), *chunks])
+
+
+def save_output_async(path, data):
+    """Write finished audio to disk without holding up the response."""
+    def write():
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return _output_writer.submit(write)
@@ -0,0 +1,150 @@
+# Output encoding of finished story audio (WAV, FLAC, MP3, Opus)
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+from audio_assembly import encode_wav
+
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+# format -> (content type, ffmpeg codec args, ffmpeg container, default kbps)
+FORMATS = {
+    # Resampled WAV comes back as raw PCM: ffmpeg cannot fill in the sizes on a pipe
+    "wav": ("audio/wav", ["-c:a", "pcm_s16le"], "s16le", None),
+    "flac": ("audio/flac", ["-c:a", "flac"], "flac", None),
+    "mp3": ("audio/mpeg", ["-c:a", "libmp3lame"], "mp3", 64),
+    "opus": ("audio/ogg; codecs=opus", ["-c:a", "libopus", "-application", "voip"], "ogg", 32),
+}
+SAMPLE_RATES = {8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000}
+OPUS_SAMPLE_RATES = {8000, 12000, 16000, 24000, 48000}
+
+
+class FfmpegUnavailable(RuntimeError):
+    """ffmpeg cannot be run, so nothing that needs it can be decoded or encoded until it is installed."""
+
+
+def require_ffmpeg():
+    if shutil.which(FFMPEG_BINARY) is None:
+        raise FfmpegUnavailable(f"ffmpeg unavailable: {FFMPEG_BINARY!r} was not found; "
+                                f"install it or set FFMPEG_BINARY")
+
+
+class WavEncoder:
+    """Native-rate WAV needs no encoder process; the header is written at the end."""
+
+    def __init__(self, sample_rate):
+        self.content_type = FORMATS["wav"][0]
+        self.sample_rate = sample_rate
+        self._chunks = []
+
+    def write(self, pcm):
+        self._chunks.append(pcm)
+
+    def finish(self):
+        return encode_wav(self._chunks, self.sample_rate)
+
+    def abort(self):
+        self._chunks = []
+
+
+class FfmpegEncoder:
+    """Streams 16-bit mono PCM through ffmpeg while the story is still being generated.
+
+    ``write`` only queues the PCM: a writer thread feeds ffmpeg's stdin and a
+    reader thread collects its output, so neither the pipeline nor the
+    encoder waits on the other. ``finish`` closes the input and returns the
+    encoded file.
+    """
+
+    def __init__(self, fmt, sample_rate, output_sample_rate, bitrate_kbps):
+        self.content_type, codec, container, default_kbps = FORMATS[fmt]
+        self.fmt = fmt
+        self.output_sample_rate = output_sample_rate
+        command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+                   "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+                   *codec, "-ar", str(output_sample_rate)]
+        if bitrate_kbps or default_kbps:
+            command += ["-b:a", f"{bitrate_kbps or default_kbps}k"]
+        command += ["-f", container, "pipe:1"]
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.PIPE)
+        except OSError as e:
+            raise FfmpegUnavailable(f"ffmpeg unavailable: cannot run {FFMPEG_BINARY!r}: {e}") from e
+        self._pending = queue.Queue()
+        self._output = []
+        self._errors = []
+        self._threads = [
+            threading.Thread(target=self._feed, daemon=True),
+            threading.Thread(target=self._drain, args=(self._process.stdout, self._output), daemon=True),
+            threading.Thread(target=self._drain, args=(self._process.stderr, self._errors), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def write(self, pcm):
+        self._pending.put(pcm)
+
+    def finish(self):
+        self._pending.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {b''.join(self._errors).decode(errors='replace').strip()}")
+        if self.fmt == "wav":
+            return encode_wav(self._output, self.output_sample_rate)
+        return b"".join(self._output)
+
+    def abort(self):
+        self._process.kill()
+        self._pending.put(None)
+
+    def _feed(self):
+        try:
+            while True:
+                pcm = self._pending.get()
+                if pcm is None:
+                    break
+                self._process.stdin.write(pcm)
+        except (BrokenPipeError, ValueError):
+            # ffmpeg exited early; finish() reports its error
+            pass
+        finally:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    @staticmethod
+    def _drain(stream, into):
+        for block in iter(lambda: stream.read(1 << 16), b""):
+            into.append(block)
+
+
+def check_output(fmt, sample_rate, output_sample_rate=0, bitrate_kbps=0):
+    """Raise ValueError for an unsupported output; returns the format and sample rate with defaults filled in.
+
+    Raises FfmpegUnavailable when the output needs ffmpeg and it is not installed.
+    """
+    fmt = (fmt or "wav").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported output_format {fmt!r}; use one of {', '.join(FORMATS)}")
+    output_sample_rate = output_sample_rate or sample_rate
+    allowed = OPUS_SAMPLE_RATES if fmt == "opus" else SAMPLE_RATES
+    if output_sample_rate not in allowed:
+        raise ValueError(f"output_sample_rate {output_sample_rate} is not supported for {fmt}")
+    if bitrate_kbps and not 6 <= bitrate_kbps <= 320:
+        raise ValueError("bitrate_kbps must be between 6 and 320")
+    if fmt != "wav" or output_sample_rate != sample_rate:
+        require_ffmpeg()
+    return fmt, output_sample_rate
+
+
+def create_encoder(fmt, sample_rate, output_sample_rate=0, bitrate_kbps=0):
+    """Validate the requested output and return an encoder for it; empty fields mean defaults."""
+    fmt, output_sample_rate = check_output(fmt, sample_rate, output_sample_rate, bitrate_kbps)
+    if fmt == "wav" and output_sample_rate == sample_rate:
+        return WavEncoder(sample_rate)
+    return FfmpegEncoder(fmt, sample_rate, output_sample_rate, bitrate_kbps)
@@ -0,0 +1,94 @@
+# Wall time and peak RSS of story assembly: temp files + pydub appends vs in-memory
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import wave
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio_assembly
+from audio_assembly import AudioAssembler, encode_wav, to_pcm16
+
+SAMPLE_RATE = 24000
+SEGMENTS = int(os.environ.get("BENCH_SEGMENTS", "400"))
+SEGMENT_SECONDS = 2.5
+
+
+def fake_segments():
+    # Speech-like noise with quiet padding at both ends, as XTTS returns it
+    rng = np.random.default_rng(0)
+    pad = np.zeros(int(0.2 * SAMPLE_RATE), dtype=np.float32)
+    for _ in range(SEGMENTS):
+        speech = rng.normal(0, 0.2, int(SEGMENT_SECONDS * SAMPLE_RATE)).astype(np.float32)
+        yield np.concatenate([pad, speech, pad])
+
+
+def detect_leading_silence(sound, silence_thresh=-40, chunk_size=10):
+    trim_ms = 0
+    while trim_ms < len(sound):
+        if sound[trim_ms:trim_ms + chunk_size].dBFS > silence_thresh:
+            return trim_ms
+        trim_ms += chunk_size
+    return trim_ms
+
+
+def trim_silence(audio, silence_thresh=-40, chunk_size=10):
+    start = detect_leading_silence(audio, silence_thresh, chunk_size)
+    end = detect_leading_silence(audio.reverse(), silence_thresh, chunk_size)
+    return audio[start:len(audio) - end]
+
+
+def write_wav(path, samples):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(to_pcm16(samples).tobytes())
+
+
+def run_legacy(workdir):
+    combined = AudioSegment.silent(duration=500)
+    for samples in fake_segments():
+        temp_filename = os.path.join(workdir, f"temp_{uuid.uuid4().hex}.wav")
+        write_wav(temp_filename, samples)
+        audio = AudioSegment.from_wav(temp_filename)
+        audio = trim_silence(audio).fade_in(20).fade_out(20)
+        combined += audio + AudioSegment.silent(duration=300)
+        os.remove(temp_filename)
+    final_path = os.path.join(workdir, "story.wav")
+    combined.export(final_path, format="wav")
+    with open(final_path, "rb") as f:
+        return f.read()
+
+
+def run_in_memory(workdir):
+    assembler = AudioAssembler(SAMPLE_RATE)
+    chunks = [assembler.render(audio_assembly.trim_silence(to_pcm16(samples), sample_rate=SAMPLE_RATE))
+              for samples in fake_segments()]
+    return encode_wav(chunks, SAMPLE_RATE)
+
+
+def child(mode):
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        data = {"legacy": run_legacy, "in_memory": run_in_memory}[mode](workdir)
+        elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<10} wall={elapsed:7.2f}s peak_rss={peak_mb:7.1f}MB output={len(data) / 1e6:.1f}MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        child(sys.argv[1])
+    else:
+        print(f"{SEGMENTS} segments of ~{SEGMENT_SECONDS}s")
+        # Separate processes so each mode reports its own peak RSS
+        for mode in ("legacy", "in_memory"):
+            subprocess.run([sys.executable, __file__, mode], check=True)
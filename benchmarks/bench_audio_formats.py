@@ -0,0 +1,75 @@
+# Payload size and encode time per output format on a medium and a long story
+#
+# The "story" is the bundled reference voices (real speech) resampled to the
+# XTTS rate and looped to length, fed to the encoder in 3 s segments the way
+# collect_story does. By default segments are fed as fast as possible, so
+# encode_s is the encoder's full cost. With BENCH_PACE_RTF=0.2 each segment
+# arrives after 0.2x its duration, like XTTS output, and tail_s shows what is
+# left to encode once the last segment is in: the only part a client waits for.
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_encoding import FORMATS, create_encoder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RATE = 24000
+STORIES = {"medium": 4 * 60, "long": 9 * 60}
+SEGMENT_SECONDS = 3
+PACE_RTF = float(os.environ.get("BENCH_PACE_RTF", "0"))
+OUTPUTS = [("wav", 0, 0)] + [(fmt, 0, 0) for fmt in FORMATS if fmt != "wav"] + [("opus", 0, 16), ("mp3", 16000, 32)]
+
+
+def speech(seconds):
+    clips = []
+    for name in ("Default Speaker.wav", "Abdullah.wav", "Drake.wav"):
+        clip = AudioSegment.from_wav(os.path.join(ROOT, "voices", name))
+        clip = clip.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+        clips.append(np.frombuffer(clip.raw_data, dtype=np.int16))
+    voice = np.concatenate(clips)
+    return np.resize(voice, int(seconds * SAMPLE_RATE))
+
+
+def encode(pcm, fmt, output_sample_rate, bitrate_kbps):
+    step = SEGMENT_SECONDS * SAMPLE_RATE
+    start = time.perf_counter()
+    encoder = create_encoder(fmt, SAMPLE_RATE, output_sample_rate, bitrate_kbps)
+    for i in range(0, len(pcm), step):
+        time.sleep(PACE_RTF * SEGMENT_SECONDS)
+        encoder.write(pcm[i:i + step].tobytes())
+    fed = time.perf_counter()
+    data = encoder.finish()
+    end = time.perf_counter()
+    return data, end - start, end - fed
+
+
+def main():
+    for story, seconds in STORIES.items():
+        pcm = speech(seconds)
+        wav_size = None
+        for fmt, output_sample_rate, bitrate_kbps in OUTPUTS:
+            data, total, tail = encode(pcm, fmt, output_sample_rate, bitrate_kbps)
+            wav_size = wav_size or len(data)
+            result = {
+                "story": f"{story} ({seconds // 60} min)",
+                "format": fmt,
+                "sample_rate": output_sample_rate or SAMPLE_RATE,
+                "kbps": bitrate_kbps or FORMATS[fmt][3],
+                "bytes": len(data),
+                "vs_wav": round(len(data) / wav_size, 3),
+            }
+            if PACE_RTF:
+                result["tail_s"] = round(tail, 2)
+            else:
+                result["encode_s"] = round(total, 2)
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
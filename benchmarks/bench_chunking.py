@@ -0,0 +1,65 @@
+# Narration synthesis latency and worker memory against TTS chunk size
+#
+# Synthesizes one narration-only story per paragraph level in a single TTS
+# worker: one call per sentence (the streaming path before chunking), as
+# chunks of up to each size in CHUNK_SIZES, and as one call for the whole
+# story (the original path). The stub backend charges a fixed cost per call
+# and a cost that grows with the square of the text length; with
+# BENCH_TTS_BACKEND=xtts the real model is used instead. Each setting gets a
+# fresh worker, so its peak RSS covers that setting only.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_e2e import peak_rss_mb
+from stubs import STORY_WORDS, fake_story
+from server_ms import StorySegmenter, clean_sentence
+from text_chunking import chunk_segments
+from tts_pool import TTSWorkerPool
+
+BACKEND = os.environ.get("BENCH_TTS_BACKEND", "stub")
+STUB_OPTIONS = {"cost": "cpu", "call_seconds": 0.15, "compute_per_char": 0.0005, "compute_per_char_squared": 2e-7}
+LANGUAGE = "en"
+SPEAKER = "voices/Default Speaker.wav"
+CHUNK_SIZES = (80, 160, 250)
+
+
+def story_segments(words):
+    segmenter = StorySegmenter(split_dialogues=False)
+    segments = segmenter.feed(fake_story("A girl finds a lost puppy", words, False, 1)) + segmenter.close()
+    return [dict(segment, text=clean_sentence(segment["text"])) for segment in segments]
+
+
+def settings(segments):
+    yield "sentence", [segment["text"] for segment in segments]
+    for size in CHUNK_SIZES:
+        yield f"{size} chars", [chunk["text"] for chunk in chunk_segments(segments, LANGUAGE, max_chars=size)]
+    yield "whole story", [" ".join(segment["text"] for segment in segments)]
+
+
+def run(texts):
+    pool = TTSWorkerPool(backend=BACKEND, workers=1,
+                         backend_options=STUB_OPTIONS if BACKEND == "stub" else {}).start()
+    pool.wait_ready()
+    start = time.perf_counter()
+    first = None
+    for text in texts:
+        pool.synthesize(text, SPEAKER, LANGUAGE, 1.0)
+        first = first or time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    memory = peak_rss_mb(pool.health()[0]["pid"])
+    pool.close()
+    return first, elapsed, memory
+
+
+if __name__ == "__main__":
+    print(f"backend {BACKEND}: {STUB_OPTIONS if BACKEND == 'stub' else ''}")
+    for model, words in STORY_WORDS.items():
+        segments = story_segments(words)
+        print(f"\n{words} words ({model}), {sum(len(segment['text']) for segment in segments)} characters")
+        for name, texts in settings(segments):
+            first, elapsed, memory = run(texts)
+            print(f"{name:<12} {len(texts):3d} calls  first audio {first:6.2f}s  total {elapsed:6.2f}s  "
+                  f"worker peak RSS {memory} MB")
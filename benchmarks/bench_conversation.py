@@ -0,0 +1,59 @@
+# Prompt size over 1,000 sequential requests: global chat_history vs ConversationStore
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation import ConversationStore, estimate_tokens
+
+REQUESTS = 1000
+PROMPT = "You are a creative storyteller writing story narration. " * 12
+
+
+def stub_llm(messages, rng):
+    # Stands in for ollama.chat: returns a ~600 word story and reports the prompt it was sent
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    story = " ".join(rng.choice(["rain", "puppy", "home", "light", "she", "ran"]) for _ in range(600))
+    return story, prompt_chars
+
+
+def legacy(rng):
+    chat_history = []
+    sizes = []
+    for i in range(REQUESTS):
+        chat_history.append({"role": "user", "content": f"{PROMPT}Story {i}"})
+        reply, size = stub_llm(chat_history, rng)
+        chat_history.append({"role": "assistant", "content": reply})
+        sizes.append(size)
+    return sizes
+
+
+def with_store(rng, session_id):
+    store = ConversationStore()
+    sizes = []
+    for i in range(REQUESTS):
+        prompt = f"{PROMPT}Story {i}"
+        messages = store.build_messages(session_id, prompt)
+        reply, size = stub_llm(messages, rng)
+        store.record(session_id, prompt, reply)
+        sizes.append(size)
+    return sizes, store
+
+
+def describe(name, sizes):
+    print(f"{name:<22} request 1: {sizes[0]:>9,} chars   request 100: {sizes[99]:>9,}   "
+          f"request {REQUESTS}: {sizes[-1]:>10,}   max: {max(sizes):>10,}")
+
+
+if __name__ == "__main__":
+    legacy_sizes = legacy(random.Random(0))
+    stateless_sizes, _ = with_store(random.Random(0), "")
+    session_sizes, store = with_store(random.Random(0), "reader-1")
+    describe("global chat_history", legacy_sizes)
+    describe("stateless (default)", stateless_sizes)
+    describe("session, 4096 tokens", session_sizes)
+
+    assert max(stateless_sizes) - min(stateless_sizes) <= len(str(REQUESTS)), "stateless prompt size must not grow"
+    assert max(estimate_tokens("x" * size) for size in session_sizes) <= store.token_budget + 8
+    print(f"stored turns for the session: {store.stats()['turns']}")
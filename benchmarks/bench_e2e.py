@@ -0,0 +1,305 @@
+# End-to-end benchmark: TestCases.json and generated variants through GenerateStory
+#
+# By default Ollama, XTTS, Marian and the emotion classifier are replaced by
+# the deterministic stand-ins in benchmarks/stubs.py, so the run needs no GPU
+# or network; --real uses the actual models instead. Requests go straight to
+# StoryServiceServicer (--transport inproc) or through an in-process gRPC
+# server (--transport grpc). Every request gets its own seed, so the result
+# cache never short-circuits the pipeline.
+#
+# Prints one JSON document with per-stage p50/p95/p99, latency, throughput
+# and peak memory, optionally writes it to --output, and redraws the
+# response-time graph. With --baseline, exits 1 when a p95 got slower than
+# the baseline by more than --tolerance.
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+PORT = 50995
+LEVELS = ("1–3", "4–7", "8+")
+MODES = {False: "Narration Only", True: "Narration + Dialogue"}
+# Differences below this are noise, whatever the relative change
+REGRESSION_FLOOR_SECONDS = 0.02
+# A fresh seed per request keeps the result cache out of the measurement
+seeds = itertools.count()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--transport", choices=("inproc", "grpc"), default="inproc")
+    parser.add_argument("--concurrency", default="1,4", help="comma-separated levels, one run each")
+    parser.add_argument("--requests", type=int, default=0, help="requests per run (default: one per variant)")
+    parser.add_argument("--languages", default="en,es", help="languages to generate variants for")
+    parser.add_argument("--real", action="store_true", help="use Ollama, XTTS and the real models")
+    parser.add_argument("--token-seconds", type=float, default=0.0005, help="stub LLM time per token")
+    parser.add_argument("--tts-seconds-per-char", type=float, default=0.0001, help="stub TTS time per character")
+    parser.add_argument("--classify-seconds", type=float, default=0.002, help="stub classifier time per line")
+    parser.add_argument("--translate-seconds", type=float, default=0.0001, help="stub Marian time per token")
+    parser.add_argument("--output", help="also write the results JSON here")
+    parser.add_argument("--graph", default=os.path.join("benchmarks", "results", "performance_graph.png"),
+                        help="where to draw the response-time graph; empty to skip")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 slowdown")
+    return parser.parse_args()
+
+
+def variants(cases, languages):
+    """Each test case at every paragraph level, in both voice modes and every language."""
+    for case in cases:
+        storyline = re.sub(r'\[PARA_LEVEL:.*?\]', '', case["prompt"]).strip()
+        for level in LEVELS:
+            for include_narration in MODES:
+                for language in languages:
+                    yield dict(case, prompt=f"[PARA_LEVEL:{level}] {storyline}",
+                               include_narration=include_narration, language=language)
+
+
+class LocalContext:
+    """The parts of grpc.aio.ServicerContext the servicer uses, for in-process calls."""
+
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    def time_remaining(self):
+        return None
+
+    def invocation_metadata(self):
+        return ()
+
+    async def send_initial_metadata(self, metadata):
+        pass
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    async def abort(self, code, details, trailing_metadata=()):
+        raise RuntimeError(f"{code.name}: {details}")
+
+
+def peak_rss_mb(pid="self"):
+    # VmHWM is the peak resident set size; only available on Linux
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def summarize(values):
+    from stage_timing import percentile
+
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 0.50), 4),
+        "p95": round(percentile(values, 0.95), 4),
+        "p99": round(percentile(values, 0.99), 4),
+    }
+
+
+async def run_load(call, payloads, concurrency, requests):
+    import server_ms
+    from rest_server import story_request
+    from stage_timing import stage_stats
+
+    stage_stats.reset()
+    tts_before = server_ms.tts_pool.stats()["busy_seconds"]
+    jobs = asyncio.Queue()
+    for i in range(requests):
+        jobs.put_nowait(dict(payloads[i % len(payloads)], seed=next(seeds)))
+    latencies = []
+    by_case = {}
+    failures = []
+    audio_seconds = 0.0
+
+    async def client():
+        nonlocal audio_seconds
+        while not jobs.empty():
+            data = jobs.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await call(story_request(data))
+            except Exception as e:
+                failures.append(str(e))
+                continue
+            elapsed = time.perf_counter() - start
+            if response.message != "success":
+                failures.append(response.message)
+                continue
+            latencies.append(elapsed)
+            audio_seconds += response.duration_seconds
+            level = re.search(r'\[PARA_LEVEL:(.*?)\]', data["prompt"]).group(1)
+            by_case.setdefault(f"{level}|{MODES[data['include_narration']]}", []).append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "failed": len(failures),
+        "errors": sorted(set(failures))[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 2),
+        "latency": summarize(latencies),
+        "stages": stage_stats.summary(),
+        "tts_busy_s": round(server_ms.tts_pool.stats()["busy_seconds"] - tts_before, 3),
+        "by_case": {case: round(sum(values) / len(values), 4) for case, values in sorted(by_case.items())},
+    }
+
+
+async def run(args, payloads):
+    import grpc
+    import server_ms
+    from proto import story_service_pb2_grpc
+
+    from result_cache import ResultCache
+
+    if not args.real:
+        server_ms.tts_pool.backend_options = {"compute_per_char": args.tts_seconds_per_char}
+    # Stories are stored like in production, but not among the real ones in output/
+    cache_dir = tempfile.mkdtemp(prefix="bench-e2e-")
+    server_ms.result_cache = ResultCache(directory=cache_dir)
+    start = time.perf_counter()
+    server_ms.models.start()
+    while not server_ms.models.ready:
+        if server_ms.models.failed:
+            raise RuntimeError(f"models failed to load: {server_ms.models.status()}")
+        await asyncio.sleep(0.05)
+    startup = time.perf_counter() - start
+
+    servicer = server_ms.StoryServiceServicer()
+    server = channel = None
+    if args.transport == "grpc":
+        options = [("grpc.max_send_message_length", server_ms.GRPC_MAX_MESSAGE_MB * 1024 * 1024),
+                   ("grpc.max_receive_message_length", server_ms.GRPC_MAX_MESSAGE_MB * 1024 * 1024)]
+        server = grpc.aio.server(options=options)
+        story_service_pb2_grpc.add_StoryServiceServicer_to_server(servicer, server)
+        server.add_insecure_port(f"127.0.0.1:{PORT}")
+        await server.start()
+        channel = grpc.aio.insecure_channel(f"127.0.0.1:{PORT}", options=options)
+        call = story_service_pb2_grpc.StoryServiceStub(channel).GenerateStory
+    else:
+        async def call(request):
+            return await servicer.GenerateStory(request, LocalContext())
+
+    try:
+        runs = []
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            runs.append(await run_load(call, payloads, concurrency, args.requests or len(payloads)))
+            print(f"⏱️ concurrency {concurrency}: {runs[-1]['throughput_rps']} req/s, "
+                  f"p95 {runs[-1]['latency'].get('p95')}s", file=sys.stderr)
+        memory = {"server_mb": peak_rss_mb(),
+                  "tts_workers_mb": [peak_rss_mb(worker["pid"]) for worker in server_ms.tts_pool.health()]}
+    finally:
+        if channel is not None:
+            await channel.close()
+        if server is not None:
+            await server.stop(0)
+        server_ms.tts_pool.close()
+        server_ms.result_cache.flush()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return {
+        "transport": args.transport,
+        "backends": "real" if args.real else "stub",
+        "variants": len(payloads),
+        "startup_s": round(startup, 3),
+        "peak_rss": memory,
+        "runs": runs,
+    }
+
+
+def draw_graph(results, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ matplotlib is not installed; graph not drawn", file=sys.stderr)
+        return
+    by_case = results["runs"][0]["by_case"]
+    minutes = max(by_case.values(), default=0) >= 120
+    plt.figure(figsize=(8, 5))
+    for mode in MODES.values():
+        times = [by_case.get(f"{level}|{mode}") for level in LEVELS]
+        plt.plot(LEVELS, [t / 60 if minutes and t else t for t in times], marker="o", label=mode)
+    plt.title("Average Response Time vs. Paragraph Range")
+    plt.xlabel("Paragraph Range")
+    plt.ylabel(f"Average Response Time ({'minutes' if minutes else 'seconds'})")
+    plt.grid(True)
+    plt.legend()
+    plt.tight_layout()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    plt.savefig(path)
+    print(f"📈 Graph written to {path}", file=sys.stderr)
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    old_runs = {run["concurrency"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        old = old_runs.get(run["concurrency"])
+        if old is None:
+            continue
+        pairs = [("latency", run["latency"], old["latency"])]
+        pairs += [(name, run["stages"][name], old["stages"].get(name, {})) for name in run["stages"]]
+        for name, new, previous in pairs:
+            if "p95" not in previous:
+                continue
+            if new["p95"] > previous["p95"] * (1 + tolerance) and new["p95"] - previous["p95"] > REGRESSION_FLOOR_SECONDS:
+                found.append(f"concurrency {run['concurrency']} {name} p95 {previous['p95']}s -> {new['p95']}s")
+    return found
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("MAX_QUEUED_REQUESTS", "1000")
+    if not args.real:
+        import stubs
+
+        stubs.install(args.token_seconds, args.classify_seconds, args.translate_seconds)
+        os.environ["TTS_BACKEND"] = "stub"
+
+    with open("TestCases.json", "r") as f:
+        payloads = list(variants(json.load(f), args.languages.split(",")))
+    # The server logs every request; keep stdout for the results
+    with redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args, payloads))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.graph:
+        draw_graph(results, args.graph)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f"❌ Regression: {regression}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Emotion classifier time per story: one call per dialogue line vs one batched call
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emotion
+
+# Dialogue lines of a medium story, with the repeats LLM stories tend to have
+DIALOGUES = [
+    "Oh no, you're soaking wet!",
+    "Come here, little one, I won't hurt you.",
+    "Mom, can we keep him? Please?",
+    "I was so scared I'd never find you.",
+    "Get away from that dog!",
+    "We did it, we're finally home.",
+    "I miss him every single day.",
+    "Please, please don't take him away.",
+] * 3
+STORIES = 5
+
+
+def per_line(lines):
+    classifier = emotion.load_emotion_classifier()
+    return [emotion.map_emotion(classifier(line)[0][0]["label"]) for line in lines]
+
+
+def batched(lines):
+    return [result.emotion for result in emotion.classify_emotions(lines)]
+
+
+if __name__ == "__main__":
+    emotion.load_emotion_classifier()("Warm up.")
+    print(f"{STORIES} stories x {len(DIALOGUES)} dialogue lines, batch size {emotion.EMOTION_BATCH_SIZE}")
+    for name, fn in (("per-line", per_line), ("batched + memo", batched)):
+        timings = []
+        for _ in range(STORIES):
+            start = time.perf_counter()
+            labels = fn(DIALOGUES)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<15} first story={timings[0] * 1000:7.1f}ms  "
+              f"mean={sum(timings) / len(timings) * 1000:7.1f}ms  labels={labels[:3]}")
+    print("stats:", emotion.stats)
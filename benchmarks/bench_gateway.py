@@ -0,0 +1,122 @@
+# REST gateway throughput and tail latency against a stub gRPC backend
+#
+# Starts a stub StoryService (fixed latency, ~1 MB of audio per story) and the
+# gateway under uvicorn, then fires TestCases.json payloads from many
+# concurrent HTTP clients.
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_PORT = 50996
+GATEWAY_PORT = 8996
+BACKEND_LATENCY = 0.05
+AUDIO_BYTES = int(os.environ.get("BENCH_AUDIO_BYTES", 1024 * 1024))
+REQUESTS = 400
+CONCURRENCY = (1, 16, 64)
+
+
+async def run_backend():
+    import grpc
+    from proto import story_service_pb2 as pb
+    from proto import story_service_pb2_grpc as pb_grpc
+
+    class StubStoryService(pb_grpc.StoryServiceServicer):
+        async def GenerateStory(self, request, context):
+            await asyncio.sleep(BACKEND_LATENCY)
+            return pb.StoryResponse(audio=bytes(AUDIO_BYTES), text="Once upon a time.", message="success")
+
+        async def GenerateStoryStream(self, request, context):
+            for i in range(8):
+                await asyncio.sleep(BACKEND_LATENCY / 8)
+                yield pb.StoryChunk(audio=pb.AudioChunk(index=i, pcm=bytes(AUDIO_BYTES // 8), sample_rate=24000))
+
+        async def Ready(self, request, context):
+            return pb.HealthResponse(ready=True, status="ready")
+
+    server = grpc.aio.server(options=[("grpc.max_receive_message_length", 100 * 1024 * 1024)])
+    pb_grpc.add_StoryServiceServicer_to_server(StubStoryService(), server)
+    server.add_insecure_port(f"127.0.0.1:{BACKEND_PORT}")
+    await server.start()
+    await server.wait_for_termination()
+
+
+async def load(concurrency, payloads, headers):
+    import httpx
+
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(REQUESTS):
+        queue.put_nowait(payloads[i % len(payloads)])
+
+    async def client():
+        # One connection per client: a single shared httpx pool becomes the bottleneck
+        async with httpx.AsyncClient(timeout=60) as http:
+            # Connect before the timed requests
+            await http.get(f"http://127.0.0.1:{GATEWAY_PORT}/ready")
+            await drain(http)
+
+    async def drain(http):
+        while not queue.empty():
+            payload = queue.get_nowait()
+            start = time.perf_counter()
+            response = await http.post(f"http://127.0.0.1:{GATEWAY_PORT}/generate-story/", json=payload,
+                                       headers=headers)
+            assert response.status_code == 200, response.text
+            assert len(response.content) >= AUDIO_BYTES
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(1000 * latencies[len(latencies) // 2], 1),
+        "p99_ms": round(1000 * latencies[int(len(latencies) * 0.99) - 1], 1),
+    }
+
+
+def wait_for_gateway():
+    import httpx
+
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{GATEWAY_PORT}/ready").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("gateway did not come up")
+
+
+def main():
+    if sys.argv[1:] == ["backend"]:
+        asyncio.run(run_backend())
+        return
+    with open(os.path.join(ROOT, "TestCases.json"), "r") as f:
+        payloads = json.load(f)
+    env = dict(os.environ, GRPC_SERVER_ADDRESS=f"127.0.0.1:{BACKEND_PORT}")
+    backend = subprocess.Popen([sys.executable, os.path.abspath(__file__), "backend"], cwd=ROOT)
+    gateway = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "rest_server:app", "--port", str(GATEWAY_PORT), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        wait_for_gateway()
+        for mode, headers in (("multipart", {}), ("streamed wav", {"Accept": "audio/wav"})):
+            for concurrency in CONCURRENCY:
+                print(json.dumps(dict(asyncio.run(load(concurrency, payloads, headers)), mode=mode)))
+    finally:
+        gateway.terminate()
+        backend.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# Accuracy, latency and memory of the cpu-int8 inference profile against fp32
+#
+# Each profile loads the real emotion classifier and MarianMT models in its
+# own process, so peak RSS covers that profile only; cpu-int8 runs twice, the
+# second time from the quantized models cached by the first. The int8 labels
+# and translations are compared with fp32: label agreement, and chrF between
+# the two translations of each line. Exits 1 when either falls below the
+# thresholds. Needs torch and transformers, and the models download on the
+# first run.
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LANGUAGES = os.environ.get("BENCH_LANGUAGES", "es,fr,de").split(",")
+REPEATS = int(os.environ.get("BENCH_REPEATS", "5"))
+MIN_AGREEMENT = float(os.environ.get("BENCH_MIN_AGREEMENT", "0.9"))
+MIN_CHRF = float(os.environ.get("BENCH_MIN_CHRF", "0.85"))
+LINES = [
+    "I am so happy you are here!",
+    "I am scared, please stay with me.",
+    "This is not fair, give it back!",
+    "I miss you every single day.",
+    "We did it, we really did it!",
+    "Why would anyone do this?",
+    "Get out of my house right now.",
+    "That smell is absolutely disgusting.",
+    "I can't believe you remembered my birthday.",
+    "Please don't leave me alone in the dark.",
+    "You lied to me, and I trusted you.",
+    "Look, the sun is finally coming out.",
+    "I don't know what to say anymore.",
+    "Wait, did you hear that noise?",
+    "Thank you for everything you have done for us.",
+    "He never came back from the war.",
+    "Mia ran home through the rain, her shoes soaked and her heart pounding.",
+    "The old lighthouse keeper climbed the stairs one last time.",
+    "Under the bridge, a small puppy shivered in the cold.",
+    "The whole village gathered in the square to watch the fireworks.",
+    "She opened the letter slowly, afraid of what it might say.",
+    "By morning, the storm had passed and the fields were quiet again.",
+    "The scientist stared at the results, unable to believe her eyes.",
+    "Years later, they still told the story of that winter night.",
+]
+
+
+def peak_rss_mb():
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def timed(call):
+    call()
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def worker():
+    # INFERENCE_PROFILE is read on import, so the parent sets it per process
+    import emotion
+    import translation
+
+    start = time.perf_counter()
+    emotion.load_emotion_classifier()
+    for language in LANGUAGES:
+        with translation.translation_model("en", language):
+            pass
+    load_seconds = time.perf_counter() - start
+
+    # Memoization would turn the repeats into cache hits
+    translation.translation_cache = translation.TranslationCache(max_entries=0)
+
+    def classify(lines):
+        emotion._cache.clear()
+        return emotion.classify_emotions(lines)
+
+    results = {
+        "load_s": round(load_seconds, 2),
+        "labels": [result.label for result in classify(LINES)],
+        "translations": {language: translation.translate_batch(LINES, "en", language) for language in LANGUAGES},
+        "emotion_batch_ms": timed(lambda: classify(LINES[:16])),
+        "emotion_single_ms": timed(lambda: classify(LINES[:1])),
+        "translation_batch_ms": timed(lambda: translation.translate_batch(LINES[:16], "en", LANGUAGES[0])),
+        "translation_single_ms": timed(lambda: translation.translate_batch(LINES[16:17], "en", LANGUAGES[0])),
+    }
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(results))
+
+
+def run(profile, cache_dir):
+    env = dict(os.environ, INFERENCE_PROFILE=profile, QUANTIZED_MODEL_DIR=cache_dir, TRANSFORMERS_VERBOSITY="error")
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker"], env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def chrf(hypothesis, reference, order=6, beta=2.0):
+    """Character n-gram F-score (chrF), 0..1."""
+    def grams(text, n):
+        text = text.replace(" ", "")
+        return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+    precisions, recalls = [], []
+    for n in range(1, order + 1):
+        hyp, ref = grams(hypothesis, n), grams(reference, n)
+        overlap = sum((hyp & ref).values())
+        if hyp:
+            precisions.append(overlap / sum(hyp.values()))
+        if ref:
+            recalls.append(overlap / sum(ref.values()))
+    precision = statistics.mean(precisions) if precisions else 0.0
+    recall = statistics.mean(recalls) if recalls else 0.0
+    if not precision + recall:
+        return 0.0
+    return (1 + beta ** 2) * precision * recall / (beta ** 2 * precision + recall)
+
+
+def main():
+    cache_dir = tempfile.mkdtemp(prefix="bench-int8-")
+    runs = {
+        "fp32": run("fp32", cache_dir),
+        "cpu-int8 (converting)": run("cpu-int8", cache_dir),
+        "cpu-int8 (cached)": run("cpu-int8", cache_dir),
+    }
+    print(f"{'profile':<22} {'load':>7} {'emotion x16':>12} {'emotion x1':>11} "
+          f"{'translate x16':>14} {'translate x1':>13} {'peak RSS':>9}")
+    for name, result in runs.items():
+        print(f"{name:<22} {result['load_s']:6.1f}s {result['emotion_batch_ms']:10.1f}ms {result['emotion_single_ms']:9.1f}ms "
+              f"{result['translation_batch_ms']:12.1f}ms {result['translation_single_ms']:11.1f}ms {result['peak_rss_mb']:7.0f}MB")
+
+    reference, quantized = runs["fp32"], runs["cpu-int8 (cached)"]
+    agreement = sum(a == b for a, b in zip(reference["labels"], quantized["labels"])) / len(LINES)
+    print(f"\nEmotion label agreement with fp32: {agreement:.1%}")
+    failed = agreement < MIN_AGREEMENT
+    for language in LANGUAGES:
+        scores = [chrf(hyp, ref) for hyp, ref in zip(quantized["translations"][language], reference["translations"][language])]
+        identical = sum(hyp == ref for hyp, ref in zip(quantized["translations"][language], reference["translations"][language]))
+        print(f"en-{language} chrF vs fp32: mean {statistics.mean(scores):.3f}, min {min(scores):.3f}, "
+              f"{identical}/{len(LINES)} identical")
+        failed |= statistics.mean(scores) < MIN_CHRF
+    if failed:
+        print(f"❌ cpu-int8 is below the accuracy thresholds (agreement {MIN_AGREEMENT:.0%}, chrF {MIN_CHRF})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        worker()
+    else:
+        main()
@@ -0,0 +1,127 @@
+# Mixed paragraph levels against an Ollama stand-in that charges for model swaps
+#
+# The stand-in behaves like Ollama with room for one model: requests are
+# taken in arrival order, a request for another model waits until running
+# generations finish, then pays SWAP_SECONDS to load it. A request whose
+# system prompt was the last one evaluated on the loaded model skips its
+# prompt evaluation, like Ollama's prompt cache. Compares sending every
+# request straight to it ("direct") with going through LLMScheduler.
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_scheduler import LLMScheduler
+
+SWAP_SECONDS = float(os.environ.get("BENCH_SWAP_SECONDS", "1.0"))
+PROMPT_SECONDS = 0.15
+PARALLEL = 2
+CLIENTS = 12
+REQUESTS = 48
+# Generation time per model, scaled down from the real paragraph levels
+GENERATE_SECONDS = {"llama3.2:1b": 0.3, "mistral:7b-instruct": 0.6, "llama3": 0.8}
+MAX_WAIT = 10.0
+
+
+class SwapCostOllama:
+    def __init__(self):
+        self.loaded = None
+        self.loading = False
+        self.running = 0
+        self.cached_system = None
+        self.swaps = 0
+        self.prefix_hits = 0
+        self._arrivals = deque()
+        self._cond = threading.Condition()
+
+    def chat(self, model, messages, options=None, stream=False, keep_alive=None):
+        self._start(model)
+        try:
+            if messages:
+                with self._cond:
+                    cached = self.cached_system == (model, messages[0]["content"])
+                    self.prefix_hits += cached
+                    self.cached_system = (model, messages[0]["content"])
+                time.sleep((0 if cached else PROMPT_SECONDS) + GENERATE_SECONDS[model])
+        finally:
+            with self._cond:
+                self.running -= 1
+                if keep_alive == 0 and not self.running:
+                    self.loaded = self.cached_system = None
+                self._cond.notify_all()
+
+    def _start(self, model):
+        ticket = object()
+        with self._cond:
+            self._arrivals.append(ticket)
+            while True:
+                # Arrival order, so a request for another model holds up the ones behind it
+                if self._arrivals[0] is ticket and not self.loading:
+                    if self.loaded == model and self.running < PARALLEL:
+                        break
+                    if self.loaded != model and not self.running:
+                        self.loading = True
+                        break
+                self._cond.wait()
+            self._arrivals.popleft()
+            loading = self.loading
+            self._cond.notify_all()
+        if loading:
+            time.sleep(SWAP_SECONDS)
+            with self._cond:
+                self.loaded, self.loading, self.cached_system = model, False, None
+                self.swaps += 1
+        with self._cond:
+            self.running += 1
+            self._cond.notify_all()
+
+
+def run(mode):
+    ollama = SwapCostOllama()
+    scheduler = LLMScheduler(parallel=PARALLEL, max_wait=MAX_WAIT,
+                             preload=lambda model, keep_alive: ollama.chat(model, [], keep_alive=keep_alive))
+    rng = random.Random(3)
+    workload = deque(rng.choice(list(GENERATE_SECONDS)) for _ in range(REQUESTS))
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                if not workload:
+                    return
+                model = workload.popleft()
+            messages = [{"role": "system", "content": f"instructions for {model}"}, {"role": "user", "content": "story"}]
+            start = time.perf_counter()
+            if mode == "direct":
+                ollama.chat(model, messages)
+            else:
+                with scheduler.slot(model) as keep_alive:
+                    ollama.chat(model, messages, keep_alive=keep_alive)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{mode:<10} {elapsed:6.1f}s total  {REQUESTS / elapsed:5.2f} req/s  "
+          f"p50 {latencies[len(latencies) // 2]:5.2f}s  p95 {latencies[int(len(latencies) * 0.95)]:5.2f}s  "
+          f"max {latencies[-1]:5.2f}s  swaps {ollama.swaps:3d}  prompt cache hits {ollama.prefix_hits}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print(f"{REQUESTS} requests from {CLIENTS} clients, {len(GENERATE_SECONDS)} models, "
+          f"{SWAP_SECONDS:.1f}s per swap, {PARALLEL} parallel generations")
+    direct = run("direct")
+    scheduled = run("scheduled")
+    print(f"Speed-up: {direct / scheduled:.2f}x")
@@ -0,0 +1,96 @@
+# Story time with the per-segment stages run one after another vs overlapped
+#
+# Generates one story per paragraph level, with dialogue and translated to
+# Spanish, through GenerateStory: first with TTS_LOOKAHEAD=0, where each
+# segment is classified, translated, synthesized, trimmed and encoded before
+# the next one starts, then with BENCH_LOOKAHEAD. The stand-ins for the LLM,
+# classifier, Marian and XTTS cost per unit what the real models do on a GPU
+# box, divided by BENCH_SCALE so the run takes seconds; trimming and FLAC
+# encoding are real and not scaled. Reports the time per story, the
+# speed-up, and each stage's busy share of the wall time, with the TTS
+# worker's from the pool.
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_e2e import LEVELS, ROOT
+
+SCALE = float(os.environ.get("BENCH_SCALE", "20"))
+LOOKAHEAD = int(os.environ.get("BENCH_LOOKAHEAD", "2"))
+# Seconds per unit at full scale: LLM token, classified line, Marian token per
+# sentence in the batch, synthesized character
+COSTS = {"token": 0.025, "classify": 0.03, "translate": 0.002,
+         "tts_char": float(os.environ.get("BENCH_TTS_SECONDS_PER_CHAR", "0.045"))}
+PROMPT = "A lonely lighthouse keeper finds a message in a bottle"
+
+
+async def run(lookahead, seeds):
+    import server_ms
+    from proto import story_service_pb2
+    from request_control import CancelToken
+    from stage_timing import stage_stats
+
+    server_ms.TTS_LOOKAHEAD = lookahead
+    results = {}
+    utilization = {}
+    for level in LEVELS:
+        request = story_service_pb2.StoryRequest(
+            prompt=f"[PARA_LEVEL:{level}] {PROMPT}", speaker_audio="voices/Default Speaker.wav", emotion="neutral",
+            speed=1.0, language="es", include_narration=True, output_format="flac", seed=next(seeds)
+        )
+        stage_stats.reset()
+        busy_before = server_ms.tts_pool.stats()["busy_seconds"]
+        start = time.perf_counter()
+        await asyncio.to_thread(server_ms.collect_story, request, CancelToken())
+        results[level] = time.perf_counter() - start
+        # One request since the reset, so the means are its own stage times
+        stages = {name: values["mean"] for name, values in stage_stats.summary().items()}
+        total = stages.pop("total")
+        utilization[level] = {name: seconds / total for name, seconds in stages.items()}
+        utilization[level]["tts_worker"] = (server_ms.tts_pool.stats()["busy_seconds"] - busy_before) / total
+    return results, utilization
+
+
+async def main():
+    import server_ms
+    from result_cache import ResultCache
+
+    server_ms.tts_pool.backend_options = {"compute_per_char": COSTS["tts_char"] / SCALE}
+    server_ms.result_cache = ResultCache(directory=tempfile.mkdtemp(prefix="bench-pipelining-"))
+    server_ms.models.start()
+    while not server_ms.models.ready:
+        await asyncio.sleep(0.05)
+    seeds = itertools.count()
+    try:
+        runs = {lookahead: await run(lookahead, seeds) for lookahead in (0, LOOKAHEAD)}
+    finally:
+        server_ms.tts_pool.close()
+    return runs
+
+
+if __name__ == "__main__":
+    import stubs
+
+    os.chdir(ROOT)
+    stubs.install(COSTS["token"] / SCALE, COSTS["classify"] / SCALE, COSTS["translate"] / SCALE)
+    os.environ["TTS_BACKEND"] = "stub"
+    with redirect_stdout(sys.stderr):
+        runs = asyncio.run(main())
+    sequential, pipelined = runs[0][0], runs[LOOKAHEAD][0]
+    print(f"stub costs / {SCALE:g}: {COSTS}")
+    print(f"{'level':<6} {'sequential':>11} {'lookahead ' + str(LOOKAHEAD):>12} {'speed-up':>9}")
+    for level in LEVELS:
+        print(f"{level:<6} {sequential[level]:10.2f}s {pipelined[level]:11.2f}s {sequential[level] / pipelined[level]:8.2f}x")
+    total = sum(sequential.values()) / sum(pipelined.values())
+    print(f"{'all':<6} {sum(sequential.values()):10.2f}s {sum(pipelined.values()):11.2f}s {total:8.2f}x")
+    for lookahead, (_, utilization) in runs.items():
+        print(f"\nBusy share of wall time, lookahead {lookahead}:")
+        stages = sorted({name for shares in utilization.values() for name in shares})
+        print(f"{'level':<6} " + " ".join(f"{name:>11}" for name in stages))
+        for level in LEVELS:
+            print(f"{level:<6} " + " ".join(f"{utilization[level].get(name, 0):11.2f}" for name in stages))
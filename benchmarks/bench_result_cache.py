@@ -0,0 +1,75 @@
+# Replays TestCases.json-style traffic through ResultCache with a stub pipeline
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache, result_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_SECONDS = 0.5
+AUDIO_BYTES = 2 * 24000 * 60  # a minute of 24 kHz int16
+CLIENTS = 8
+ROUNDS = 3
+
+computed = 0
+computed_lock = threading.Lock()
+
+
+def stub_pipeline(case):
+    global computed
+    time.sleep(PIPELINE_SECONDS)
+    with computed_lock:
+        computed += 1
+    return f"Story for {case['prompt']}", bytes(AUDIO_BYTES)
+
+
+def serve(cache, case):
+    key = result_key(**case)
+    entry, lease = cache.acquire(key)
+    if entry is not None:
+        return cache.read_audio(entry)
+    with lease:
+        text, audio = stub_pipeline(case)
+        lease.complete(text, audio, name="case")
+        return audio
+
+
+def main():
+    with open(os.path.join(ROOT, "TestCases.json"), "r") as f:
+        cases = json.load(f)
+    cases = [{k: v for k, v in case.items() if not isinstance(v, (dict, list))} for case in cases]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(directory=directory, max_bytes=8 * AUDIO_BYTES)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(CLIENTS) as pool:
+            for _ in range(ROUNDS):
+                # Every client sends every case at the same time
+                results = list(pool.map(lambda case: serve(cache, case), cases * CLIENTS))
+                assert all(len(audio) == AUDIO_BYTES for audio in results)
+        elapsed = time.perf_counter() - start
+        requests = len(cases) * CLIENTS * ROUNDS
+        print(f"{requests} requests over {len(cases)} distinct cases, {CLIENTS} concurrent copies each")
+        print(f"pipeline runs: {computed} (without the cache: {requests})")
+        print(f"wall time: {elapsed:.2f}s (uncached serial estimate: {requests * PIPELINE_SECONDS:.0f}s)")
+        print(json.dumps(cache.stats(), indent=2))
+        cache.flush()
+        files = sorted(os.listdir(directory))
+        print(f"files on disk: {len(files)} (limit {cache.max_bytes} bytes)")
+
+        # A fresh cache over the same directory rebuilds its index from the sidecars
+        reopened = ResultCache(directory=directory, max_bytes=8 * AUDIO_BYTES)
+        print(f"entries after restart: {reopened.stats()['entries']}")
+
+        # Shrinking the limit evicts least recently used entries and their files
+        ResultCache(directory=directory, max_bytes=2 * AUDIO_BYTES)
+        print(f"files after shrinking the limit to two minutes of audio: {len(os.listdir(directory))}")
+
+
+if __name__ == "__main__":
+    main()
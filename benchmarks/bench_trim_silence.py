@@ -0,0 +1,87 @@
+# Checks the NumPy silence trimmer against the pydub loop it replaced, then times both
+import os
+import sys
+import timeit
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio_assembly
+
+
+def pydub_detect_leading_silence(sound, silence_thresh=-40, chunk_size=10):
+    trim_ms = 0
+    while trim_ms < len(sound):
+        if sound[trim_ms:trim_ms + chunk_size].dBFS > silence_thresh:
+            return trim_ms
+        trim_ms += chunk_size
+    return trim_ms
+
+
+def pydub_trim_silence(audio, silence_thresh=-40, chunk_size=10):
+    start = pydub_detect_leading_silence(audio, silence_thresh, chunk_size)
+    end = pydub_detect_leading_silence(audio.reverse(), silence_thresh, chunk_size)
+    return audio[start:len(audio) - end]
+
+
+def to_segment(pcm, sample_rate):
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+
+
+def random_clip(rng, sample_rate):
+    # Quiet noise, a loud body with its own quiet gaps, quiet noise again
+    def part(seconds, level):
+        return rng.normal(0, level, int(seconds * sample_rate))
+    clip = np.concatenate([
+        part(rng.uniform(0, 0.5), rng.choice([0, 50, 300])),
+        part(rng.uniform(0, 2.0), rng.choice([200, 3000, 10000])),
+        part(rng.uniform(0, 0.3), 0),
+        part(rng.uniform(0, 1.0), rng.choice([200, 3000, 10000])),
+        part(rng.uniform(0, 0.5), rng.choice([0, 50, 300])),
+    ])
+    return np.clip(clip, -32768, 32767).astype(np.int16)
+
+
+def check_equivalence(cases=300):
+    rng = np.random.default_rng(1)
+    for i in range(cases):
+        sample_rate = int(rng.choice([16000, 22050, 24000, 44100]))
+        chunk_size = int(rng.choice([5, 10, 20]))
+        silence_thresh = float(rng.choice([-50, -40, -30]))
+        pcm = random_clip(rng, sample_rate)
+        segment = to_segment(pcm, sample_rate)
+
+        expected_lead = pydub_detect_leading_silence(segment, silence_thresh, chunk_size)
+        lead = audio_assembly.detect_leading_silence(pcm, silence_thresh, chunk_size, sample_rate)
+        assert lead == expected_lead, (i, lead, expected_lead)
+
+        expected = np.frombuffer(pydub_trim_silence(segment, silence_thresh, chunk_size).raw_data, dtype=np.int16)
+        trimmed = audio_assembly.trim_silence(pcm, silence_thresh, chunk_size, sample_rate)
+        # pydub zero-pads a slice that ends past the last frame; a view cannot
+        assert np.array_equal(trimmed, expected[:len(trimmed)]), i
+        assert not np.any(expected[len(trimmed):]), i
+        assert trimmed.base is pcm or len(trimmed) == 0, i
+    print(f"equivalence: {cases} random clips match the pydub implementation")
+
+
+def benchmark():
+    rng = np.random.default_rng(2)
+    sample_rate = 24000
+    for seconds in (2, 8, 30):
+        pcm = np.concatenate([
+            np.zeros(sample_rate // 2, dtype=np.int16),
+            rng.normal(0, 3000, seconds * sample_rate).astype(np.int16),
+            np.zeros(sample_rate // 2, dtype=np.int16),
+        ])
+        segment = to_segment(pcm, sample_rate)
+        runs = 20
+        old = timeit.timeit(lambda: pydub_trim_silence(segment), number=runs) / runs
+        new = timeit.timeit(lambda: audio_assembly.trim_silence(pcm, sample_rate=sample_rate), number=runs) / runs
+        print(f"{seconds + 1:>3}s clip: pydub={old * 1000:8.2f}ms numpy={new * 1000:7.3f}ms speedup={old / new:6.1f}x")
+
+
+if __name__ == "__main__":
+    check_equivalence()
+    benchmark()
@@ -0,0 +1,74 @@
+# Throughput and added latency of cross-request TTS batching against concurrent clients
+#
+# Each client stands for one request: it synthesizes its segments one after
+# another, as the server's pipeline does, so segments from different clients
+# only meet in the pool's queue. Every client count runs with batching off
+# (max batch 1) and on, in one worker. The stub backend models a GPU, where a
+# batch costs little more than its most expensive segment
+# (BENCH_BATCH_ITEM_COST); with BENCH_TTS_BACKEND=xtts the real model is used.
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_pool import TTSWorkerPool
+
+BACKEND = os.environ.get("BENCH_TTS_BACKEND", "stub")
+CLIENTS = [int(n) for n in os.environ.get("BENCH_CLIENTS", "1,2,4,8").split(",")]
+SEGMENTS_PER_CLIENT = int(os.environ.get("BENCH_SEGMENTS", "12"))
+MAX_BATCH = int(os.environ.get("BENCH_MAX_BATCH", "8"))
+MAX_WAIT = float(os.environ.get("BENCH_BATCH_WAIT_MS", "20")) / 1000
+STUB_OPTIONS = {"cost": "sleep", "call_seconds": 0.05, "compute_per_char": 0.003,
+                "batch_item_cost": float(os.environ.get("BENCH_BATCH_ITEM_COST", "0.15"))}
+TEXTS = [
+    "She knelt down beside the puppy and held out her trembling hand.",
+    "The rain had not stopped for three days.",
+    "\"Come here, little one,\" she whispered.",
+    "Far away, thunder rolled across the hills and the lights of the village flickered.",
+]
+
+
+def run(clients, max_batch):
+    pool = TTSWorkerPool(backend=BACKEND, workers=1, max_batch=max_batch, max_wait=MAX_WAIT,
+                         backend_options=STUB_OPTIONS if BACKEND == "stub" else {}).start()
+    pool.wait_ready()
+    latencies = []
+
+    def client(i):
+        for n in range(SEGMENTS_PER_CLIENT):
+            start = time.perf_counter()
+            pool.synthesize(TEXTS[(i + n) % len(TEXTS)], f"voices/voice{i % 3}.wav", "en", 1.0)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = pool.stats()
+    pool.close()
+    latencies.sort()
+    return {
+        "segments_per_s": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "mean_batch": stats["completed"] / max(stats["batches"], 1),
+    }
+
+
+if __name__ == "__main__":
+    print(f"backend {BACKEND}: {STUB_OPTIONS if BACKEND == 'stub' else ''}, max batch {MAX_BATCH}, "
+          f"max wait {MAX_WAIT * 1000:.0f}ms, {SEGMENTS_PER_CLIENT} segments per client")
+    print(f"{'clients':>7} {'mode':<9} {'segments/s':>10} {'p50':>8} {'p95':>8} {'mean batch':>10} {'added p50':>10}")
+    for clients in CLIENTS:
+        base = run(clients, 1)
+        batched = run(clients, MAX_BATCH)
+        for mode, result in (("unbatched", base), ("batched", batched)):
+            added = result["p50"] - base["p50"]
+            print(f"{clients:>7} {mode:<9} {result['segments_per_s']:10.2f} {result['p50'] * 1000:6.0f}ms "
+                  f"{result['p95'] * 1000:6.0f}ms {result['mean_batch']:10.2f} {added * 1000:+8.0f}ms")
@@ -0,0 +1,40 @@
+# Segment throughput of the TTS worker pool against worker count, using the stub backend
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_pool import TTSWorkerPool
+
+SEGMENT = "She knelt down beside the puppy and held out her trembling hand."
+SEGMENTS = int(os.environ.get("BENCH_SEGMENTS", "48"))
+COMPUTE_PER_CHAR = float(os.environ.get("BENCH_COMPUTE_PER_CHAR", "0.002"))
+
+
+def run(workers):
+    pool = TTSWorkerPool(
+        backend="stub",
+        workers=workers,
+        backend_options={"cost": "cpu", "compute_per_char": COMPUTE_PER_CHAR},
+    ).start()
+    while pool.stats()["ready_workers"] < workers:
+        time.sleep(0.05)
+    # Five request threads, like the gRPC server's executor
+    with ThreadPoolExecutor(max_workers=5) as clients:
+        start = time.perf_counter()
+        results = list(clients.map(
+            lambda i: pool.synthesize(SEGMENT, f"voice{i % 2}.wav", "en", 1.0), range(SEGMENTS)
+        ))
+        elapsed = time.perf_counter() - start
+    pool.close()
+    audio_seconds = sum(len(r) for r in results) / pool.sample_rate
+    print(f"workers={workers:<2} {SEGMENTS / elapsed:6.2f} segments/s  "
+          f"wall={elapsed:6.2f}s  audio={audio_seconds:.0f}s")
+
+
+if __name__ == "__main__":
+    print(f"cpu cores: {os.cpu_count()}, cpu cost per segment: {len(SEGMENT) * COMPUTE_PER_CHAR:.2f}s")
+    for workers in (1, 2, 4):
+        run(workers)
@@ -0,0 +1,117 @@
+# Completion time per paragraph level under each TTS scheduling policy, simulated
+#
+# A discrete-event simulation of one TTS worker serving a mixed stream of
+# short, medium and long stories that arrive at random, at BENCH_LOAD
+# utilization. As in the server, at most MAX_ACTIVE_REQUESTS run at once and
+# the rest wait for a slot in arrival order; completion time includes that
+# wait. Each running request keeps up to BENCH_LOOKAHEAD segments queued and
+# queues the next one when a segment finishes, as the server's pipeline
+# does. Short stories are sent as "interactive", the rest as "standard".
+# The ordering is done by the real SegmentQueue on a simulated clock, so
+# thousands of requests take seconds.
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_control import MAX_ACTIVE_REQUESTS
+from stage_timing import percentile
+from tts_scheduler import EXPECTED_CHARACTERS, POLICIES, TTS_MAX_SEGMENT_WAIT, SegmentQueue, WorkTicket
+
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "2000"))
+LOAD = float(os.environ.get("BENCH_LOAD", "0.85"))
+LOOKAHEAD = int(os.environ.get("BENCH_LOOKAHEAD", "1"))
+MAX_WAIT = float(os.environ.get("BENCH_MAX_SEGMENT_WAIT", str(TTS_MAX_SEGMENT_WAIT)))
+# XTTS on a mid-range GPU: about 50 ms of synthesis per character
+SECONDS_PER_CHAR = 0.05
+LEVEL_MIX = {"short": 0.5, "medium": 0.3, "long": 0.2}
+CHUNK_CHARS = (120, 250)
+
+
+def workload(seed=0):
+    rng = random.Random(seed)
+    mean_chars = sum(share * EXPECTED_CHARACTERS[level] for level, share in LEVEL_MIX.items())
+    interval = mean_chars * SECONDS_PER_CHAR / LOAD
+    now = 0.0
+    requests = []
+    for _ in range(REQUESTS):
+        now += rng.expovariate(1 / interval)
+        level = rng.choices(list(LEVEL_MIX), weights=list(LEVEL_MIX.values()))[0]
+        total = int(EXPECTED_CHARACTERS[level] * rng.uniform(0.8, 1.2))
+        segments = []
+        while total > 0:
+            segments.append(min(total, rng.randint(*CHUNK_CHARS)))
+            total -= segments[-1]
+        requests.append({"arrival": now, "level": level, "segments": segments})
+    return requests
+
+
+def simulate(policy, requests):
+    now = [0.0]
+    queue = SegmentQueue(policy, MAX_WAIT, clock=lambda: now[0])
+    events = [(request["arrival"], 0, "arrive", i) for i, request in enumerate(requests)]
+    heapq.heapify(events)
+    state = [{"next": 0, "queued": 0, "done": 0} for _ in requests]
+    finished = {}
+    gaps = []
+    admitted = []
+    waiting = []
+    job_ids = iter(range(10 ** 9))
+    busy = None
+
+    def queue_segments(i):
+        request, progress = requests[i], state[i]
+        while progress["queued"] < LOOKAHEAD and progress["next"] < len(request["segments"]):
+            chars = request["segments"][progress["next"]]
+            queue.push(next(job_ids), {"text": "x" * chars, "request": i}, request["ticket"])
+            progress["next"] += 1
+            progress["queued"] += 1
+
+    while events:
+        now[0], _, kind, i = heapq.heappop(events)
+        if kind == "arrive":
+            request = requests[i]
+            priority = "interactive" if request["level"] == "short" else "standard"
+            request["ticket"] = WorkTicket(priority, EXPECTED_CHARACTERS[request["level"]])
+            waiting.append(i)
+        else:
+            queue.finish((busy,))
+            busy = None
+            progress = state[i]
+            progress["queued"] -= 1
+            progress["done"] += 1
+            if progress["done"] == len(requests[i]["segments"]):
+                finished[i] = now[0] - requests[i]["arrival"]
+                admitted.remove(i)
+            queue_segments(i)
+        while waiting and len(admitted) < MAX_ACTIVE_REQUESTS:
+            admitted.append(waiting.pop(0))
+            queue_segments(admitted[-1])
+        if busy is None and len(queue):
+            job_id, payload = queue.ordered()[0]
+            ticket = queue.ticket(job_id)
+            gaps.append(now[0] - ticket.served_at)
+            queue.take(job_id)
+            busy = job_id
+            heapq.heappush(events, (now[0] + len(payload["text"]) * SECONDS_PER_CHAR, 1, "done", payload["request"]))
+    return finished, gaps
+
+
+if __name__ == "__main__":
+    requests = workload()
+    print(f"{REQUESTS} requests at {LOAD:.0%} load, {MAX_ACTIVE_REQUESTS} running at once, "
+          f"{SECONDS_PER_CHAR * 1000:.0f} ms/char, lookahead {LOOKAHEAD}, "
+          f"aging after {MAX_WAIT:.0f}s; completion time in minutes")
+    print(f"{'policy':<12} " + " ".join(f"{level + ' p50':>11} {level + ' p99':>11}" for level in LEVEL_MIX)
+          + f" {'longest stall':>13}")
+    for policy in POLICIES:
+        finished, gaps = simulate(policy, [dict(request) for request in requests])
+        cells = []
+        for level in LEVEL_MIX:
+            times = sorted(t for i, t in finished.items() if requests[i]["level"] == level)
+            cells.append(f"{percentile(times, 0.5) / 60:11.1f} {percentile(times, 0.99) / 60:11.1f}")
+        print(f"{policy:<12} " + " ".join(cells) + f" {max(gaps):12.0f}s")
+        # Aging's promise; segment times are exact here, so only rounding is allowed for
+        assert max(gaps) <= MAX_WAIT + 0.01, f"{policy}: a request waited {max(gaps):.1f}s for a segment"
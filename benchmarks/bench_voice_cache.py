@@ -0,0 +1,65 @@
+# Per-segment XTTS latency with and without the voice latent cache
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TTS.api import TTS
+from voice_cache import VoiceLatentCache
+
+SPEAKER = "voices/Default Speaker.wav"
+SEGMENTS = [
+    "The rain had not stopped since morning.",
+    "Lily pulled her hood tighter and ran towards the old bus stop.",
+    "Under the bench, something small was shivering.",
+    "She knelt down and held out her hand.",
+    "The puppy sniffed her fingers and wagged its tail.",
+    "I will take you home with me.",
+]
+
+
+def bench_uncached(tts, out_path):
+    timings = []
+    for text in SEGMENTS:
+        start = time.perf_counter()
+        tts.tts_to_file(text=text, speaker_wav=SPEAKER, language="en", file_path=out_path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_cached(tts, cache, out_path):
+    xtts = tts.synthesizer.tts_model
+    timings = []
+    for text in SEGMENTS:
+        start = time.perf_counter()
+        gpt_cond_latent, speaker_embedding = cache.get(SPEAKER)
+        out = xtts.inference(text, "en", gpt_cond_latent, speaker_embedding, enable_text_splitting=True)
+        tts.synthesizer.save_wav(out["wav"], out_path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    mean = sum(timings) / len(timings)
+    print(f"{name:<22} first={timings[0]:.3f}s mean={mean:.3f}s total={sum(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    device = "cuda" if "--cpu" not in sys.argv else "cpu"
+    tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False).to(device)
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "segment.wav")
+        cache = VoiceLatentCache(tts.synthesizer.tts_model, cache_dir=os.path.join(tmp, "latents"))
+        # Warm up CUDA kernels so the first measured call is not an outlier
+        tts.tts_to_file(text="Warm up.", speaker_wav=SPEAKER, language="en", file_path=out_path)
+
+        report("speaker_wav per call", bench_uncached(tts, out_path))
+        report("cached latents (cold)", bench_cached(tts, cache, out_path))
+        report("cached latents (warm)", bench_cached(tts, cache, out_path))
+
+        # A fresh cache over the same directory exercises the mmap reload path
+        restarted = VoiceLatentCache(tts.synthesizer.tts_model, cache_dir=cache.cache_dir)
+        report("after restart (disk)", bench_cached(tts, restarted, out_path))
+        print("cache stats:", cache.stats(), "restarted:", restarted.stats())
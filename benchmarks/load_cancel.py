@@ -0,0 +1,119 @@
+# Load test: clients that hang up or time out, with and without cancellation propagation
+#
+# Runs the real aio servicer in-process with the stub TTS backend (sleep cost
+# stands in for GPU time) and a fake token stream in place of Ollama. Each
+# mode runs in its own process; "legacy" disables cancellation so every
+# request runs to the end like the old blocking server did.
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLIENTS = 12
+PORT = 50997
+STORY = ('Mia ran home through the rain. She found a small puppy under the bridge. '
+         '"I will keep you safe," she whispered. The puppy wagged its tail. ') * 3
+
+
+def fake_llm(user_input, split_voices, session_id="", seed=None, cancel=None):
+    for word in STORY.split(" "):
+        time.sleep(0.01)
+        yield word + " "
+
+
+async def run_clients(stub, pb):
+    rng = random.Random(7)
+
+    async def client(i):
+        # Half the clients hang up mid-stream, a quarter time out, a quarter wait for the story
+        request = pb.StoryRequest(prompt=f"story {i}", speaker_audio="voices/female.wav", language="en",
+                                  speed=1.0, include_narration=True, session_id=f"load-{i}")
+        start = time.perf_counter()
+        if i % 4 < 2:
+            call = stub.GenerateStoryStream(request)
+            try:
+                await asyncio.wait_for(call.read(), 10)
+                await asyncio.sleep(rng.uniform(0.5, 2.0))
+            finally:
+                call.cancel()
+            return "hung up", time.perf_counter() - start
+        timeout = 2.0 if i % 4 == 2 else None
+        try:
+            await stub.GenerateStory(request, timeout=timeout)
+            return "completed", time.perf_counter() - start
+        except Exception as e:
+            return getattr(e, "code", lambda: type(e).__name__)().__str__(), time.perf_counter() - start
+
+    return await asyncio.gather(*(client(i) for i in range(CLIENTS)))
+
+
+async def run_mode(mode):
+    import grpc
+    import server_ms
+    from proto import story_service_pb2 as pb
+    from proto import story_service_pb2_grpc as pb_grpc
+
+    server_ms.stream_llama3_response = fake_llm
+    if mode == "legacy":
+        server_ms.CancelToken.cancel = lambda self, reason=None: None
+    server_ms.tts_pool.backend_options = {"compute_per_char": 0.004}
+    server_ms.tts_pool.start()
+    server_ms.tts_pool.wait_ready(60)
+
+    server = grpc.aio.server()
+    pb_grpc.add_StoryServiceServicer_to_server(server_ms.StoryServiceServicer(), server)
+    server.add_insecure_port(f"127.0.0.1:{PORT}")
+    await server.start()
+    async with grpc.aio.insecure_channel(f"127.0.0.1:{PORT}") as channel:
+        start = time.perf_counter()
+        outcomes = await run_clients(pb_grpc.StoryServiceStub(channel), pb)
+        clients_done = time.perf_counter() - start
+    # Wait for work the server is still doing for clients that already left
+    while server_ms.admission.active or server_ms.tts_pool.stats()["queued"]:
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(0.5)
+    stats = server_ms.tts_pool.stats()
+    await server.stop(0)
+    server_ms.tts_pool.close()
+    counts = {}
+    for outcome, _ in outcomes:
+        counts[outcome] = counts.get(outcome, 0) + 1
+    return {
+        "mode": mode,
+        "outcomes": counts,
+        "clients_done_s": round(clients_done, 2),
+        "server_idle_s": round(time.perf_counter() - start, 2),
+        "tts_segments": stats["completed"],
+        "tts_busy_s": stats["busy_seconds"],
+        "tts_jobs_dropped": stats["cancelled"],
+    }
+
+
+def main():
+    if len(sys.argv) > 1:
+        os.environ.setdefault("TTS_BACKEND", "stub")
+        print(json.dumps(asyncio.run(run_mode(sys.argv[1]))))
+        return
+    results = []
+    for mode in ("legacy", "cancelling"):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), mode], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             env=dict(os.environ, TTS_BACKEND="stub"))
+        if out.returncode != 0:
+            print(out.stderr)
+            return
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    for result in results:
+        print(json.dumps(result))
+    reclaimed = results[0]["tts_busy_s"] - results[1]["tts_busy_s"]
+    print(f"TTS time reclaimed: {reclaimed:.1f}s of {results[0]['tts_busy_s']:.1f}s "
+          f"({100 * reclaimed / max(results[0]['tts_busy_s'], 1e-9):.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
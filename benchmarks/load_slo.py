@@ -0,0 +1,159 @@
+# Load test: deadline (SLO) attainment under overload, with load-adaptive degradation off and on
+#
+# Runs the real aio servicer in-process over gRPC with the stand-ins from
+# stubs.py and the stub TTS backend (sleep cost stands in for GPU time).
+# Stories arrive at random, short/medium/long at 50/30/20 and half with
+# dialogue, at BENCH_LOAD times what the TTS worker can synthesize. Each
+# carries a client deadline of SLO_SECONDS for its level. Costs are those of a
+# GPU box divided by BENCH_SCALE, and the deadlines with them. A few
+# requests without a deadline calibrate the cost model first. Each mode runs
+# in its own process: "off" (SLO_DEGRADATION=0) serves every admitted
+# request as asked, "on" degrades or rejects requests whose ETA misses.
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PORT = 50996
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "48"))
+LOAD = float(os.environ.get("BENCH_LOAD", "1.5"))
+SCALE = float(os.environ.get("BENCH_SCALE", "40"))
+# Seconds per unit at full scale: LLM token (8B model), classified line,
+# Marian token, synthesized character
+COSTS = {"token": 0.025, "classify": 0.03, "translate": 0.002, "tts_char": 0.045}
+# A 1B model writes about three times as fast as a 7-8B one
+MODEL_SPEED = {"llama3.2:1b": 0.3, "mistral:7b-instruct": 0.9, "llama3": 1.0}
+# Full-scale deadlines, about twice the time the story takes on an idle server
+SLO_SECONDS = {"1–3": 180, "4–7": 300, "8+": 420}
+LEVEL_MIX = {"1–3": 0.5, "4–7": 0.3, "8+": 0.2}
+# Characters the stub LLM writes per paragraph level
+STORY_CHARS = {"1–3": 2000, "4–7": 3400, "8+": 5100}
+PROMPT = "A lonely lighthouse keeper finds a message in a bottle"
+
+
+def story_request(pb, level, dialogue, seed):
+    return pb.StoryRequest(prompt=f"[PARA_LEVEL:{level}] {PROMPT}", speaker_audio="voices/Default Speaker.wav",
+                           emotion="neutral", speed=1.0, language="en", include_narration=dialogue, seed=seed)
+
+
+async def run_clients(stub, pb):
+    rng = random.Random(11)
+    mean_seconds = sum(share * STORY_CHARS[level] for level, share in LEVEL_MIX.items()) * COSTS["tts_char"] / SCALE
+    arrivals = []
+    now = 0.0
+    for i in range(REQUESTS):
+        now += rng.expovariate(LOAD / mean_seconds)
+        level = rng.choices(list(LEVEL_MIX), weights=list(LEVEL_MIX.values()))[0]
+        arrivals.append((now, level, rng.random() < 0.5, 1000 + i))
+    start = time.perf_counter()
+
+    async def client(at, level, dialogue, seed):
+        await asyncio.sleep(max(0.0, at - (time.perf_counter() - start)))
+        deadline = SLO_SECONDS[level] / SCALE
+        sent = time.perf_counter()
+        try:
+            response = await stub.GenerateStory(story_request(pb, level, dialogue, seed), timeout=deadline)
+        except Exception as e:
+            return {"level": level, "outcome": e.code().name.lower(), "seconds": time.perf_counter() - sent}
+        seconds = time.perf_counter() - sent
+        return {"level": level, "outcome": "degraded" if response.degradations else "met", "seconds": seconds,
+                "eta_error": seconds / response.eta_seconds if response.eta_seconds else None,
+                "degradations": list(response.degradations)}
+
+    return await asyncio.gather(*(client(*arrival) for arrival in arrivals))
+
+
+async def run_mode(mode):
+    import grpc
+    import server_ms
+    from proto import story_service_pb2 as pb
+    from proto import story_service_pb2_grpc as pb_grpc
+    from result_cache import ResultCache
+    from stage_timing import percentile
+
+    server_ms.tts_pool.backend_options = {"compute_per_char": COSTS["tts_char"] / SCALE}
+    server_ms.result_cache = ResultCache(directory=server_ms.OUTPUT_DIR, persist=False)
+    server_ms.models.start()
+    while not server_ms.models.ready:
+        await asyncio.sleep(0.05)
+
+    options = [("grpc.max_send_message_length", server_ms.GRPC_MAX_MESSAGE_MB * 1024 * 1024),
+               ("grpc.max_receive_message_length", server_ms.GRPC_MAX_MESSAGE_MB * 1024 * 1024)]
+    server = grpc.aio.server(options=options)
+    pb_grpc.add_StoryServiceServicer_to_server(server_ms.StoryServiceServicer(), server)
+    server.add_insecure_port(f"127.0.0.1:{PORT}")
+    await server.start()
+    try:
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{PORT}", options=options) as channel:
+            stub = pb_grpc.StoryServiceStub(channel)
+            # Calibration: every level in both voice modes, one at a time and without a deadline
+            seed = 0
+            for level in LEVEL_MIX:
+                for dialogue in (False, True):
+                    await stub.GenerateStory(story_request(pb, level, dialogue, seed))
+                    seed += 1
+            calibration = server_ms.costs.stats()
+            results = await run_clients(stub, pb)
+    finally:
+        await server.stop(0)
+        server_ms.tts_pool.close()
+
+    by_level = {}
+    for level in list(LEVEL_MIX) + ["all"]:
+        rows = [r for r in results if level in ("all", r["level"])]
+        counts = {}
+        for row in rows:
+            counts[row["outcome"]] = counts.get(row["outcome"], 0) + 1
+        errors = sorted(r["eta_error"] for r in rows if r.get("eta_error"))
+        by_level[level] = {
+            "requests": len(rows),
+            "attainment": round((counts.get("met", 0) + counts.get("degraded", 0)) / max(len(rows), 1), 3),
+            "outcomes": counts,
+            "p50_actual_over_eta": round(percentile(errors, 0.5), 2),
+        }
+    steps = {}
+    for row in results:
+        for step in row.get("degradations", ()):
+            steps[step] = steps.get(step, 0) + 1
+    return {"mode": mode, "calibration": calibration, "by_level": by_level, "degradation_steps": steps}
+
+
+def main():
+    if len(sys.argv) > 1:
+        import stubs
+
+        os.chdir(ROOT)
+        stubs.install(COSTS["token"] / SCALE, COSTS["classify"] / SCALE, COSTS["translate"] / SCALE, MODEL_SPEED)
+        print(json.dumps(asyncio.run(run_mode(sys.argv[1]))))
+        return
+    results = []
+    for mode in ("off", "on"):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), mode], capture_output=True, text=True,
+                             cwd=ROOT, env=dict(os.environ, TTS_BACKEND="stub", SAVE_OUTPUT_AUDIO="0",
+                                                SLO_DEGRADATION="1" if mode == "on" else "0"))
+        if out.returncode != 0:
+            print(out.stderr)
+            return
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(f"{REQUESTS} requests at {LOAD:g}x TTS capacity, costs and deadlines / {SCALE:g}: {SLO_SECONDS}")
+    print(f"{'mode':<5} {'level':<5} {'attained':>8} {'met':>5} {'degraded':>8} {'rejected':>8} {'missed':>6} "
+          f"{'actual/ETA p50':>14}")
+    for result in results:
+        for level, row in result["by_level"].items():
+            outcomes = row["outcomes"]
+            print(f"{result['mode']:<5} {level:<5} {row['attainment']:8.0%} {outcomes.get('met', 0):5} "
+                  f"{outcomes.get('degraded', 0):8} {outcomes.get('resource_exhausted', 0):8} "
+                  f"{outcomes.get('deadline_exceeded', 0):6} {row['p50_actual_over_eta']:14.2f}")
+    for result in results:
+        print(f"{result['mode']}: degradation steps {result['degradation_steps']}, calibration {result['calibration']}")
+
+
+if __name__ == "__main__":
+    main()
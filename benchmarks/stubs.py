@@ -0,0 +1,140 @@
+# Deterministic local stand-ins for Ollama, Marian and the emotion classifier
+#
+# install() patches them in before server_ms is imported; synthesis uses the
+# stub TTS backend from tts_backends. Each stand-in produces output derived
+# from its input only and spends a configurable amount of time per unit of
+# work, so benchmarks run offline on a CPU-only box and are repeatable.
+import random
+import re
+import time
+import zlib
+from types import SimpleNamespace
+
+import emotion
+import translation
+
+# Words per story for each model select_model() can pick
+STORY_WORDS = {"llama3.2:1b": 350, "mistral:7b-instruct": 600, "llama3": 900}
+VOCABULARY = (
+    "the a small old bright quiet river forest village window door road light rain wind night morning "
+    "girl boy man woman friend dog puppy bird teacher doctor scientist walked ran looked smiled waited "
+    "found lost opened carried whispered remembered slowly gently suddenly finally together home again"
+).split()
+DIALOGUE_LINES = (
+    "I am so happy you are here!", "I am scared, please stay with me.", "This is not fair, give it back!",
+    "I miss you every single day.", "We did it, we really did it!", "Why would anyone do this?",
+)
+LABELS = {"happy": "joy", "scared": "fear", "fair": "anger", "miss": "sadness", "did": "joy", "why": "surprise"}
+
+
+def fake_story(prompt, words, dialogue, seed):
+    rng = random.Random(zlib.crc32(f"{prompt}|{seed}".encode()))
+    sentences = []
+    count = 0
+    while count < words:
+        length = rng.randint(8, 16)
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        count += length
+        if dialogue and rng.random() < 0.15:
+            sentences.append(f'"{rng.choice(DIALOGUE_LINES)}"')
+    return " ".join(sentences)
+
+
+class FakeOllama:
+    """Replacement for ``ollama.chat`` that streams a made-up story one word at a time.
+
+    Stops after ``num_predict`` tokens, like Ollama. ``model_speed`` scales
+    the time per token of each model; models not in it cost ``token_seconds``.
+    """
+
+    def __init__(self, token_seconds=0.0005, model_speed=None):
+        self.token_seconds = token_seconds
+        self.model_speed = model_speed or {}
+        self.calls = 0
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        if not messages:
+            # Preload request
+            return SimpleNamespace(message=SimpleNamespace(content=""))
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        dialogue = any("dialogue must be included" in message["content"] for message in messages)
+        text = fake_story(prompt, STORY_WORDS.get(model, 600), dialogue, (options or {}).get("seed"))
+        tokens = re.findall(r"\S+\s*", text)[:(options or {}).get("num_predict", None)]
+        token_seconds = self.token_seconds * self.model_speed.get(model, 1.0)
+        if not stream:
+            time.sleep(token_seconds * len(tokens))
+            return SimpleNamespace(message=SimpleNamespace(content="".join(tokens)))
+        return self._stream(tokens, token_seconds)
+
+    def _stream(self, tokens, token_seconds):
+        for token in tokens:
+            time.sleep(token_seconds)
+            yield SimpleNamespace(message=SimpleNamespace(content=token))
+
+
+class FakeClassifier:
+    """Keyword-based stand-in for the transformers text-classification pipeline."""
+
+    def __init__(self, item_seconds=0.002):
+        self.item_seconds = item_seconds
+
+    def __call__(self, texts, batch_size=None, truncation=True, max_length=None):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        time.sleep(self.item_seconds * len(texts))
+        outputs = [[self._classify(text)] for text in texts]
+        return outputs[0] if single else outputs
+
+    @staticmethod
+    def _classify(text):
+        for word, label in LABELS.items():
+            if word in text.lower():
+                return {"label": label, "score": 0.9}
+        return {"label": "neutral", "score": 0.6}
+
+
+class _Encoding(dict):
+    def to(self, device):
+        return self
+
+
+class FakeMarianTokenizer:
+    def __call__(self, texts, return_tensors=None, padding=True, truncation=True):
+        return _Encoding(input_ids=list(texts), attention_mask=None)
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return list(outputs)
+
+
+class FakeMarianModel:
+    """Stand-in for MarianMTModel that costs ``token_seconds`` per padded token per batch.
+
+    The batching and padding behaviour of translate_batch therefore shows up
+    in the timings.
+    """
+    device = "cpu"
+
+    def __init__(self, tgt_lang, token_seconds=0.0001):
+        self.tgt_lang = tgt_lang
+        self.token_seconds = token_seconds
+
+    def generate(self, input_ids, attention_mask=None):
+        longest = max(len(text.split()) for text in input_ids)
+        time.sleep(self.token_seconds * longest * len(input_ids))
+        return [f"[{self.tgt_lang}] {text}" for text in input_ids]
+
+
+def install(token_seconds=0.0005, classify_seconds=0.002, translate_seconds=0.0001, model_speed=None):
+    """Patch the stand-ins in; call before importing server_ms."""
+    import ollama
+
+    fake_ollama = FakeOllama(token_seconds, model_speed)
+    ollama.chat = fake_ollama.chat
+    classifier = FakeClassifier(classify_seconds)
+    emotion.load_emotion_classifier = lambda: classifier
+    translation.load_translation_model = lambda src_lang, tgt_lang: (
+        FakeMarianModel(tgt_lang, translate_seconds), FakeMarianTokenizer()
+    )
+    return fake_ollama
@@ -0,0 +1,91 @@
+# Per-session LLM conversation context with a token budget
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "4096"))
+CONVERSATION_MAX_SESSIONS = int(os.environ.get("CONVERSATION_MAX_SESSIONS", "1000"))
+CONVERSATION_TTL = float(os.environ.get("CONVERSATION_TTL", "3600"))
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English LLaMA/Mistral vocabularies
+    return len(text) // 4 + 1
+
+
+class ConversationStore:
+    """Keeps each session's chat history apart and sends only what fits the budget.
+
+    Requests without a session id are stateless: the LLM sees just the new
+    prompt and nothing is stored. With a session id, earlier turns are
+    replayed newest first, in whole user/assistant pairs, until
+    ``token_budget`` is used up. Sessions idle for longer than ``ttl`` and
+    the least recently used ones beyond ``max_sessions`` are dropped.
+    """
+
+    def __init__(self, token_budget=CONVERSATION_TOKEN_BUDGET, max_sessions=CONVERSATION_MAX_SESSIONS,
+                 ttl=CONVERSATION_TTL):
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build_messages(self, session_id, prompt):
+        messages = [{"role": "user", "content": prompt}]
+        if not session_id:
+            return messages
+        budget = self.token_budget - estimate_tokens(prompt)
+        with self._lock:
+            turns = list(self._session(session_id)["turns"])
+        history = []
+        for user, assistant in reversed(turns):
+            cost = estimate_tokens(user) + estimate_tokens(assistant)
+            if cost > budget:
+                break
+            budget -= cost
+            history[:0] = [{"role": "user", "content": user}, {"role": "assistant", "content": assistant}]
+        return history + messages
+
+    def record(self, session_id, prompt, reply):
+        if not session_id:
+            return
+        with self._lock:
+            session = self._session(session_id)
+            session["turns"].append((prompt, reply))
+            # Turns that can never fit the window again are not worth keeping
+            total = 0
+            for i in range(len(session["turns"]) - 1, -1, -1):
+                total += sum(estimate_tokens(part) for part in session["turns"][i])
+                if total > self.token_budget:
+                    del session["turns"][:i + 1]
+                    break
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(s["turns"]) for s in self._sessions.values()),
+            }
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        # Sessions are kept in least recently used order, so expired ones are at the front
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest["last_used"] <= self.ttl:
+                break
+            del self._sessions[oldest_id]
+        session = self._sessions.get(session_id)
+        if session is None:
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+            session = self._sessions[session_id] = {"turns": [], "last_used": now}
+        session["last_used"] = now
+        self._sessions.move_to_end(session_id)
+        return session
@@ -0,0 +1,226 @@
+# Completion-time estimates and load-adaptive degradation for story requests
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
+from tts_scheduler import EXPECTED_CHARACTERS, work_ahead
+
+# Requests with a deadline whose estimate does not fit are degraded step by
+# step, and rejected when even the cheapest plan does not fit; 0 only reports ETAs
+SLO_DEGRADATION = os.environ.get("SLO_DEGRADATION", "1") == "1"
+# Share of the time left before the deadline the estimate may use; the rest absorbs estimation error
+SLO_HEADROOM = float(os.environ.get("SLO_HEADROOM", "0.8"))
+# Weight of each new measurement in the running averages
+COST_MODEL_ALPHA = float(os.environ.get("COST_MODEL_ALPHA", "0.2"))
+
+# Steps in the order they are taken; each plan keeps the steps before it
+DEGRADATIONS = ("no-emotion", "small-model", "shorter")
+# The cheapest model select_model() picks, used by the small-model step
+SMALL_LLM = "llama3.2:1b"
+SHORTER_LEVEL = {"long": "medium", "medium": "short"}
+CHARS_PER_TOKEN = 4
+# Seconds per character until requests have been measured, for a mid-range
+# GPU: LLM per model, TTS per synthesized character, emotion and translation
+# per character of story
+DEFAULT_COSTS = {
+    ("llm", None): 0.006,
+    ("llm", "llama3.2:1b"): 0.002,
+    ("llm", "mistral:7b-instruct"): 0.006,
+    ("llm", "llama3"): 0.007,
+    ("tts", None): 0.05,
+    ("emotion", None): 0.0002,
+    ("translation", None): 0.0005,
+}
+
+_current = contextvars.ContextVar("story_plan", default=None)
+
+
+class StoryPlan:
+    """How one request is generated, and how long it is expected to take.
+
+    Starts as the request asked (``degradations`` empty) and is made cheaper
+    with ``degrade``. ``prompt_level`` picks the prompt, and so the story
+    length, and may be shorter than the request's paragraph level.
+    """
+
+    def __init__(self, level, model, num_predict, split_voices, language, priority="standard"):
+        self.level = level
+        self.prompt_level = level
+        self.model = model
+        self.num_predict = num_predict
+        self.split_voices = split_voices
+        self.language = language
+        self.priority = priority
+        self.degradations = ()
+        self.eta = None
+        self.estimate = None
+        # Whether the estimate came from measured costs rather than DEFAULT_COSTS
+        self.measured = False
+
+    @property
+    def classify_emotions(self):
+        return self.split_voices and "no-emotion" not in self.degradations
+
+    def degrade(self, step):
+        """A copy with ``step`` applied, or None when it would change nothing."""
+        plan = StoryPlan(self.level, self.model, self.num_predict, self.split_voices, self.language, self.priority)
+        plan.prompt_level = self.prompt_level
+        plan.degradations = self.degradations + (step,)
+        if step == "no-emotion" and self.classify_emotions:
+            return plan
+        if step == "small-model" and self.model != SMALL_LLM:
+            plan.model = SMALL_LLM
+            return plan
+        if step == "shorter" and self.prompt_level in SHORTER_LEVEL:
+            plan.prompt_level = SHORTER_LEVEL[self.prompt_level]
+            # A quarter more than the shorter story needs, so it is not cut off mid-sentence
+            plan.num_predict = min(self.num_predict, EXPECTED_CHARACTERS[plan.prompt_level] * 5 // (4 * CHARS_PER_TOKEN))
+            return plan
+        return None
+
+
+def current_plan():
+    return _current.get()
+
+
+@contextmanager
+def planned(plan):
+    """Make ``plan`` the one the story pipeline follows in this context."""
+    token = _current.set(plan)
+    try:
+        yield plan
+    finally:
+        _current.reset(token)
+
+
+class SLOUnreachable(Exception):
+    def __init__(self, eta, budget, overshoot):
+        super().__init__(f"estimated {eta:.0f}s to finish, but the deadline is in {budget:.0f}s")
+        self.eta = eta
+        self.budget = budget
+        # How much less work the server needs before a request like this fits
+        self.overshoot = overshoot
+
+
+class CostModel:
+    """Estimates how long a story takes from its plan and the current load.
+
+    The estimate is the wait for a running slot plus the longer of the LLM
+    (its queue and writing the expected characters) and TTS (the work the
+    scheduler puts ahead of the request plus its own), plus emotion and
+    translation, times a bias factor. Costs per character, story lengths
+    per model and prompt, LLM queue waits and the bias are running averages
+    of finished requests' stage timings, starting from ``DEFAULT_COSTS``.
+    The TTS cost comes from the pool's busy time per synthesized character.
+    """
+
+    def __init__(self, alpha=COST_MODEL_ALPHA, defaults=DEFAULT_COSTS, degrade=SLO_DEGRADATION):
+        self.alpha = alpha
+        self.degrade = degrade
+        self.defaults = dict(defaults)
+        self._rates = {}
+        self._chars = {}
+        self._llm_queue = {}
+        self._bias = 1.0
+        self._tts_mark = None
+        self._lock = threading.Lock()
+        self.observed = 0
+
+    def expected_chars(self, plan):
+        with self._lock:
+            chars = self._chars.get((plan.model, plan.prompt_level, plan.split_voices))
+        if chars is None:
+            chars = EXPECTED_CHARACTERS[plan.prompt_level]
+        return min(chars, plan.num_predict * CHARS_PER_TOKEN)
+
+    def service_seconds(self, plan, tts_workers=1):
+        """Seconds from admission to the last segment, before the bias."""
+        chars = self.expected_chars(plan)
+        with self._lock:
+            llm = self._llm_queue.get(plan.model, 0.0) + chars * self._rate("llm", plan.model)
+            tts_rate = self._rate("tts")
+            prep = chars * self._rate("emotion") if plan.classify_emotions else 0.0
+            if plan.language != "en":
+                prep += chars * self._rate("translation", plan.language)
+        tts = (work_ahead(plan.priority, chars) + chars) * tts_rate / max(1, tts_workers)
+        return max(llm, tts) + prep
+
+    def estimate(self, plan, admission_wait=0.0, tts_workers=1):
+        """Set and return ``plan.eta``, the seconds until the whole story is done."""
+        plan.estimate = self.service_seconds(plan, tts_workers)
+        with self._lock:
+            bias = self._bias
+            plan.measured = ("tts", None) in self._rates
+        plan.eta = admission_wait + bias * plan.estimate
+        return plan.eta
+
+    def choose(self, plan, budget, admission_wait=0.0, tts_workers=1):
+        """The least degraded plan expected to finish within ``budget`` seconds.
+
+        Without a budget, or with ``degrade`` off, ``plan`` itself. Raises
+        SLOUnreachable when even the cheapest plan is expected to miss it.
+        """
+        self.estimate(plan, admission_wait, tts_workers)
+        if budget is None or not self.degrade:
+            return plan
+        target = budget * SLO_HEADROOM
+        for step in DEGRADATIONS:
+            if plan.eta <= target:
+                return plan
+            cheaper = plan.degrade(step)
+            if cheaper is not None:
+                plan = cheaper
+                self.estimate(plan, admission_wait, tts_workers)
+        if plan.eta <= target:
+            return plan
+        raise SLOUnreachable(plan.eta, budget, plan.eta - target)
+
+    def observe(self, plan, timings, story_chars):
+        """Learn from a finished request: its plan, ``StageTimings.as_dict()`` and story length."""
+        if not story_chars or not timings.get("llm"):
+            # Served from the result cache; says nothing about the pipeline
+            return
+        with self._lock:
+            self._update(self._rates, ("llm", plan.model), timings["llm"] / story_chars)
+            self._update(self._chars, (plan.model, plan.prompt_level, plan.split_voices), story_chars)
+            self._update(self._llm_queue, plan.model, timings.get("llm_queue", 0.0))
+            if plan.classify_emotions:
+                self._update(self._rates, ("emotion", None), timings.get("emotion", 0.0) / story_chars)
+            if plan.language != "en":
+                self._update(self._rates, ("translation", plan.language), timings.get("translation", 0.0) / story_chars)
+            if plan.estimate and plan.measured:
+                # Estimates from the defaults can be off by any factor and would skew the bias for long
+                ratio = min(4.0, max(0.25, timings["total"] / plan.estimate))
+                self._bias += self.alpha * (ratio - self._bias)
+            self.observed += 1
+
+    def observe_tts(self, busy_seconds, characters):
+        """Recalibrate the TTS cost from the pool's cumulative busy time and characters synthesized."""
+        with self._lock:
+            if self._tts_mark is not None and characters > self._tts_mark[1]:
+                rate = (busy_seconds - self._tts_mark[0]) / (characters - self._tts_mark[1])
+                self._update(self._rates, ("tts", None), rate)
+            self._tts_mark = (busy_seconds, characters)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "observed": self.observed,
+                "bias": round(self._bias, 3),
+                "seconds_per_char": {"/".join(k for k in key if k): round(rate, 6)
+                                     for key, rate in {**self.defaults, **self._rates}.items()},
+            }
+
+    def _rate(self, kind, key=None):
+        # Measured costs first, so the first measurement replaces the default
+        # rather than being averaged with it; per-model and per-language costs
+        # fall back to the kind's
+        for costs in (self._rates, self.defaults):
+            for k in ((kind, key), (kind, None)):
+                if k in costs:
+                    return costs[k]
+        return 0.0
+
+    def _update(self, values, key, value):
+        values[key] = value if key not in values else values[key] + self.alpha * (value - values[key])
@@ -0,0 +1,126 @@
+# Batched, memoized dialogue emotion classification
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from inference_profile import inference_mode, model_device, prepare_model
+from model_registry import models
+
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+EMOTION_BATCH_SIZE = int(os.environ.get("EMOTION_BATCH_SIZE", "16"))
+EMOTION_MAX_LENGTH = int(os.environ.get("EMOTION_MAX_LENGTH", "512"))
+EMOTION_CACHE_SIZE = int(os.environ.get("EMOTION_CACHE_SIZE", "4096"))
+
+EmotionResult = namedtuple("EmotionResult", ["emotion", "label", "score", "error"])
+
+
+# Load emotion classifier on first use (or from the model registry at startup);
+# TTS worker processes re-import the server module and must not pay for it
+@lru_cache(maxsize=1)
+def load_emotion_classifier():
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+    model = prepare_model(EMOTION_MODEL, lambda: AutoModelForSequenceClassification.from_pretrained(EMOTION_MODEL))
+    return pipeline("text-classification", model=model, tokenizer=AutoTokenizer.from_pretrained(EMOTION_MODEL),
+                    top_k=1, device=model_device())
+
+
+def register_emotion_classifier():
+    """Make the classifier known to the model registry; returns its name there."""
+    # Looked up when the load runs, so benchmarks can swap the loader in
+    models.register("emotion", lambda: load_emotion_classifier(),
+                    warmup=lambda classifier: classifier("What a lovely day!"))
+    return "emotion"
+
+
+def emotion_classifier():
+    """The loaded classifier, from the model registry, for the length of a ``with`` block."""
+    return models.use(register_emotion_classifier())
+
+
+def map_emotion(label):
+    label = label.lower()
+    if label in ["joy", "happiness"]:
+        return "happy"
+    elif label in ["anger"]:
+        return "angry"
+    elif label in ["sadness", "fear", "disgust"]:
+        return "sad"
+    else:
+        return "neutral"
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+stats = {"classified": 0, "cache_hits": 0, "failures": 0}
+
+
+def _cached(text):
+    with _cache_lock:
+        result = _cache.get(text)
+        if result is not None:
+            _cache.move_to_end(text)
+            stats["cache_hits"] += 1
+        return result
+
+
+def _remember(text, result):
+    with _cache_lock:
+        _cache[text] = result
+        while len(_cache) > EMOTION_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _to_result(output):
+    # top_k=1 gives a one-element list per input
+    top = output[0] if isinstance(output, list) else output
+    return EmotionResult(map_emotion(top["label"]), top["label"], float(top["score"]), None)
+
+
+def classify_emotions(texts, batch_size=EMOTION_BATCH_SIZE, max_length=EMOTION_MAX_LENGTH):
+    """Classify many lines in one pipeline call; returns an EmotionResult per input.
+
+    Repeated lines come from a memo. If the batched call fails, the lines
+    are retried one by one so a single bad input only fails itself; failed
+    items come back as neutral with ``error`` set instead of raising.
+    """
+    results = [None] * len(texts)
+    missing = {}
+    for i, text in enumerate(texts):
+        cached = _cached(text)
+        if cached is not None:
+            results[i] = cached
+        else:
+            missing.setdefault(text, []).append(i)
+    if not missing:
+        return results
+
+    pending = list(missing)
+    try:
+        with emotion_classifier() as classifier, inference_mode():
+            outputs = classifier(pending, batch_size=batch_size, truncation=True, max_length=max_length)
+        classified = [_to_result(output) for output in outputs]
+    except Exception:
+        classified = [_classify_one(text, max_length) for text in pending]
+
+    for text, result in zip(pending, classified):
+        if result.error is None:
+            _remember(text, result)
+        with _cache_lock:
+            stats["failures" if result.error else "classified"] += 1
+        for i in missing[text]:
+            results[i] = result
+    return results
+
+
+def _classify_one(text, max_length):
+    try:
+        with emotion_classifier() as classifier, inference_mode():
+            return _to_result(classifier(text, truncation=True, max_length=max_length)[0])
+    except Exception as e:
+        return EmotionResult("neutral", None, 0.0, f"{type(e).__name__}: {e}")
+
+
+def detect_emotion(text):
+    return classify_emotions([text])[0].emotion
@@ -0,0 +1,86 @@
+# Server-wide inference profile for the emotion and translation models
+import os
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+
+from model_registry import MODEL_DEVICE, pick_device
+
+INFERENCE_PROFILE = os.environ.get("INFERENCE_PROFILE", "fp32")
+# Torch threads for these models in the server process; 0 uses the profile's default
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0"))
+QUANTIZED_MODEL_DIR = os.environ.get("QUANTIZED_MODEL_DIR", "model_cache")
+
+PROFILES = {
+    # Weights as published, on MODEL_DEVICE
+    "fp32": {"quantize": False, "device": None, "threads": 0},
+    # Linear layers quantized to int8 on load. The quantized kernels only run
+    # on CPU, and small batches stop scaling past a few threads while the TTS
+    # workers need the remaining cores.
+    "cpu-int8": {"quantize": True, "device": "cpu", "threads": min(4, os.cpu_count() or 1)},
+}
+
+if INFERENCE_PROFILE not in PROFILES:
+    raise ValueError(f"unknown INFERENCE_PROFILE {INFERENCE_PROFILE!r}; use one of {', '.join(PROFILES)}")
+profile = PROFILES[INFERENCE_PROFILE]
+
+
+def model_device(selected=None):
+    return (selected or profile)["device"] or pick_device(MODEL_DEVICE)
+
+
+@lru_cache(maxsize=1)
+def configure_threads():
+    import torch
+
+    threads = INFERENCE_THREADS or profile["threads"]
+    if threads:
+        torch.set_num_threads(threads)
+    return torch.get_num_threads()
+
+
+def inference_mode():
+    """Context for model calls: no autograd bookkeeping at all, cheaper than ``no_grad``."""
+    try:
+        import torch
+    except ImportError:
+        return nullcontext()
+    return torch.inference_mode()
+
+
+def quantized_path(name):
+    import torch
+    import transformers
+
+    # Pickled quantized modules only load into the versions that wrote them
+    return os.path.join(QUANTIZED_MODEL_DIR,
+                        f"{name.replace('/', '--')}-int8-torch{torch.__version__}-transformers{transformers.__version__}.pt")
+
+
+def prepare_model(name, load, selected=None):
+    """Return the model from ``load()`` as the profile wants it.
+
+    With quantization, the int8 model is saved under ``QUANTIZED_MODEL_DIR``
+    the first time and loaded from there on later starts, which skips both
+    the fp32 load and the conversion.
+    """
+    import torch
+
+    selected = selected or profile
+    configure_threads()
+    if not selected["quantize"]:
+        return load().to(model_device(selected)).eval()
+    path = quantized_path(name)
+    if os.path.exists(path):
+        try:
+            return torch.load(path, weights_only=False).eval()
+        except Exception as e:
+            print(f"⚠️ Cached int8 model {path} could not be loaded ({type(e).__name__}: {e}); converting again")
+    start = time.monotonic()
+    model = torch.ao.quantization.quantize_dynamic(load().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(QUANTIZED_MODEL_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"🗜️ Quantized {name} to int8 in {time.monotonic() - start:.1f}s; cached at {path}")
+    return model
@@ -0,0 +1,252 @@
+# Durable story jobs: a SQLite queue that survives restarts, and the threads that work it
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from request_control import CancelToken, RequestCancelled
+from telemetry import Counter
+
+JOB_DB = os.environ.get("JOB_DB", "jobs.sqlite3")
+# Jobs generated at the same time, next to the interactive requests
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+# A job that was running each time the server died this many times is failed
+# rather than queued again, so a job that crashes the server cannot loop forever
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+JOBS_FINISHED = Counter("story_jobs_total", "Jobs finished, by final state", ["state"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    request BLOB NOT NULL,
+    state TEXT NOT NULL,
+    stage TEXT NOT NULL DEFAULT '',
+    text TEXT,
+    error TEXT NOT NULL DEFAULT '',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, seq);
+CREATE TABLE IF NOT EXISTS segments (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    emotion TEXT NOT NULL DEFAULT '',
+    pcm BLOB,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+class JobStore:
+    """Story jobs and their progress in one SQLite file.
+
+    A job keeps its serialized ``StoryRequest``, the story text once the LLM
+    has written it, the segments it was split into, and the PCM of every
+    segment synthesized so far. A job that was running when the process died
+    is queued again by ``recover`` at startup and picks up from the first
+    segment without audio, unless that was its ``max_attempts``-th attempt.
+    A job interrupted by a clean shutdown does not use up an attempt. Every change bumps the job's ``version`` so watchers can poll
+    cheaply.
+    """
+
+    def __init__(self, path=JOB_DB, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Durable at every commit even on power loss; one fsync per segment is cheap next to TTS
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._wakeup = threading.Condition(self._lock)
+
+    def recover(self):
+        """Queue again the jobs a previous process left running; returns how many.
+
+        Only the process that runs the jobs may call this, once at startup:
+        anywhere else it would requeue jobs that are running right now.
+        """
+        with self._lock:
+            with self._transaction():
+                failed = self._db.execute(
+                    "UPDATE jobs SET state = 'failed', stage = '', finished_at = ?, "
+                    "error = 'the server stopped while running it, on all ' || attempts || ' attempts' "
+                    "WHERE state = 'running' AND attempts >= ?", (time.time(), self.max_attempts)
+                ).rowcount
+                resumed = self._db.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'").rowcount
+        if failed:
+            JOBS_FINISHED.inc(failed, state="failed")
+            print(f"❌ Gave up on {failed} job(s) interrupted {self.max_attempts} times")
+        if resumed:
+            print(f"♻️ Resuming {resumed} interrupted job(s) from {self.path}")
+        return resumed
+
+    def submit(self, requests):
+        """Queue serialized requests in one transaction; returns their job IDs in order."""
+        ids = [uuid.uuid4().hex for _ in requests]
+        now = time.time()
+        with self._lock:
+            with self._transaction():
+                self._db.executemany(
+                    "INSERT INTO jobs (id, request, state, created_at) VALUES (?, ?, 'queued', ?)",
+                    [(job_id, request, now) for job_id, request in zip(ids, requests)]
+                )
+            self._wakeup.notify_all()
+        return ids
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = self._db.execute(
+                "SELECT COUNT(*), COUNT(pcm) FROM segments WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return dict(row, segments_total=counts[0], segments_done=counts[1])
+
+    def version(self, job_id):
+        return self._versions.get(job_id, 0)
+
+    def segments(self, job_id, with_audio=False):
+        columns = "idx, type, text, emotion, pcm" if with_audio else "idx, type, text, emotion, pcm IS NOT NULL AS done"
+        with self._lock:
+            rows = self._db.execute(f"SELECT {columns} FROM segments WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim(self, timeout=None):
+        """Mark the oldest queued job running and return it, waiting up to ``timeout`` for one."""
+        with self._lock:
+            end = time.monotonic() + timeout if timeout is not None else None
+            while True:
+                row = self._db.execute("SELECT id FROM jobs WHERE state = 'queued' ORDER BY seq LIMIT 1").fetchone()
+                if row is not None:
+                    break
+                remaining = end - time.monotonic() if end is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._wakeup.wait(remaining)
+            self._db.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, started_at = ?, error = '' WHERE id = ?",
+                (time.time(), row["id"])
+            )
+            self._bump(row["id"])
+            return dict(self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def set_stage(self, job_id, stage):
+        self._update(job_id, "UPDATE jobs SET stage = ? WHERE id = ?", (stage, job_id))
+
+    def save_text(self, job_id, text):
+        self._update(job_id, "UPDATE jobs SET text = ? WHERE id = ?", (text, job_id))
+
+    def save_segments(self, job_id, segments):
+        with self._lock:
+            with self._transaction():
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO segments (job_id, idx, type, text, emotion) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, s["index"], s["type"], s["text"], s.get("emotion", "")) for s in segments]
+                )
+            self._bump(job_id)
+
+    def save_audio(self, job_id, index, pcm):
+        self._update(job_id, "UPDATE segments SET pcm = ? WHERE job_id = ? AND idx = ?", (pcm, job_id, index))
+
+    def requeue(self, job_id):
+        """Queue a job stopped by a clean shutdown again, giving back the attempt it was on."""
+        self._update(job_id, "UPDATE jobs SET state = 'queued', attempts = MAX(0, attempts - 1) WHERE id = ?",
+                     (job_id,))
+
+    def finish(self, job_id, state, error=""):
+        self._update(job_id, "UPDATE jobs SET state = ?, stage = '', error = ?, finished_at = ? WHERE id = ?",
+                     (state, error, time.time(), job_id))
+        JOBS_FINISHED.inc(state=state)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _update(self, job_id, sql, params):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._bump(job_id)
+
+    def _bump(self, job_id):
+        self._versions[job_id] = self._versions.get(job_id, 0) + 1
+
+    def _transaction(self):
+        # sqlite3's connection context manager commits or rolls back, but only inside BEGIN
+        self._db.execute("BEGIN")
+        return self._db
+
+
+class JobRunner:
+    """Threads that take queued jobs from a ``JobStore`` and run them one at a time each.
+
+    ``run_job(job, cancel)`` does the work and reports progress through the
+    store. ``ready()`` is polled before a job is claimed, so jobs wait for the
+    models to load. On ``close`` the running jobs are cancelled and queued
+    again, to resume on the next start.
+    """
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, store, run_job, workers=JOB_WORKERS, ready=lambda: True):
+        self.store = store
+        self.run_job = run_job
+        self.workers = max(0, workers)
+        self.ready = ready
+        self._stopping = threading.Event()
+        self._running = {}
+        self._threads = []
+
+    @property
+    def running(self):
+        return len(self._running)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self, timeout=10.0):
+        self._stopping.set()
+        for cancel in list(self._running.values()):
+            cancel.cancel("server shutting down")
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            if not self.ready():
+                self._stopping.wait(self.POLL_INTERVAL)
+                continue
+            job = self.store.claim(timeout=self.POLL_INTERVAL)
+            if job is None:
+                continue
+            cancel = self._running[job["id"]] = CancelToken()
+            print(f"📋 Job {job['id'][:12]} started (attempt {job['attempts']})")
+            try:
+                self.run_job(job, cancel)
+                self.store.finish(job["id"], "done")
+                print(f"✅ Job {job['id'][:12]} done")
+            except RequestCancelled:
+                self.store.requeue(job["id"])
+                print(f"⏸️ Job {job['id'][:12]} interrupted; it resumes on the next start")
+            except Exception as e:
+                self.store.finish(job["id"], "failed", f"{type(e).__name__}: {e}")
+                print(f"❌ Job {job['id'][:12]} failed: {type(e).__name__}: {e}")
+            finally:
+                del self._running[job["id"]]
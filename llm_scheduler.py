@@ -0,0 +1,147 @@
+# Model-affinity scheduling of LLM generations
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from stage_timing import stage
+from telemetry import Counter, Gauge, Histogram
+
+# Generations of one model sent to Ollama at once; match OLLAMA_NUM_PARALLEL
+LLM_PARALLEL = int(os.environ.get("LLM_PARALLEL", "4"))
+# Longest a request waits while another model's run continues
+LLM_MAX_WAIT = float(os.environ.get("LLM_MAX_WAIT", "60"))
+LLM_KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+
+LLM_QUEUE_WAIT = Histogram("llm_queue_wait_seconds", "Time a generation waited for its model's turn", ["model"])
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Generations waiting for their model's turn", ["model"])
+LLM_SWITCHES = Counter("llm_model_switches_total", "Times the scheduler moved on to another model")
+
+
+class _Waiter:
+    def __init__(self, model):
+        self.model = model
+        self.queued = time.monotonic()
+        self.granted = False
+        self.keep_alive = None
+
+
+class LLMScheduler:
+    """Serves LLM requests in runs of the same model so Ollama does not swap models per request.
+
+    Requests wait in one queue per model. The active model keeps being
+    served, ``parallel`` at a time, while it has requests queued or
+    running, so requests that arrive during its run join it. The run ends
+    when the model has drained, and the model whose oldest request has
+    waited longest goes next. A run also ends when another model's oldest
+    request has waited longer than ``max_wait``. It then stops taking new
+    requests, and the starved model is preloaded through ``preload`` so
+    its load overlaps the end of the run.
+
+    ``slot`` yields the ``keep_alive`` to send with the generation. It is
+    the configured value while more requests for that model are queued.
+    It is 0 when none are queued but other models are waiting, so the
+    memory is released for the next load unless the run is extended.
+    """
+
+    def __init__(self, parallel=LLM_PARALLEL, max_wait=LLM_MAX_WAIT, keep_alive=LLM_KEEP_ALIVE, preload=None):
+        self.parallel = max(1, parallel)
+        self.max_wait = max_wait
+        self.keep_alive = keep_alive
+        self.preload = preload
+        self.active = None
+        self.running = 0
+        self.served = 0
+        self.switches = 0
+        self.preloads = 0
+        self._queues = {}
+        self._next = None
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, model, cancel=None):
+        """Wait for ``model``'s turn; yields the keep_alive to use for this generation."""
+        waiter = _Waiter(model)
+        with stage("llm_queue"):
+            self._wait(waiter, cancel)
+        LLM_QUEUE_WAIT.observe(time.monotonic() - waiter.queued, model=model)
+        try:
+            yield waiter.keep_alive
+        finally:
+            with self._cond:
+                self.running -= 1
+                self._schedule()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self.active,
+                "running": self.running,
+                "queued": {model: len(queue) for model, queue in self._queues.items() if queue},
+                "served": self.served,
+                "switches": self.switches,
+                "preloads": self.preloads,
+            }
+
+    def _wait(self, waiter, cancel):
+        with self._cond:
+            queue = self._queues.setdefault(waiter.model, deque())
+            queue.append(waiter)
+            LLM_QUEUE_DEPTH.set(len(queue), model=waiter.model)
+            self._schedule()
+            while not waiter.granted:
+                if cancel is not None and cancel.cancelled:
+                    queue.remove(waiter)
+                    LLM_QUEUE_DEPTH.set(len(queue), model=waiter.model)
+                    self._schedule()
+                    cancel.check()
+                self._cond.wait(0.1)
+
+    def _schedule(self):
+        # Called with the condition held, whenever a request arrives or finishes
+        now = time.monotonic()
+        heads = {model: queue[0].queued for model, queue in self._queues.items() if queue}
+        starved = [model for model, queued in heads.items() if model != self.active and now - queued > self.max_wait]
+        if starved and self._next is None and self.running:
+            # The run ends here; start loading the starved model while it drains
+            self._next = min(starved, key=heads.get)
+            self._start_preload(self._next)
+        if self.active in heads and self._next is None:
+            self._grant(self.active)
+            return
+        if self.running or not heads:
+            # Let the active run drain before another model is loaded
+            return
+        model = self._next if self._next in heads else min(starved or heads, key=heads.get)
+        self._next = None
+        if model != self.active:
+            if self.active is not None:
+                self.switches += 1
+                LLM_SWITCHES.inc()
+            self.active = model
+        self._grant(model)
+
+    def _grant(self, model):
+        queue = self._queues[model]
+        while queue and self.running < self.parallel:
+            waiter = queue.popleft()
+            others = [m for m, q in self._queues.items() if q and m != model]
+            waiter.keep_alive = 0 if others and not queue else self.keep_alive
+            waiter.granted = True
+            self.running += 1
+            self.served += 1
+        LLM_QUEUE_DEPTH.set(len(queue), model=model)
+        self._cond.notify_all()
+
+    def _start_preload(self, model):
+        if self.preload is None:
+            return
+        self.preloads += 1
+        threading.Thread(target=self._run_preload, args=(model,), daemon=True).start()
+
+    def _run_preload(self, model):
+        try:
+            self.preload(model, self.keep_alive)
+        except Exception as e:
+            print(f"⚠️ Preloading {model} failed: {type(e).__name__}: {e}")
@@ -0,0 +1,318 @@
+# Lazy / background model loading with warm-up, readiness tracking and a memory budget
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from telemetry import Counter, Gauge, Histogram
+
+MODEL_DEVICE = os.environ.get("MODEL_DEVICE", "auto")
+# Memory the models may hold before the least recently used evictable ones are
+# unloaded; 0 means half the machine's RAM and 90% of the GPU's memory
+MODEL_RAM_BUDGET_MB = int(os.environ.get("MODEL_RAM_BUDGET_MB", "0"))
+MODEL_VRAM_BUDGET_MB = int(os.environ.get("MODEL_VRAM_BUDGET_MB", "0"))
+# A model that failed to load is tried again on its next use after this many
+# seconds, doubling with each further failure up to MODEL_RETRY_MAX_SECONDS
+MODEL_RETRY_SECONDS = float(os.environ.get("MODEL_RETRY_SECONDS", "30"))
+MODEL_RETRY_MAX_SECONDS = float(os.environ.get("MODEL_RETRY_MAX_SECONDS", "600"))
+
+MODEL_LOAD_SECONDS = Histogram("model_load_seconds", "Time to load and warm up a model", ["model"])
+MODEL_EVICTIONS = Counter("model_evictions_total", "Models unloaded to stay within the memory budget", ["model"])
+
+
+def pick_device(preference="auto"):
+    """Resolve ``"auto"`` to CUDA when it is usable, else CPU."""
+    if preference != "auto":
+        return preference
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def process_rss_bytes(pid="self"):
+    # Linux only; elsewhere memory is accounted from tensor sizes alone
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def tensor_bytes(value):
+    """RAM and VRAM held by the tensors of a torch module, a transformers pipeline, or a tuple of them."""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return 0, 0
+    seen = set()
+    totals = {"ram": 0, "vram": 0}
+
+    def visit(obj):
+        if isinstance(obj, torch.Tensor):
+            # Tied weights (Marian shares its embeddings) appear under several names
+            key = (str(obj.device), obj.data_ptr())
+            if key not in seen:
+                seen.add(key)
+                totals["vram" if obj.is_cuda else "ram"] += obj.numel() * obj.element_size()
+        elif isinstance(obj, torch.nn.Module):
+            # Includes the packed weights of dynamically quantized layers, which are not parameters
+            for item in obj.state_dict(keep_vars=True).values():
+                visit(item)
+        elif isinstance(obj, (tuple, list)):
+            for item in obj:
+                visit(item)
+        elif hasattr(obj, "model"):
+            visit(obj.model)
+
+    visit(value)
+    return totals["ram"], totals["vram"]
+
+
+def default_budgets():
+    ram = MODEL_RAM_BUDGET_MB * 1024 ** 2
+    if not ram:
+        try:
+            ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2
+        except (AttributeError, ValueError, OSError):
+            ram = 0
+    vram = MODEL_VRAM_BUDGET_MB * 1024 ** 2
+    torch = sys.modules.get("torch")
+    if not vram and torch is not None and torch.cuda.is_available():
+        vram = int(torch.cuda.get_device_properties(0).total_memory * 0.9)
+    return ram, vram
+
+
+class _Model:
+    def __init__(self, name, load, warmup, required, evictable, size):
+        self.name = name
+        self.load = load
+        self.warmup = warmup
+        self.required = required
+        self.evictable = evictable
+        self.size = size
+        self.state = "pending"
+        self.value = None
+        self.error = None
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.ram_bytes = 0
+        self.vram_bytes = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.evictions = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        # Callers inside ModelRegistry.use(); the model is not evicted while there are any
+        self.users = 0
+        self.loaded = threading.Event()
+
+    def needs_load(self):
+        return self.state in ("pending", "evicted") or (self.state == "failed" and time.monotonic() >= self.retry_at)
+
+
+class ModelRegistry:
+    """Loads models off the request path, keeps them within a memory budget and reports readiness.
+
+    Each model has a ``load`` callable and an optional ``warmup`` that gets
+    the loaded value and runs a throwaway inference, so the first real
+    request does not pay for CUDA kernel compilation or lazy weights.
+    ``start`` loads everything registered so far, in order, on a background
+    thread. ``get`` returns a model and loads it on the spot if nobody has
+    yet; concurrent callers wait for the one load. ``prefetch`` starts that
+    load in the background instead. ``ready`` is true once every required
+    model has loaded and warmed up.
+
+    After a load, the model's RAM and VRAM are measured: ``size(value)``
+    when given, otherwise the bytes of its tensors, falling back to the
+    growth of this process's RSS. Whenever the loaded models exceed
+    ``ram_budget`` or ``vram_budget``, evictable models are unloaded, least
+    recently used first, and loaded again on their next ``get``. Models
+    held in a ``use`` block are not evicted. A failed load is retried on
+    the first ``get`` after a backoff.
+    """
+
+    def __init__(self, ram_budget=None, vram_budget=None):
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self._budgets = (ram_budget, vram_budget) if ram_budget is not None or vram_budget is not None else None
+
+    def register(self, name, load, warmup=None, required=True, evictable=False, size=None):
+        """Add a model; registering a name again keeps the first registration."""
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = _Model(name, load, warmup, required, evictable, size)
+
+    def start(self):
+        thread = threading.Thread(target=self._load_all, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, name):
+        return self._acquire(self._models[name], pin=False)
+
+    @contextmanager
+    def use(self, name):
+        """``get`` for the length of a ``with`` block, during which the model is not evicted."""
+        model = self._models[name]
+        value = self._acquire(model, pin=True)
+        try:
+            yield value
+        finally:
+            with self._lock:
+                model.users -= 1
+                model.last_used = time.monotonic()
+
+    def prefetch(self, name):
+        """Load a model in the background if it is not loaded or loading already."""
+        model = self._models[name]
+        with self._lock:
+            needed = model.needs_load()
+        if needed:
+            threading.Thread(target=self._ensure, args=(model,), name=f"prefetch-{name}", daemon=True).start()
+
+    @property
+    def ready(self):
+        return all(m.state in ("ready", "evicted") for m in self._models.values() if m.required)
+
+    @property
+    def failed(self):
+        return any(m.state == "failed" for m in self._models.values() if m.required)
+
+    def budgets(self):
+        if self._budgets is None:
+            # Resolved on first use, once torch is imported and CUDA can be asked
+            self._budgets = default_budgets()
+        return self._budgets
+
+    def resident(self):
+        """Bytes held per loaded model: {(name, "ram" or "vram"): bytes}."""
+        with self._lock:
+            loaded = [m for m in self._models.values() if m.state == "ready"]
+        sizes = {}
+        for m in loaded:
+            sizes[(m.name, "ram")] = m.ram_bytes
+            sizes[(m.name, "vram")] = m.vram_bytes
+        return sizes
+
+    def status(self):
+        return [{
+            "name": m.name,
+            "state": m.state,
+            "load_seconds": round(m.load_seconds, 3),
+            "warmup_seconds": round(m.warmup_seconds, 3),
+            "error": m.error,
+            "ram_bytes": m.ram_bytes if m.state == "ready" else 0,
+            "vram_bytes": m.vram_bytes if m.state == "ready" else 0,
+            "loads": m.loads,
+            "evictions": m.evictions,
+        } for m in list(self._models.values())]
+
+    def _load_all(self):
+        with self._lock:
+            registered = list(self._models.values())
+        for model in registered:
+            self._ensure(model)
+        state = "ready" if self.ready else "degraded"
+        print(f"⏱️ Models {state} {time.monotonic() - self.started:.1f}s after start")
+
+    def _acquire(self, model, pin):
+        while True:
+            self._ensure(model)
+            with self._lock:
+                if model.state == "ready":
+                    model.last_used = time.monotonic()
+                    model.users += pin
+                    return model.value
+                if model.state == "failed":
+                    raise RuntimeError(f"{model.name} failed to load: {model.error}; "
+                                       f"next attempt in {max(0.0, model.retry_at - time.monotonic()):.0f}s")
+            # Evicted by another model's load between ours and now; load it again
+
+    def _ensure(self, model):
+        with self._lock:
+            if model.needs_load():
+                model.state = "loading"
+                model.loaded = threading.Event()
+                owner = True
+            else:
+                owner = False
+            loaded = model.loaded
+        if not owner:
+            loaded.wait()
+            return
+        try:
+            # A model loaded before takes the same room again, so make it first
+            self._make_room(model.ram_bytes, model.vram_bytes, keep=model)
+            rss = process_rss_bytes()
+            start = time.monotonic()
+            value = model.load()
+            model.load_seconds = time.monotonic() - start
+            if model.warmup is not None:
+                start = time.monotonic()
+                model.warmup(value)
+                model.warmup_seconds = time.monotonic() - start
+            ram, vram = model.size(value) if model.size else tensor_bytes(value)
+            if not ram and not vram:
+                ram = max(0, process_rss_bytes() - rss)
+            with self._lock:
+                model.value = value
+                model.ram_bytes, model.vram_bytes = ram, vram
+                model.loads += 1
+                model.failures = 0
+                model.last_used = time.monotonic()
+                model.state = "ready"
+            MODEL_LOAD_SECONDS.observe(model.load_seconds + model.warmup_seconds, model=model.name)
+            print(f"⏱️ {model.name}: loaded in {model.load_seconds:.1f}s, warm-up {model.warmup_seconds:.1f}s, "
+                  f"{ram / 1024 ** 2:.0f} MB RAM, {vram / 1024 ** 2:.0f} MB VRAM")
+            self._make_room(0, 0, keep=model)
+        except Exception as e:
+            with self._lock:
+                model.failures += 1
+                backoff = min(MODEL_RETRY_MAX_SECONDS, MODEL_RETRY_SECONDS * 2 ** (model.failures - 1))
+                model.retry_at = time.monotonic() + backoff
+                model.error = f"{type(e).__name__}: {e}"
+                model.state = "failed"
+            print(f"❌ {model.name} failed to load: {model.error}; next attempt in {backoff:.0f}s at the earliest")
+        finally:
+            loaded.set()
+
+    def _make_room(self, ram_needed, vram_needed, keep):
+        ram_budget, vram_budget = self.budgets()
+        evicted = []
+        with self._lock:
+            loaded = [m for m in self._models.values() if m.state == "ready" and m is not keep]
+            ram = sum(m.ram_bytes for m in loaded) + (keep.ram_bytes if keep.state == "ready" else ram_needed)
+            vram = sum(m.vram_bytes for m in loaded) + (keep.vram_bytes if keep.state == "ready" else vram_needed)
+            candidates = sorted((m for m in loaded if m.evictable and not m.users), key=lambda m: m.last_used)
+            while candidates and ((ram_budget and ram > ram_budget) or (vram_budget and vram > vram_budget)):
+                victim = candidates.pop(0)
+                ram -= victim.ram_bytes
+                vram -= victim.vram_bytes
+                # Callers that got the model without use() keep using it; memory is freed once they finish
+                victim.value = None
+                victim.state = "evicted"
+                victim.evictions += 1
+                evicted.append(victim)
+            over = (ram_budget and ram > ram_budget) or (vram_budget and vram > vram_budget)
+        for victim in evicted:
+            MODEL_EVICTIONS.inc(model=victim.name)
+            print(f"♻️ Evicted {victim.name} ({victim.ram_bytes / 1024 ** 2:.0f} MB RAM, "
+                  f"{victim.vram_bytes / 1024 ** 2:.0f} MB VRAM) to stay within the model memory budget")
+        if evicted and any(victim.vram_bytes for victim in evicted):
+            sys.modules["torch"].cuda.empty_cache()
+        if over:
+            print(f"⚠️ Models use {ram / 1024 ** 2:.0f} MB RAM / {vram / 1024 ** 2:.0f} MB VRAM, over the budget, "
+                  f"and nothing more can be evicted")
+
+
+# One registry per process: the server registers its models at startup and
+# the translation module adds language pairs as requests need them
+models = ModelRegistry()
+Gauge("model_resident_bytes", "Memory held by each loaded model", ["model", "memory"], fn=lambda: models.resident())
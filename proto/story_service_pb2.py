@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13story_service.proto\x12\x05story\"\x82\x01\n\x0cStoryRequest\x12\x0e\n\x06prompt\x18\x01 \x01(\t\x12\x0f\n\x07\x65motion\x18\x02 \x01(\t\x12\r\n\x05speed\x18\x03 \x01(\x02\x12\x10\n\x08language\x18\x04 \x01(\t\x12\x15\n\rspeaker_audio\x18\x05 \x01(\t\x12\x19\n\x11include_narration\x18\x06 \x01(\x08\"=\n\rStoryResponse\x12\r\n\x05\x61udio\x18\x01 \x01(\x0c\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t2J\n\x0cStoryService\x12:\n\rGenerateStory\x12\x13.story.StoryRequest\x1a\x14.story.StoryResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13story_service.proto\x12\x05story\"\xa9\x02\n\x0cStoryRequest\x12\x0e\n\x06prompt\x18\x01 \x01(\t\x12\x0f\n\x07\x65motion\x18\x02 \x01(\t\x12\r\n\x05speed\x18\x03 \x01(\x02\x12\x10\n\x08language\x18\x04 \x01(\t\x12\x15\n\rspeaker_audio\x18\x05 \x01(\t\x12\x19\n\x11include_narration\x18\x06 \x01(\x08\x12\x12\n\nsession_id\x18\x07 \x01(\t\x12\x11\n\x04seed\x18\x08 \x01(\x03H\x00\x88\x01\x01\x12\x1a\n\x12speaker_audio_data\x18\t \x01(\x0c\x12\x15\n\routput_format\x18\n \x01(\t\x12\x14\n\x0c\x62itrate_kbps\x18\x0b \x01(\x05\x12\x1a\n\x12output_sample_rate\x18\x0c \x01(\x05\x12\x10\n\x08voice_id\x18\r \x01(\tB\x07\n\x05_seed\"\x98\x01\n\rStoryResponse\x12\r\n\x05\x61udio\x18\x01 \x01(\x0c\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x14\n\x0c\x63ontent_type\x18\x04 \x01(\t\x12\x18\n\x10\x64uration_seconds\x18\x05 \x01(\x01\x12\x13\n\x0b\x65ta_seconds\x18\x06 \x01(\x01\x12\x14\n\x0c\x64\x65gradations\x18\x07 \x03(\t\"O\n\tTextChunk\x12\r\n\x05index\x18\x01 \x01(\x05\x12\x14\n\x0csegment_type\x18\x02 \x01(\t\x12\x0c\n\x04text\x18\x03 \x01(\t\x12\x0f\n\x07\x65motion\x18\x04 \x01(\t\"=\n\nAudioChunk\x12\r\n\x05index\x18\x01 \x01(\x05\x12\x0b\n\x03pcm\x18\x02 \x01(\x0c\x12\x13\n\x0bsample_rate\x18\x03 \x01(\x05\".\n\rStoryComplete\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x85\x01\n\nStoryChunk\x12 \n\x04text\x18\x01 \x01(\x0b\x32\x10.story.TextChunkH\x00\x12\"\n\x05\x61udio\x18\x02 \x01(\x0b\x32\x11.story.AudioChunkH\x00\x12(\n\x08\x63omplete\x18\x03 \x01(\x0b\x32\x14.story.StoryCompleteH\x00\x42\x07\n\x05\x63hunk\"\x0f\n\rHealthRequest\"\xb0\x01\n\x0bModelStatus\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05state\x18\x02 \x01(\t\x12\x14\n\x0cload_seconds\x18\x03 \x01(\x01\x12\x16\n\x0ewarmup_seconds\x18\x04 \x01(\x01\x12\r\n\x05\x65rror\x18\x05 \x01(\t\x12\x11\n\tram_bytes\x18\x06 \x01(\x03\x12\x12\n\nvram_bytes\x18\x07 \x01(\x03\x12\r\n\x05loads\x18\x08 \x01(\x05\x12\x11\n\tevictions\x18\t \x01(\x05\"k\n\x0eHealthResponse\x12\r\n\x05ready\x18\x01 \x01(\x08\x12\x0e\n\x06status\x18\x02 \x01(\t\x12\x16\n\x0euptime_seconds\x18\x03 \x01(\x01\x12\"\n\x06models\x18\x04 \x03(\x0b\x32\x12.story.ModelStatus\"<\n\x14SubmitStoriesRequest\x12$\n\x07stories\x18\x01 \x03(\x0b\x32\x13.story.StoryRequest\"(\n\x15SubmitStoriesResponse\x12\x0f\n\x07job_ids\x18\x01 \x03(\t\"3\n\nJobRequest\x12\x0e\n\x06job_id\x18\x01 \x01(\t\x12\x15\n\rinclude_audio\x18\x02 \x01(\x08\"\xe6\x01\n\x03Job\x12\x0e\n\x06job_id\x18\x01 \x01(\t\x12\r\n\x05state\x18\x02 \x01(\t\x12\r\n\x05stage\x18\x03 \x01(\t\x12\x15\n\rsegments_done\x18\x04 \x01(\x05\x12\x16\n\x0esegments_total\x18\x05 \x01(\x05\x12\x10\n\x08\x61ttempts\x18\x06 \x01(\x05\x12\r\n\x05\x65rror\x18\x07 \x01(\t\x12\x12\n\ncreated_at\x18\x08 \x01(\x01\x12\x12\n\nstarted_at\x18\t \x01(\x01\x12\x13\n\x0b\x66inished_at\x18\n \x01(\x01\x12$\n\x06result\x18\x0b \x01(\x0b\x32\x14.story.StoryResponse\"(\n\nVoiceChunk\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\"{\n\x05Voice\x12\x10\n\x08voice_id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x18\n\x10\x64uration_seconds\x18\x03 \x01(\x01\x12\x13\n\x0bsample_rate\x18\x04 \x01(\x05\x12\x0f\n\x07\x62uiltin\x18\x05 \x01(\x08\x12\x12\n\ncreated_at\x18\x06 \x01(\x01\"\x13\n\x11ListVoicesRequest\"2\n\x12ListVoicesResponse\x12\x1c\n\x06voices\x18\x01 \x03(\x0b\x32\x0c.story.Voice2\x8f\x04\n\x0cStoryService\x12:\n\rGenerateStory\x12\x13.story.StoryRequest\x1a\x14.story.StoryResponse\x12?\n\x13GenerateStoryStream\x12\x13.story.StoryRequest\x1a\x11.story.StoryChunk0\x01\x12\x35\n\x06Health\x12\x14.story.HealthRequest\x1a\x15.story.HealthResponse\x12\x34\n\x05Ready\x12\x14.story.HealthRequest\x1a\x15.story.HealthResponse\x12J\n\rSubmitStories\x12\x1b.story.SubmitStoriesRequest\x1a\x1c.story.SubmitStoriesResponse\x12\'\n\x06GetJob\x12\x11.story.JobRequest\x1a\n.story.Job\x12+\n\x08WatchJob\x12\x11.story.JobRequest\x1a\n.story.Job0\x01\x12\x30\n\x0bUploadVoice\x12\x11.story.VoiceChunk\x1a\x0c.story.Voice(\x01\x12\x41\n\nListVoices\x12\x18.story.ListVoicesRequest\x1a\x19.story.ListVoicesResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -32,9 +32,39 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'story_service_pb2', _global
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_STORYREQUEST']._serialized_start=31
-  _globals['_STORYREQUEST']._serialized_end=161
-  _globals['_STORYRESPONSE']._serialized_start=163
-  _globals['_STORYRESPONSE']._serialized_end=224
-  _globals['_STORYSERVICE']._serialized_start=226
-  _globals['_STORYSERVICE']._serialized_end=300
+  _globals['_STORYREQUEST']._serialized_end=328
+  _globals['_STORYRESPONSE']._serialized_start=331
+  _globals['_STORYRESPONSE']._serialized_end=483
+  _globals['_TEXTCHUNK']._serialized_start=485
+  _globals['_TEXTCHUNK']._serialized_end=564
+  _globals['_AUDIOCHUNK']._serialized_start=566
+  _globals['_AUDIOCHUNK']._serialized_end=627
+  _globals['_STORYCOMPLETE']._serialized_start=629
+  _globals['_STORYCOMPLETE']._serialized_end=675
+  _globals['_STORYCHUNK']._serialized_start=678
+  _globals['_STORYCHUNK']._serialized_end=811
+  _globals['_HEALTHREQUEST']._serialized_start=813
+  _globals['_HEALTHREQUEST']._serialized_end=828
+  _globals['_MODELSTATUS']._serialized_start=831
+  _globals['_MODELSTATUS']._serialized_end=1007
+  _globals['_HEALTHRESPONSE']._serialized_start=1009
+  _globals['_HEALTHRESPONSE']._serialized_end=1116
+  _globals['_SUBMITSTORIESREQUEST']._serialized_start=1118
+  _globals['_SUBMITSTORIESREQUEST']._serialized_end=1178
+  _globals['_SUBMITSTORIESRESPONSE']._serialized_start=1180
+  _globals['_SUBMITSTORIESRESPONSE']._serialized_end=1220
+  _globals['_JOBREQUEST']._serialized_start=1222
+  _globals['_JOBREQUEST']._serialized_end=1273
+  _globals['_JOB']._serialized_start=1276
+  _globals['_JOB']._serialized_end=1506
+  _globals['_VOICECHUNK']._serialized_start=1508
+  _globals['_VOICECHUNK']._serialized_end=1548
+  _globals['_VOICE']._serialized_start=1550
+  _globals['_VOICE']._serialized_end=1673
+  _globals['_LISTVOICESREQUEST']._serialized_start=1675
+  _globals['_LISTVOICESREQUEST']._serialized_end=1694
+  _globals['_LISTVOICESRESPONSE']._serialized_start=1696
+  _globals['_LISTVOICESRESPONSE']._serialized_end=1746
+  _globals['_STORYSERVICE']._serialized_start=1749
+  _globals['_STORYSERVICE']._serialized_end=2276
 # @@protoc_insertion_point(module_scope)
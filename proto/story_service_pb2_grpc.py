@@ -41,6 +41,46 @@ class StoryServiceStub(object):
                 request_serializer=story__service__pb2.StoryRequest.SerializeToString,
                 response_deserializer=story__service__pb2.StoryResponse.FromString,
                 _registered_method=True)
+        self.GenerateStoryStream = channel.unary_stream(
+                '/story.StoryService/GenerateStoryStream',
+                request_serializer=story__service__pb2.StoryRequest.SerializeToString,
+                response_deserializer=story__service__pb2.StoryChunk.FromString,
+                _registered_method=True)
+        self.Health = channel.unary_unary(
+                '/story.StoryService/Health',
+                request_serializer=story__service__pb2.HealthRequest.SerializeToString,
+                response_deserializer=story__service__pb2.HealthResponse.FromString,
+                _registered_method=True)
+        self.Ready = channel.unary_unary(
+                '/story.StoryService/Ready',
+                request_serializer=story__service__pb2.HealthRequest.SerializeToString,
+                response_deserializer=story__service__pb2.HealthResponse.FromString,
+                _registered_method=True)
+        self.SubmitStories = channel.unary_unary(
+                '/story.StoryService/SubmitStories',
+                request_serializer=story__service__pb2.SubmitStoriesRequest.SerializeToString,
+                response_deserializer=story__service__pb2.SubmitStoriesResponse.FromString,
+                _registered_method=True)
+        self.GetJob = channel.unary_unary(
+                '/story.StoryService/GetJob',
+                request_serializer=story__service__pb2.JobRequest.SerializeToString,
+                response_deserializer=story__service__pb2.Job.FromString,
+                _registered_method=True)
+        self.WatchJob = channel.unary_stream(
+                '/story.StoryService/WatchJob',
+                request_serializer=story__service__pb2.JobRequest.SerializeToString,
+                response_deserializer=story__service__pb2.Job.FromString,
+                _registered_method=True)
+        self.UploadVoice = channel.stream_unary(
+                '/story.StoryService/UploadVoice',
+                request_serializer=story__service__pb2.VoiceChunk.SerializeToString,
+                response_deserializer=story__service__pb2.Voice.FromString,
+                _registered_method=True)
+        self.ListVoices = channel.unary_unary(
+                '/story.StoryService/ListVoices',
+                request_serializer=story__service__pb2.ListVoicesRequest.SerializeToString,
+                response_deserializer=story__service__pb2.ListVoicesResponse.FromString,
+                _registered_method=True)
 
 
 class StoryServiceServicer(object):
@@ -52,6 +92,64 @@ class StoryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GenerateStoryStream(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Health(self, request, context):
+        """Liveness: always answers, with per-model load state.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Ready(self, request, context):
+        """Readiness: UNAVAILABLE until every model is loaded and warmed up.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SubmitStories(self, request, context):
+        """Durable jobs: queued on disk, generated in the background and resumed
+        at the first unfinished segment after a restart.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetJob(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchJob(self, request, context):
+        """Sends the job whenever its stage or segment count changes, until it
+        is done or failed.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def UploadVoice(self, request_iterator, context):
+        """Stores a reference voice sent in chunks, the name in the first one, and
+        returns its ID for StoryRequest.voice_id. Uploading the same audio again
+        returns the voice stored the first time.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListVoices(self, request, context):
+        """Built-in voices, then uploaded ones.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_StoryServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -60,6 +158,46 @@ def add_StoryServiceServicer_to_server(servicer, server):
                     request_deserializer=story__service__pb2.StoryRequest.FromString,
                     response_serializer=story__service__pb2.StoryResponse.SerializeToString,
             ),
+            'GenerateStoryStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.GenerateStoryStream,
+                    request_deserializer=story__service__pb2.StoryRequest.FromString,
+                    response_serializer=story__service__pb2.StoryChunk.SerializeToString,
+            ),
+            'Health': grpc.unary_unary_rpc_method_handler(
+                    servicer.Health,
+                    request_deserializer=story__service__pb2.HealthRequest.FromString,
+                    response_serializer=story__service__pb2.HealthResponse.SerializeToString,
+            ),
+            'Ready': grpc.unary_unary_rpc_method_handler(
+                    servicer.Ready,
+                    request_deserializer=story__service__pb2.HealthRequest.FromString,
+                    response_serializer=story__service__pb2.HealthResponse.SerializeToString,
+            ),
+            'SubmitStories': grpc.unary_unary_rpc_method_handler(
+                    servicer.SubmitStories,
+                    request_deserializer=story__service__pb2.SubmitStoriesRequest.FromString,
+                    response_serializer=story__service__pb2.SubmitStoriesResponse.SerializeToString,
+            ),
+            'GetJob': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetJob,
+                    request_deserializer=story__service__pb2.JobRequest.FromString,
+                    response_serializer=story__service__pb2.Job.SerializeToString,
+            ),
+            'WatchJob': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchJob,
+                    request_deserializer=story__service__pb2.JobRequest.FromString,
+                    response_serializer=story__service__pb2.Job.SerializeToString,
+            ),
+            'UploadVoice': grpc.stream_unary_rpc_method_handler(
+                    servicer.UploadVoice,
+                    request_deserializer=story__service__pb2.VoiceChunk.FromString,
+                    response_serializer=story__service__pb2.Voice.SerializeToString,
+            ),
+            'ListVoices': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListVoices,
+                    request_deserializer=story__service__pb2.ListVoicesRequest.FromString,
+                    response_serializer=story__service__pb2.ListVoicesResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'story.StoryService', rpc_method_handlers)
@@ -97,3 +235,219 @@ class StoryService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GenerateStoryStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/story.StoryService/GenerateStoryStream',
+            story__service__pb2.StoryRequest.SerializeToString,
+            story__service__pb2.StoryChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Health(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/story.StoryService/Health',
+            story__service__pb2.HealthRequest.SerializeToString,
+            story__service__pb2.HealthResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Ready(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/story.StoryService/Ready',
+            story__service__pb2.HealthRequest.SerializeToString,
+            story__service__pb2.HealthResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SubmitStories(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/story.StoryService/SubmitStories',
+            story__service__pb2.SubmitStoriesRequest.SerializeToString,
+            story__service__pb2.SubmitStoriesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetJob(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/story.StoryService/GetJob',
+            story__service__pb2.JobRequest.SerializeToString,
+            story__service__pb2.Job.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchJob(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/story.StoryService/WatchJob',
+            story__service__pb2.JobRequest.SerializeToString,
+            story__service__pb2.Job.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def UploadVoice(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/story.StoryService/UploadVoice',
+            story__service__pb2.VoiceChunk.SerializeToString,
+            story__service__pb2.Voice.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListVoices(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/story.StoryService/ListVoices',
+            story__service__pb2.ListVoicesRequest.SerializeToString,
+            story__service__pb2.ListVoicesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,154 @@
+# Cancellation, deadlines and admission control for story requests
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager
+
+from telemetry import Histogram
+
+MAX_ACTIVE_REQUESTS = int(os.environ.get("MAX_ACTIVE_REQUESTS", "5"))
+MAX_QUEUED_REQUESTS = int(os.environ.get("MAX_QUEUED_REQUESTS", "10"))
+
+ADMISSION_WAIT = Histogram("story_admission_wait_seconds", "Time an admitted request waited for a running slot")
+
+
+class RequestCancelled(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Shared between an RPC and the thread doing its work.
+
+    The RPC side calls ``cancel`` when the client goes away; the worker side
+    calls ``check`` between stages and segments, which raises
+    ``RequestCancelled`` once the request was cancelled or its deadline
+    (a ``time.monotonic`` value) has passed.
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+
+    @classmethod
+    def for_context(cls, context):
+        remaining = context.time_remaining()
+        return cls(time.monotonic() + remaining if remaining is not None else None)
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    @property
+    def deadline_exceeded(self):
+        return self.reason == "deadline exceeded"
+
+    def cancel(self, reason="cancelled by client"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+    def wait(self, event, timeout=None):
+        """Wait for a threading.Event, giving up early if the request is cancelled."""
+        end = time.monotonic() + timeout if timeout is not None else None
+        while not event.wait(self.POLL_INTERVAL):
+            self.check()
+            if end is not None and time.monotonic() >= end:
+                return False
+        return True
+
+    def result(self, future):
+        """Wait for a Future; a cancelled request cancels it if it has not started yet."""
+        while True:
+            try:
+                return future.result(timeout=self.POLL_INTERVAL)
+            except FutureTimeoutError:
+                if self.cancelled:
+                    future.cancel()
+                    self.check()
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps how many requests run at once and how many may wait for a slot.
+
+    A request that finds both the running slots and the queue full is
+    rejected immediately with a retry hint based on recent request
+    durations. ``drain`` stops admitting and waits for admitted work to finish.
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE_REQUESTS, max_queued=MAX_QUEUED_REQUESTS):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.draining = False
+        self._slots = asyncio.Semaphore(max_active)
+        self._avg_seconds = None
+
+    def retry_after(self):
+        # Time until a slot frees up for a request that joined the back of the queue
+        average = self._avg_seconds or 30.0
+        return average * (self.waiting + 1) / self.max_active
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.draining:
+            self.rejected += 1
+            raise AdmissionRejected("server is shutting down", self.retry_after())
+        if self.active >= self.max_active and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"{self.active} requests running and {self.waiting} queued", self.retry_after()
+            )
+        self.waiting += 1
+        queued = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        ADMISSION_WAIT.observe(time.monotonic() - queued)
+        self.active += 1
+        self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+            elapsed = time.monotonic() - start
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    async def drain(self, timeout):
+        self.draining = True
+        end = time.monotonic() + timeout
+        while (self.active or self.waiting) and time.monotonic() < end:
+            await asyncio.sleep(0.1)
+        return not (self.active or self.waiting)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "draining": self.draining,
+        }
@@ -1,56 +1,240 @@
-from flask import Flask, request, jsonify
-import grpc
+# Async REST gateway in front of the gRPC StoryService
 import base64
+import binascii
+import itertools
+import json
 import os
+import struct
+import uuid
+from contextlib import asynccontextmanager
+
+import grpc
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
 
 from proto import story_service_pb2
 from proto import story_service_pb2_grpc
 
-app = Flask(__name__)
-GRPC_SERVER_ADDRESS = "localhost:50051"
+GRPC_SERVER_ADDRESS = os.environ.get("GRPC_SERVER_ADDRESS", "localhost:50051")
+# Each channel is one HTTP/2 connection; a few spread streams past the per-connection limit
+GATEWAY_CHANNELS = int(os.environ.get("GATEWAY_CHANNELS", "2"))
+GATEWAY_TIMEOUT = float(os.environ.get("GATEWAY_TIMEOUT", "900"))
+GRPC_MAX_MESSAGE_MB = int(os.environ.get("GRPC_MAX_MESSAGE_MB", "100"))
+VOICE_UPLOAD_CHUNK = 1 << 20
+# Initial metadata of a streamed story, passed on as response headers
+ETA_HEADERS = {"story-eta-seconds": "X-Story-ETA-Seconds", "story-degradations": "X-Story-Degradations"}
+
+CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", GRPC_MAX_MESSAGE_MB * 1024 * 1024),
+    ("grpc.max_receive_message_length", GRPC_MAX_MESSAGE_MB * 1024 * 1024),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    # Otherwise channels with equal options share one connection
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+HTTP_STATUS = {
+    grpc.StatusCode.INVALID_ARGUMENT: 400,
+    grpc.StatusCode.FAILED_PRECONDITION: 503,
+    grpc.StatusCode.NOT_FOUND: 404,
+    grpc.StatusCode.RESOURCE_EXHAUSTED: 429,
+    grpc.StatusCode.CANCELLED: 499,
+    grpc.StatusCode.UNAVAILABLE: 503,
+    grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+}
+
+
+class ChannelPool:
+    """A fixed set of long-lived gRPC channels handed out round robin."""
+
+    def __init__(self, address, size=GATEWAY_CHANNELS):
+        self.channels = [grpc.aio.insecure_channel(address, options=CHANNEL_OPTIONS) for _ in range(max(1, size))]
+        self._stubs = itertools.cycle([story_service_pb2_grpc.StoryServiceStub(c) for c in self.channels])
+
+    def stub(self):
+        return next(self._stubs)
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+
+
+pool = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global pool
+    # aio channels belong to the event loop, so they are created once it runs
+    pool = ChannelPool(GRPC_SERVER_ADDRESS)
+    try:
+        yield
+    finally:
+        await pool.close()
+
+
+def story_request(data):
+    """Build a StoryRequest from the JSON payload; the voice bytes travel inside it."""
+    request = story_service_pb2.StoryRequest(
+        prompt=data["prompt"],
+        emotion=data.get("emotion", "neutral"),
+        speed=float(data.get("speed", 1.0)),
+        language=data.get("language", "en"),
+        include_narration=bool(data.get("include_narration", False)),
+        voice_id=data.get("voice_id", ""),
+        session_id=data.get("session_id", ""),
+        output_format=data.get("output_format", ""),
+        bitrate_kbps=int(data.get("bitrate_kbps", 0)),
+        output_sample_rate=int(data.get("output_sample_rate", 0)),
+    )
+    if data.get("speaker_audio_base64"):
+        request.speaker_audio_data = base64.b64decode(data["speaker_audio_base64"], validate=True)
+    if data.get("seed") is not None:
+        request.seed = int(data["seed"])
+    if not request.speaker_audio_data and not request.voice_id:
+        raise ValueError("voice_id or speaker_audio_base64 is required")
+    return request
+
+
+def error_response(e):
+    headers = {}
+    for key, value in e.trailing_metadata() or ():
+        if key == "grpc-retry-pushback-ms":
+            headers["Retry-After"] = str(max(1, round(int(value) / 1000)))
+    return JSONResponse({"error": e.details(), "code": e.code().name},
+                        status_code=HTTP_STATUS.get(e.code(), 502), headers=headers)
+
+
+def multipart_response(parts):
+    boundary = uuid.uuid4().hex
+    body = []
+    for content_type, data in parts:
+        body.append(f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-Length: {len(data)}\r\n\r\n".encode())
+        body.append(data)
+        body.append(b"\r\n")
+    body.append(f"--{boundary}--\r\n".encode())
+    return Response(b"".join(body), media_type=f"multipart/mixed; boundary={boundary}")
+
+
+def streaming_wav_header(sample_rate):
+    # Length unknown up front: 0xFFFFFFFF sizes are what streaming players expect
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", 0xFFFFFFFF,
+    )
+
 
-@app.route("/generate-story/", methods=["POST"])
-def generate_story():
+async def stream_wav(call, chunk):
+    """Relay the audio chunks of a GenerateStoryStream call as one WAV body, starting from ``chunk``."""
+    sent_header = False
     try:
-        data = request.get_json()
-        prompt = data["prompt"]
-        emotion = data["emotion"]
-        speed = float(data["speed"])
-        language = data["language"]
-        include_narration = bool(data["include_narration"])
-        speaker_audio_b64 = data["speaker_audio_base64"]
-
-        # Save base64 audio to file
-        speaker_path = "uploaded_speaker.wav"
-        with open(speaker_path, "wb") as f:
-            f.write(base64.b64decode(speaker_audio_b64))
-
-        # Setup gRPC
-        channel = grpc.insecure_channel(GRPC_SERVER_ADDRESS)
-        stub = story_service_pb2_grpc.StoryServiceStub(channel)
-
-        grpc_request = story_service_pb2.StoryRequest(
-            prompt=prompt,
-            emotion=emotion,
-            speed=speed,
-            language=language,
-            speaker_audio=speaker_path,
-            include_narration=include_narration
-        )
-
-        response = stub.GenerateStory(grpc_request)
-
-        with open("response_audio.wav", "wb") as f:
-            f.write(response.audio)
-
-        return jsonify({
-            "text": response.text,
-            "message": response.message,
-            "audio_file": "response_audio.wav"
-        })
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        while chunk is not grpc.aio.EOF:
+            if chunk.WhichOneof("chunk") == "audio":
+                if not sent_header:
+                    yield streaming_wav_header(chunk.audio.sample_rate)
+                    sent_header = True
+                yield chunk.audio.pcm
+            chunk = await call.read()
+    finally:
+        # Client went away: cancelling the call stops the work on the server
+        call.cancel()
+
+
+async def generate_story(request):
+    try:
+        grpc_request = story_request(await request.json())
+    except (KeyError, ValueError, TypeError, binascii.Error) as e:
+        return JSONResponse({"error": f"invalid request: {e}"}, status_code=400)
+
+    accept = request.headers.get("accept", "")
+    # The server schedules synthesis by this class; see TTS_SCHEDULE
+    priority = request.headers.get("x-story-priority")
+    metadata = (("story-priority", priority),) if priority else None
+    stub = pool.stub()
+    try:
+        if "audio/wav" in accept or request.query_params.get("stream") == "1":
+            call = stub.GenerateStoryStream(grpc_request, timeout=GATEWAY_TIMEOUT, metadata=metadata)
+            # Wait for the first message so errors still become a proper status code
+            first = await call.read()
+            headers = {ETA_HEADERS[key]: value for key, value in await call.initial_metadata() if key in ETA_HEADERS}
+            return StreamingResponse(stream_wav(call, first), media_type="audio/wav", headers=headers)
+
+        response = await stub.GenerateStory(grpc_request, timeout=GATEWAY_TIMEOUT, metadata=metadata)
+    except grpc.aio.AioRpcError as e:
+        return error_response(e)
+
+    meta = {"text": response.text, "message": response.message,
+            "content_type": response.content_type, "duration_seconds": response.duration_seconds,
+            "eta_seconds": response.eta_seconds, "degradations": list(response.degradations)}
+    if "application/json" in accept:
+        meta["audio_base64"] = base64.b64encode(response.audio).decode("ascii")
+        return JSONResponse(meta)
+    return multipart_response([
+        ("application/json", json.dumps(meta).encode("utf-8")),
+        (response.content_type or "audio/wav", response.audio),
+    ])
+
+
+def voice_json(voice):
+    return {"voice_id": voice.voice_id, "name": voice.name, "duration_seconds": voice.duration_seconds,
+            "sample_rate": voice.sample_rate, "builtin": voice.builtin}
+
+
+async def upload_voice(request):
+    """Relay the request body, raw audio named by the ``name`` query parameter, to UploadVoice."""
+    name = request.query_params.get("name", "")
+
+    async def chunks():
+        pending = b""
+        first = True
+        async for data in request.stream():
+            pending += data
+            while len(pending) >= VOICE_UPLOAD_CHUNK:
+                yield story_service_pb2.VoiceChunk(name=name if first else "", data=pending[:VOICE_UPLOAD_CHUNK])
+                pending = pending[VOICE_UPLOAD_CHUNK:]
+                first = False
+        if pending or first:
+            yield story_service_pb2.VoiceChunk(name=name if first else "", data=pending)
+
+    try:
+        voice = await pool.stub().UploadVoice(chunks(), timeout=GATEWAY_TIMEOUT)
+    except grpc.aio.AioRpcError as e:
+        return error_response(e)
+    return JSONResponse(voice_json(voice))
+
+
+async def list_voices(request):
+    try:
+        response = await pool.stub().ListVoices(story_service_pb2.ListVoicesRequest(), timeout=30)
+    except grpc.aio.AioRpcError as e:
+        return error_response(e)
+    return JSONResponse({"voices": [voice_json(voice) for voice in response.voices]})
+
+
+async def ready(request):
+    try:
+        response = await pool.stub().Ready(story_service_pb2.HealthRequest(), timeout=5)
+        return JSONResponse({"status": response.status})
+    except grpc.aio.AioRpcError as e:
+        return JSONResponse({"status": e.details() or e.code().name}, status_code=503)
+
+
+app = Starlette(
+    routes=[
+        Route("/generate-story/", generate_story, methods=["POST"]),
+        Route("/voices", list_voices, methods=["GET"]),
+        Route("/voices", upload_voice, methods=["POST"]),
+        Route("/ready", ready, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
 
 if __name__ == "__main__":
-    app.run(debug=True, port=8000)
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,291 @@
+# Content-addressed cache of finished stories (text + encoded audio)
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from audio_assembly import save_output_async
+
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "output")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+RESULT_CACHE_MAX_AGE = float(os.environ.get("RESULT_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+RESULT_CACHE_WAIT = float(os.environ.get("RESULT_CACHE_WAIT", "600"))
+
+
+def result_key(**fields):
+    """Stable hash of everything that decides what a request produces."""
+    blob = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class Lease:
+    """Right to compute one missing entry; other callers for the key wait on it."""
+
+    def __init__(self, cache, key, flight):
+        self._cache = cache
+        self._key = key
+        self._flight = flight
+
+    def complete(self, text, audio, meta=None, name=None):
+        if self._flight is None:
+            return
+        self._cache.put(self._key, text, audio, meta, name)
+        self.release()
+
+    def release(self):
+        # Without complete() the waiters wake up, find nothing and compute themselves
+        if self._flight is None:
+            return
+        self._cache._land(self._key, self._flight)
+        self._flight = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ResultCache:
+    """Finished stories keyed by ``result_key``, persisted to ``directory``.
+
+    Each entry is ``<name> [<key prefix>].wav`` plus a ``.json`` sidecar with
+    the text and metadata, so identical prompts no longer overwrite each
+    other and the index is rebuilt from the sidecars on restart. The store is
+    trimmed to ``max_bytes`` (least recently used first) and ``max_age``
+    seconds. Concurrent misses on the same key are coalesced: the first
+    caller gets a ``Lease`` and computes, the rest wait and then read its
+    result. With ``persist=False`` entries are kept in memory only, under the
+    same limits.
+    """
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 max_age=RESULT_CACHE_MAX_AGE, persist=True, wait_timeout=RESULT_CACHE_WAIT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.persist = persist
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._writes = set()
+        self._lock = threading.Lock()
+        self.stored_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        if persist:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    # ---------- Lookup ----------
+
+    def acquire(self, key, cancel=None):
+        """Return ``(entry, None)`` on a hit or ``(None, lease)`` when the caller must compute.
+
+        A hit's audio is read, so a concurrent eviction cannot remove it
+        before the caller gets to it; a hit whose file has gone missing
+        counts as a miss. ``cancel`` is an optional ``CancelToken`` that
+        stops waiting on someone else's computation.
+        """
+        waited = False
+        while True:
+            f = None
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None and entry["audio"] is None:
+                    # Opened under the lock: the open file outlives an eviction that unlinks it
+                    try:
+                        f = open(entry["path"], "rb")
+                    except FileNotFoundError:
+                        self._drop(key)
+                        entry = None
+                if entry is not None:
+                    self.hits += 1
+                    self.bytes_saved += entry["size"]
+                    if waited:
+                        self.coalesced += 1
+                    if f is None:
+                        # A copy: once the write lands, the cached entry drops its audio for the file
+                        return dict(entry), None
+                else:
+                    flight = self._inflight.get(key)
+                    if flight is None:
+                        flight = self._inflight[key] = _Flight()
+                        self.misses += 1
+                        return None, Lease(self, key, flight)
+            if f is not None:
+                # Read without the lock, so other lookups don't wait on the disk
+                with f:
+                    return dict(entry, audio=f.read()), None
+            if cancel is not None:
+                cancel.wait(flight.done, self.wait_timeout)
+            else:
+                flight.done.wait(self.wait_timeout)
+            waited = True
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)
+
+    def read_audio(self, entry):
+        if entry.get("audio") is not None:
+            return entry["audio"]
+        with open(entry["path"], "rb") as f:
+            return f.read()
+
+    # ---------- Store ----------
+
+    def put(self, key, text, audio, meta=None, name=None):
+        label = f"{name} [{key[:12]}]" if name else key
+        entry = {
+            "key": key,
+            "text": text,
+            "meta": meta or {},
+            "audio": audio,
+            "path": os.path.join(self.directory, f"{label}.wav"),
+            "size": len(audio) + len(text.encode("utf-8")),
+            "created": time.time(),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self.stored_bytes += entry["size"]
+            self._evict()
+        if self.persist:
+            # Served from memory until the write lands, then from disk
+            write = save_output_async(entry["path"], audio)
+            with self._lock:
+                self._writes.add(write)
+            write.add_done_callback(lambda f: self._persisted(entry, f))
+        return entry
+
+    def flush(self):
+        """Wait until every stored entry has reached the disk."""
+        while True:
+            with self._lock:
+                if not self._writes:
+                    return
+            time.sleep(0.01)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "stored_bytes": self.stored_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions,
+                "in_flight": len(self._inflight),
+            }
+
+    # ---------- Internals ----------
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created"] > self.max_age:
+            self._drop(key)
+            self.evictions += 1
+            return None
+        entry["last_used"] = time.time()
+        self._entries.move_to_end(key)
+        return entry
+
+    def _land(self, key, flight):
+        with self._lock:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+        flight.done.set()
+
+    def _persisted(self, entry, write):
+        try:
+            self._finish_write(entry, write)
+        finally:
+            with self._lock:
+                self._writes.discard(write)
+
+    def _finish_write(self, entry, write):
+        if write.exception() is not None:
+            print(f"⚠️ Could not save {entry['path']}: {write.exception()}")
+            with self._lock:
+                if self._entries.get(entry["key"]) is entry:
+                    self._drop(entry["key"])
+            return
+        sidecar = {k: entry[k] for k in ("key", "text", "meta", "created")}
+        sidecar_path = entry["path"][:-4] + ".json"
+        tmp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False)
+        os.replace(tmp_path, sidecar_path)
+        with self._lock:
+            if self._entries.get(entry["key"]) is entry:
+                entry["audio"] = None
+            else:
+                # Evicted while the write was queued
+                self._remove_files(entry)
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            key, oldest = next(iter(self._entries.items()))
+            if self.stored_bytes <= self.max_bytes and now - oldest["created"] <= self.max_age:
+                break
+            self._drop(key)
+            self.evictions += 1
+        # Entries are in recency order, so old but recently used ones can sit further back
+        for key in [k for k, e in self._entries.items() if now - e["created"] > self.max_age]:
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.stored_bytes -= entry["size"]
+        if self.persist and entry["audio"] is None:
+            self._remove_files(entry)
+
+    def _remove_files(self, entry):
+        for path in (entry["path"], entry["path"][:-4] + ".json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _scan(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            sidecar_path = os.path.join(self.directory, name)
+            wav_path = sidecar_path[:-5] + ".wav"
+            try:
+                with open(sidecar_path, "r", encoding="utf-8") as f:
+                    sidecar = json.load(f)
+                stat = os.stat(wav_path)
+            except (OSError, ValueError):
+                continue
+            entry = dict(sidecar, audio=None, path=wav_path,
+                         size=stat.st_size + len(sidecar["text"].encode("utf-8")), last_used=stat.st_atime)
+            found.append(entry)
+        with self._lock:
+            for entry in sorted(found, key=lambda e: e["last_used"]):
+                self._entries[entry["key"]] = entry
+                self.stored_bytes += entry["size"]
+            self._evict()
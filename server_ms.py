@@ -1,50 +1,175 @@
 # Server.py File
+import time
+_process_started = time.monotonic()
+import asyncio
+import contextvars
+import signal
 import grpc
 from concurrent import futures
-import time
-import torch
-from TTS.api import TTS
+from contextlib import contextmanager
+from functools import partial
 import ollama
 import io
 import os
-import uuid
 import re
-from functools import lru_cache
-from pydub import AudioSegment
-from transformers import pipeline, MarianMTModel, MarianTokenizer
-import transformers
+from tts_pool import TTSWorkerPool
+from tts_scheduler import EXPECTED_CHARACTERS, PRIORITY_CLASSES, WorkTicket, current_ticket, scheduling
+from cost_model import CostModel, SLOUnreachable, StoryPlan, current_plan, planned
+from translation import translate_batch, prefetch_translation, register_translation_model, translation_cache
+from emotion import classify_emotions, register_emotion_classifier, stats as emotion_stats
+from model_registry import models
+from inference_profile import INFERENCE_PROFILE
+from llm_scheduler import LLMScheduler
+from conversation import ConversationStore
+from job_store import JobRunner, JobStore
+from audio_assembly import AudioAssembler, to_pcm16, encode_wav, trim_silence
+from audio_encoding import FfmpegUnavailable, check_output, create_encoder
+from result_cache import ResultCache, result_key
+from voice_cache import audio_file_key
+from text_chunking import chunk_segments
+from voice_store import VOICE_MAX_UPLOAD_MB, store_voice, voice_store
+from stage_timing import stage, timed_iter, track_request
+from telemetry import Counter, Gauge, Histogram, METRICS_PORT, current_trace_id, span, start_metrics_server
+from request_control import (
+    AdmissionController, AdmissionRejected, CancelToken, RequestCancelled, MAX_ACTIVE_REQUESTS
+)
 from proto import story_service_pb2
 from proto import story_service_pb2_grpc
 import threading
+import queue
 
-tts_lock = threading.Lock()
-
-transformers.logging.set_verbosity_error()
+# Read by transformers when it is first imported, which now happens in the model loaders
+os.environ.setdefault("TRANSFORMERS_VERBOSITY", "error")
 
 # ✅ Add this here
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Finished stories are cached by request content; output/ is the cache's on-disk
+# store, and with SAVE_OUTPUT_AUDIO=0 the cache is kept in memory only
+SAVE_OUTPUT_AUDIO = os.environ.get("SAVE_OUTPUT_AUDIO", "1") == "1"
+# Opened by open_stores(), not here: TTS workers re-import this module
+result_cache = None
+DIALOGUE_VOICE_PATH = "voices/female.wav"
+
+
+
+# Synthesis runs in a pool of worker processes, each with its own XTTS replica.
+# TTS_DEVICE=auto uses CUDA when it is available; on a CPU-only box set
+# TTS_WORKERS to the number of replicas the cores can feed and each replica
+# gets an equal share of threads.
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", "1"))
+TTS_DEVICE = os.environ.get("TTS_DEVICE", "auto")
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "xtts")
+# Each worker synthesizes this once before it reports ready; empty disables it
+TTS_WARMUP_TEXT = os.environ.get("TTS_WARMUP_TEXT", "Once upon a time, there was a story.")
+TTS_WARMUP_VOICE = os.environ.get("TTS_WARMUP_VOICE", "voices/Default Speaker.wav")
+# Segments from concurrent requests synthesized in one call, and how long the
+# first one waits for company; worth raising on a GPU, where one call uses
+# only part of the device
+TTS_MAX_BATCH = int(os.environ.get("TTS_MAX_BATCH", "1"))
+TTS_BATCH_WAIT_MS = float(os.environ.get("TTS_BATCH_WAIT_MS", "20"))
+# Segments a request keeps queued for TTS beyond the one it is waiting for;
+# they are prepared on another thread while earlier ones are trimmed and
+# encoded. 0 runs every segment's stages strictly one after another.
+TTS_LOOKAHEAD = int(os.environ.get("TTS_LOOKAHEAD", "2"))
+# Translation models to load at startup, e.g. "es,fr"; others load on first use
+PRELOAD_TRANSLATIONS = [lang for lang in os.environ.get("PRELOAD_TRANSLATIONS", "").split(",") if lang]
+# Ollama models to load at startup, e.g. "llama3.2:1b"; others load with their first run
+PRELOAD_LLM_MODELS = [model for model in os.environ.get("PRELOAD_LLM_MODELS", "").split(",") if model]
+
+tts_backend_options = {}
+if TTS_BACKEND == "xtts":
+    tts_backend_options["device"] = TTS_DEVICE
+    tts_backend_options["threads"] = max(1, (os.cpu_count() or 1) // TTS_WORKERS)
+tts_warmup = None
+if TTS_WARMUP_TEXT and os.path.exists(TTS_WARMUP_VOICE):
+    tts_warmup = {"text": TTS_WARMUP_TEXT, "speaker_path": TTS_WARMUP_VOICE, "language": "en", "speed": 1.0}
+tts_pool = TTSWorkerPool(
+    backend=TTS_BACKEND,
+    workers=TTS_WORKERS,
+    backend_options=tts_backend_options,
+    job_timeout=float(os.environ.get("TTS_JOB_TIMEOUT", "300")),
+    warmup=tts_warmup,
+    max_batch=TTS_MAX_BATCH,
+    max_wait=TTS_BATCH_WAIT_MS / 1000
+)
+SAMPLE_RATE = tts_pool.sample_rate
+
+# At most MAX_ACTIVE_REQUESTS stories are generated at once, each on its own
+# thread; MAX_QUEUED_REQUESTS more may wait, the rest get RESOURCE_EXHAUSTED
+admission = AdmissionController()
+pipeline_executor = futures.ThreadPoolExecutor(max_workers=MAX_ACTIVE_REQUESTS, thread_name_prefix="story")
+SHUTDOWN_GRACE = float(os.environ.get("SHUTDOWN_GRACE", "30"))
+# Uploaded voices and finished stories both travel inside gRPC messages
+GRPC_MAX_MESSAGE_MB = int(os.environ.get("GRPC_MAX_MESSAGE_MB", "100"))
+
+# ---------- Models ----------
+# Nothing heavy loads at import: serve() binds the port first and the registry
+# loads and warms the models in the background. Ready() turns OK once they are.
 
+def start_tts_pool():
+    tts_pool.start()
+    if not tts_pool.wait_ready():
+        raise RuntimeError("no TTS worker could load its model")
+    return tts_pool
 
+# The replicas live in the worker processes, so their memory is measured there
+models.register("tts", start_tts_pool, size=lambda pool: pool.memory())
+register_emotion_classifier()
+for lang in PRELOAD_TRANSLATIONS:
+    # Other pairs register on first use; all of them can be evicted under memory pressure
+    register_translation_model("en", lang, required=True)
 
-# Load TTS model
-# tts = TTS(
-#     model_path="xtts_model",
-#     config_path="xtts_model/config.json",
-#     progress_bar=False
-# )
+def preload_llm(model, keep_alive=None):
+    # A chat without messages makes Ollama load the model and return
+    ollama.chat(model=model, messages=[], keep_alive=keep_alive or llm_scheduler.keep_alive)
 
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False)
+# Generations are grouped by model so mixed paragraph levels do not make
+# Ollama swap models between requests
+llm_scheduler = LLMScheduler(preload=preload_llm)
+for model in PRELOAD_LLM_MODELS:
+    # Ollama runs separately, so the server can serve without it preloaded
+    models.register(f"llm-{model}", partial(preload_llm, model), required=False)
 
+# Completion-time estimates, learned from finished requests; requests with a
+# deadline are degraded or rejected by them under load
+costs = CostModel()
 
+# Conversation context is per session; requests without a session_id are stateless
+conversations = ConversationStore()
 
+# SubmitStories jobs live in SQLite, so a restart resumes them instead of losing them.
+# Opened by open_stores() like the result cache.
+jobs = None
+job_runner = None
 
-tts.to("cuda")
+# ---------- Metrics ----------
+# Prometheus text on METRICS_PORT. Stage and queue-wait histograms are defined
+# next to the code they time (stage_timing, tts_pool, request_control).
 
-# Load emotion classifier
-emotion_classifier = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", top_k=1)
+REQUESTS = Counter("story_requests_total", "Story requests by RPC and outcome", ["rpc", "outcome"])
+REQUEST_SECONDS = Histogram("story_request_seconds", "Time to generate a story, successful requests only", ["rpc"])
+SEGMENTS = Counter("story_segments_total", "Segments synthesized", ["type"])
+CHARACTERS = Counter("tts_characters_total", "Characters synthesized", ["language"])
+DEGRADED = Counter("story_degraded_total", "Requests served with a cheaper plan to meet their deadline", ["step"])
+Gauge("story_requests_in_flight", "Requests being generated", fn=lambda: admission.active)
+Gauge("story_requests_queued", "Requests waiting for a slot", fn=lambda: admission.waiting)
+Gauge("tts_queue_depth", "Segments waiting for a TTS worker", fn=lambda: tts_pool.stats()["queued"])
+Gauge("tts_workers_busy", "TTS workers synthesizing a segment", fn=lambda: sum(w["busy"] for w in tts_pool.health()))
+Gauge("story_jobs_running", "Jobs being generated", fn=lambda: job_runner.running)
+Gauge("story_jobs_queued", "Jobs waiting for a job worker", fn=lambda: jobs.counts().get("queued", 0))
 
-chat_history = []
+def cache_lookups():
+    result, translation = result_cache.stats(), translation_cache.stats()
+    return {
+        "hits": {("result",): result["hits"] + result["coalesced"], ("translation",): translation["hits"],
+                 ("emotion",): emotion_stats["cache_hits"]},
+        "misses": {("result",): result["misses"], ("translation",): translation["misses"],
+                   ("emotion",): emotion_stats["classified"] + emotion_stats["failures"]},
+    }
+
+Counter("cache_hits_total", "Lookups served from a cache", ["cache"], fn=lambda: cache_lookups()["hits"])
+Counter("cache_misses_total", "Lookups that had to compute the value", ["cache"], fn=lambda: cache_lookups()["misses"])
 
 # Prompts
 SHORT_DIALOGUE_PROMPT = """You are a creative storyteller writing for an audio story narration.
@@ -146,21 +271,8 @@ def sanitize_filename(prompt_text, speaker_display_name, max_length=70):
     base = re.sub(r'[^\w\s-]', '', base)
     base = re.sub(r'\s+', ' ', base)
     base = base[:max_length]
-    filename = f"{base} - {speaker_display_name}.wav"
-    return os.path.join(OUTPUT_DIR, filename)
-
-def detect_leading_silence(sound, silence_thresh=-40, chunk_size=10):
-    trim_ms = 0
-    while trim_ms < len(sound):
-        if sound[trim_ms:trim_ms + chunk_size].dBFS > silence_thresh:
-            return trim_ms
-        trim_ms += chunk_size
-    return trim_ms
-
-def trim_silence(audio, silence_thresh=-40, chunk_size=10):
-    start = detect_leading_silence(audio, silence_thresh, chunk_size)
-    end = detect_leading_silence(audio.reverse(), silence_thresh, chunk_size)
-    return audio[start:len(audio) - end]
+    # The result cache appends the request hash, so equal prompts never share a file
+    return f"{base} - {speaker_display_name}"
 
 def clean_sentence(text: str) -> str:
     text = text.strip()
@@ -171,98 +283,215 @@ def clean_sentence(text: str) -> str:
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
-@lru_cache(maxsize=5)
-def load_translation_model(src_lang, tgt_lang):
-    model_name = f"Helsinki-NLP/opus-mt-{src_lang}-{tgt_lang}"
-    model = MarianMTModel.from_pretrained(model_name)
-    tokenizer = MarianTokenizer.from_pretrained(model_name)
-    return model, tokenizer
-
-def translate_text_huggingface(text, src_lang='en', tgt_lang='es'):
-    model, tokenizer = load_translation_model(src_lang, tgt_lang)
-    inputs = tokenizer(text, return_tensors='pt', padding=True)
-    translated = model.generate(
-        input_ids=inputs["input_ids"],
-        attention_mask=inputs["attention_mask"]
-    )
-    return tokenizer.decode(translated[0], skip_special_tokens=True)
+class StorySegmenter:
+    """Splits a story into narration and quoted dialogue as it streams in.
+
+    Text is fed as it arrives from the LLM. Quoted dialogue is emitted when
+    its closing quote arrives and narration is emitted one sentence at a
+    time, so synthesis can start long before the story is finished. A quote
+    runs to the next double quote even across a line break, so dialogue the
+    LLM wraps over several lines is still one dialogue segment.
+    """
+    SENTENCE_END = re.compile(r'[.!?]+[\'")\]]*(?=\s)')
+
+    def __init__(self, split_dialogues=True):
+        self.split_dialogues = split_dialogues
+        self._parts = []
+        self._buffer = ""
+        self._in_quote = False
 
-def detect_emotion(text):
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def feed(self, token):
+        self._parts.append(token)
+        self._buffer += token
+        return list(self._drain())
+
+    def close(self):
+        segments = list(self._drain())
+        rest = self._buffer
+        if self._in_quote:
+            # An unterminated quote is left as narration, opening quote included
+            rest = '"' + rest
+        if rest.strip():
+            segments.append({"type": "narration", "text": rest.strip()})
+        self._buffer = ""
+        self._in_quote = False
+        return segments
+
+    def _drain(self):
+        while True:
+            if self._in_quote:
+                end = self._buffer.find('"')
+                if end < 0:
+                    return
+                yield {"type": "dialogue", "text": self._buffer[:end].strip()}
+                self._buffer = self._buffer[end + 1:]
+                self._in_quote = False
+                continue
+            quote = self._buffer.find('"') if self.split_dialogues else -1
+            match = self.SENTENCE_END.search(self._buffer)
+            if match and (quote < 0 or match.end() <= quote):
+                sentence = self._buffer[:match.end()].strip()
+                self._buffer = self._buffer[match.end():]
+                if sentence:
+                    yield {"type": "narration", "text": sentence}
+                continue
+            if quote >= 0:
+                before = self._buffer[:quote].strip()
+                self._buffer = self._buffer[quote + 1:]
+                self._in_quote = True
+                if before:
+                    yield {"type": "narration", "text": before}
+                continue
+            return
+
+def cancellable(tokens, cancel):
     try:
-        label = emotion_classifier(text)[0][0]["label"].lower()
-        if label in ["joy", "happiness"]:
-            return "happy"
-        elif label in ["anger"]:
-            return "angry"
-        elif label in ["sadness", "fear", "disgust"]:
-            return "sad"
-        else:
-            return "neutral"
-    except:
-        return "neutral"
-
-def split_into_narration_and_dialogues(text):
-    pattern = r'"(.*?)"'
-    dialogues = re.findall(pattern, text)
-    parts = re.split(pattern, text)
-    result = []
-    for i, part in enumerate(parts):
-        if i % 2 == 0 and part.strip():
-            result.append({"type": "narration", "text": part.strip()})
-        elif i % 2 == 1:
-            result.append({"type": "dialogue", "text": part.strip()})
-    return result
+        for token in timed_iter("llm", tokens):
+            cancel.check()
+            yield token
+    finally:
+        # Closing the Ollama stream drops its HTTP connection, which stops generation
+        tokens.close()
+
+def iter_story_segments(tokens, segmenter):
+    try:
+        for token in tokens:
+            yield from segmenter.feed(token)
+        yield from segmenter.close()
+    finally:
+        # Passes a close on to the token stream, so stopping early stops the LLM
+        tokens.close()
+
+def prefetch_batches(iterable):
+    """Run an iterator on a background thread and yield everything it has produced so far as a list.
+
+    The producer never waits on the consumer, and a slow consumer gets
+    larger batches, which is what the batched translation stage wants. When
+    the consumer stops early, for whatever reason, the producer stops after
+    its current item and closes ``iterable``.
+    """
+    items = queue.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    return
+                items.put((item, None))
+            items.put((done, None))
+        except Exception as e:
+            items.put((None, e))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    # Run in a copy of the caller's context so the producer's stage timings count for its request
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+    try:
+        finished = False
+        while not finished:
+            batch = []
+            block = True
+            while True:
+                try:
+                    item, error = items.get(block=block)
+                except queue.Empty:
+                    break
+                if error is not None:
+                    raise error
+                if item is done:
+                    finished = True
+                    break
+                batch.append(item)
+                block = False
+            if batch:
+                yield batch
+    finally:
+        stop.set()
+
+def run_ahead(iterable, depth, discard=None):
+    """Run an iterator on a background thread, at most ``depth`` items ahead of the consumer.
+
+    The next item is only produced once fewer than ``depth`` are queued or
+    still being used by the consumer, which bounds the work started ahead.
+    Items produced but never consumed, because the consumer stopped early,
+    are passed to ``discard``.
+    """
+    items = queue.Queue()
+    slots = threading.Semaphore(depth)
+    stop = threading.Event()
+    done = object()
+
+    def drain():
+        while True:
+            try:
+                item, error = items.get_nowait()
+            except queue.Empty:
+                return
+            if discard is not None and error is None and item is not done:
+                discard(item)
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            while True:
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    items.put((done, None))
+                    return
+                items.put((item, None))
+                if stop.is_set():
+                    return
+        except Exception as e:
+            items.put((None, e))
+        finally:
+            if stop.is_set():
+                drain()
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    # Run in a copy of the caller's context so the producer's stages and TTS ticket count for its request
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+            slots.release()
+    finally:
+        stop.set()
+        drain()
 
 # ---------- Audio Generation ----------
 
-def generate_narration_only_audio(text, speed, language, speaker_path, emotion, prompt, speaker_display_name):
-    if language != "en":
-        text = translate_text_huggingface(text, src_lang="en", tgt_lang=language)
-    cleaned_text = clean_sentence(text)
-    if not cleaned_text:
-        return b'', ''
-    final_path = sanitize_filename(prompt, speaker_display_name)
-    with tts_lock:
-        tts.tts_to_file(
-            text=cleaned_text,
-            speaker_wav=speaker_path,
-            language=language,
-            emotion=emotion,
-            speed=speed,
-            file_path=final_path
-        )
-    with open(final_path, "rb") as f:
-        return f.read(), final_path
-
-def generate_narration_with_dialogue_audio(segments, emotion, speed, language, narrator_voice_path, dialogue_voice_path, prompt, speaker_display_name):
-    combined = AudioSegment.silent(duration=500)
-    for segment in segments:
-        text = clean_sentence(segment["text"])
-        if not text:
-            continue
-        if language != "en":
-            text = translate_text_huggingface(text, src_lang="en", tgt_lang=language)
-        speaker_path = narrator_voice_path if segment["type"] == "narration" else dialogue_voice_path
-        segment_emotion = emotion if segment["type"] == "narration" else detect_emotion(text)
-        temp_filename = f"temp_{uuid.uuid4().hex}.wav"
-        with tts_lock:
-            tts.tts_to_file(
-                text=text,
-                speaker_wav=speaker_path,
-                language=language,
-                emotion=segment_emotion,
-                speed=speed,
-                file_path=temp_filename
-            )
-        audio = AudioSegment.from_wav(temp_filename)
-        audio = trim_silence(audio).fade_in(20).fade_out(20)
-        combined += audio + AudioSegment.silent(duration=300)
-        os.remove(temp_filename)
-    final_path = sanitize_filename(prompt, speaker_display_name)
-    combined.export(final_path, format="wav")
-    with open(final_path, "rb") as f:
-        return f.read(), final_path
-    
+def submit_segment(text, speaker_path, language, speed):
+    return tts_pool.submit(text, speaker_path, language, speed, current_ticket())
+
+def receive_segment(future, cancel):
+    # Only the time spent waiting for the audio counts as synthesis; the rest overlapped other stages
+    with stage("synthesis"):
+        pcm = to_pcm16(cancel.result(future))
+    with stage("trimming"):
+        return trim_silence(pcm, sample_rate=SAMPLE_RATE)
+
+def synthesize_ahead(submissions):
+    """Yield ``(segment, future)`` pairs in order while later ones are prepared and queued for TTS."""
+    return run_ahead(submissions, TTS_LOOKAHEAD + 1, discard=lambda item: item[1].cancel())
+
 # ---------- LLM Handling ----------
 
 def get_prompt(split_voices: bool, level: str) -> str:
@@ -279,98 +508,760 @@ def get_prompt(split_voices: bool, level: str) -> str:
         }
     }[split_voices][level]
 
-def get_llama3_response(user_input, split_voices):
-    chat_history.append({"role": "user", "content": user_input})
+def select_model(user_input):
     if "[PARA_LEVEL:1–3]" in user_input:
-        model_name = "llama3.2:1b"
-        num_predict = 2000
-        level = "short"
+        return "llama3.2:1b", 2000, "short"
     elif "[PARA_LEVEL:4–7]" in user_input:
-        model_name = "mistral:7b-instruct"
-        num_predict = 2000
-        level = "medium"
+        return "mistral:7b-instruct", 2000, "medium"
     else:
-        model_name = "llama3"
-        num_predict = 2000
-        level = "long"
-    prompt = get_prompt(split_voices, level)
-    stripped_input = re.sub(r'\[PARA_LEVEL:.*?\]', '', user_input).strip()
-    full_prompt = f"{prompt}{stripped_input}"
-    chat_history[-1]["content"] = full_prompt
-    response = ollama.chat(
-        model=model_name,
-        messages=chat_history,
-        options={
-            "num_predict": num_predict,
-            "temperature": 0.9,
-            "top_p": 0.95,
-            "stop": []
-        }
+        return "llama3", 2000, "long"
+
+def stream_llama3_response(user_input, split_voices, session_id="", seed=None, cancel=None):
+    model_name, num_predict, level = select_model(user_input)
+    plan = current_plan()
+    if plan is not None:
+        # Under load a request may get a smaller model, or a shorter story's prompt and budget
+        model_name, num_predict, level = plan.model, plan.num_predict, plan.prompt_level
+    storyline = re.sub(r'\[PARA_LEVEL:.*?\]', '', user_input).strip()
+    # The instructions go first as a system message, identical for every request of
+    # this model and mode, so Ollama reuses their cached evaluation across requests
+    messages = [{"role": "system", "content": get_prompt(split_voices, level).strip()}]
+    messages += conversations.build_messages(session_id, storyline)
+    options = {
+        "num_predict": num_predict,
+        "temperature": 0.9,
+        "top_p": 0.95,
+        "stop": []
+    }
+    if seed is not None:
+        options["seed"] = seed
+    with span("llm", model=model_name, level=level) as llm_span, \
+            llm_scheduler.slot(model_name, cancel) as keep_alive:
+        stream = ollama.chat(
+            model=model_name,
+            messages=messages,
+            options=options,
+            stream=True,
+            keep_alive=keep_alive
+        )
+        reply = []
+        for part in stream:
+            token = part.message.content
+            reply.append(token)
+            yield token
+        llm_span.set(tokens=len(reply))
+    conversations.record(session_id, storyline, "".join(reply))
+
+# ---------- Story Pipeline ----------
+
+def request_seed(request):
+    return request.seed if request.HasField("seed") else None
+
+def story_cache_key(request):
+    """Hash of everything that shapes the result, or None when it must not be shared."""
+    if request.session_id:
+        # Earlier turns of the session change what the LLM writes
+        return None
+    try:
+        narrator_voice = audio_file_key(request.speaker_audio)
+        dialogue_voice = audio_file_key(DIALOGUE_VOICE_PATH) if request.include_narration else None
+    except OSError:
+        return None
+    plan = current_plan()
+    # Degraded stories differ from full ones; keys of full ones stay as they were
+    degradations = {"degradations": list(plan.degradations)} if plan is not None and plan.degradations else {}
+    return result_key(
+        **degradations,
+        prompt=re.sub(r'\[PARA_LEVEL:.*?\]', '', request.prompt).strip(),
+        level=select_model(request.prompt)[2],
+        split_voices=request.include_narration,
+        narrator_voice=narrator_voice,
+        dialogue_voice=dialogue_voice,
+        emotion=request.emotion,
+        speed=request.speed,
+        language=request.language,
+        seed=request_seed(request),
+        tts_backend=TTS_BACKEND,
     )
-    reply = response.message.content
-    chat_history.append({"role": "assistant", "content": reply})
-    return reply
 
-# ---------- gRPC Service ----------
+def story_plan(request, priority="standard"):
+    model, num_predict, level = select_model(request.prompt)
+    return StoryPlan(level, model, num_predict, request.include_narration, request.language, priority)
 
-class StoryServiceServicer(story_service_pb2_grpc.StoryServiceServicer):
-    def GenerateStory(self, request, context):
+def plan_request(request, context):
+    """Estimate when the request finishes, made cheaper or rejected if that misses its deadline.
+
+    The priority class comes from story-priority metadata. A request whose
+    deadline cannot be met even fully degraded is rejected like an
+    overloaded server, with the overshoot as the retry hint.
+    """
+    priority = dict(context.invocation_metadata() or ()).get("story-priority", "standard")
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"unknown priority {priority!r}; use one of {', '.join(PRIORITY_CLASSES)}")
+    plan = story_plan(request, priority)
+    admission_wait = admission.retry_after() if admission.active >= admission.max_active else 0.0
+    try:
+        plan = costs.choose(plan, context.time_remaining(), admission_wait, TTS_WORKERS)
+    except SLOUnreachable as e:
+        raise AdmissionRejected(f"deadline cannot be met: {e}", e.overshoot) from None
+    for step in plan.degradations:
+        DEGRADED.inc(step=step)
+    if plan.degradations:
+        print(f"📉 {plan.level} story degraded ({', '.join(plan.degradations)}) to finish in an estimated "
+              f"{plan.eta:.0f}s of the {context.time_remaining():.0f}s left")
+    return plan
+
+def plan_metadata(plan):
+    return (("story-eta-seconds", f"{plan.eta:.1f}"), ("story-degradations", ",".join(plan.degradations)))
+
+def request_ticket(plan):
+    """The TTS scheduler's view of a request."""
+    return WorkTicket(plan.priority, costs.expected_chars(plan))
+
+def calibrate(plan, timings, story_text):
+    costs.observe(plan, timings.as_dict(), len(story_text))
+    stats = tts_pool.stats()
+    costs.observe_tts(stats["busy_seconds"], stats["characters"])
+
+def store_uploaded_voice(request):
+    # Uploaded voices are stored by content, so the rest of the pipeline only deals in paths
+    if request.speaker_audio_data:
+        request.speaker_audio = store_voice(request.speaker_audio_data)
+        request.ClearField("speaker_audio_data")
+    elif request.voice_id:
         try:
-            prompt = request.prompt
-            emotion = request.emotion
-            speed = request.speed
-            language = request.language
-            speaker_audio_path = request.speaker_audio
-            split_voices = request.include_narration
-
-            speaker_display_name = os.path.basename(speaker_audio_path).split(".")[0].title()
-            story_text = get_llama3_response(prompt, split_voices)
-
-            if split_voices:
-                segments = split_into_narration_and_dialogues(story_text)
-                dialogue_voice = "voices/female.wav"
-                audio_data, _ = generate_narration_with_dialogue_audio(
-                    segments=segments,
-                    emotion=emotion,
-                    speed=speed,
-                    language=language,
-                    narrator_voice_path=speaker_audio_path,
-                    dialogue_voice_path=dialogue_voice,
-                    prompt=prompt,
-                    speaker_display_name=speaker_display_name
-                )
-            else:
-                audio_data, _ = generate_narration_only_audio(
-                    text=story_text,
-                    speed=speed,
-                    language=language,
-                    speaker_path=speaker_audio_path,
-                    emotion=emotion,
-                    prompt=prompt,
-                    speaker_display_name=speaker_display_name
-                )
-
-            return story_service_pb2.StoryResponse(
-                audio=audio_data,
-                text=story_text,
-                message="success"
+            request.speaker_audio = voice_store().path(request.voice_id)
+        except KeyError:
+            raise ValueError(f"unknown voice_id {request.voice_id!r}") from None
+
+def generate_story_chunks(request, cancel=None):
+    """Serve a story from the result cache, or generate it and store it there.
+
+    Identical concurrent requests share one generation: the first streams it
+    live, the others wait and then replay the stored result.
+    """
+    cancel = cancel or CancelToken()
+    store_uploaded_voice(request)
+    try:
+        yield from cached_story_chunks(request, cancel)
+    except RequestCancelled as e:
+        print(f"🛑 Request stopped ({e.reason}); remaining LLM and TTS work skipped")
+        raise
+
+def cached_story_chunks(request, cancel):
+    key = story_cache_key(request)
+    if key is None:
+        yield from run_story_pipeline(request, cancel)
+        return
+    with stage("cache_wait"):
+        entry, lease = result_cache.acquire(key, cancel)
+    if entry is not None:
+        stats = result_cache.stats()
+        print(f"♻️ Result cache hit {key[:12]} (hit ratio {stats['hit_ratio']}, {stats['bytes_saved']} bytes saved)")
+        yield from replay_story_chunks(entry)
+        return
+    with lease:
+        segments = []
+        pcm = []
+        offset = 0
+        story_text = ''
+        for chunk in run_story_pipeline(request, cancel):
+            kind = chunk.WhichOneof("chunk")
+            if kind == "text":
+                segments.append({"type": chunk.text.segment_type, "text": chunk.text.text,
+                                 "emotion": chunk.text.emotion, "start": offset})
+            elif kind == "audio":
+                pcm.append(chunk.audio.pcm)
+                offset += len(chunk.audio.pcm)
+                segments[-1]["end"] = offset
+            elif kind == "complete":
+                story_text = chunk.complete.text
+            yield chunk
+        if pcm:
+            speaker_display_name = os.path.basename(request.speaker_audio).split(".")[0].title()
+            with stage("assembly"):
+                audio = encode_wav(pcm, SAMPLE_RATE)
+            lease.complete(
+                story_text, audio,
+                meta={"sample_rate": SAMPLE_RATE, "segments": segments},
+                name=sanitize_filename(request.prompt, speaker_display_name)
             )
+
+def replay_story_chunks(entry):
+    audio = memoryview(result_cache.read_audio(entry))[44:]
+    for index, segment in enumerate(entry["meta"]["segments"]):
+        yield story_service_pb2.StoryChunk(text=story_service_pb2.TextChunk(
+            index=index, segment_type=segment["type"], text=segment["text"], emotion=segment["emotion"]
+        ))
+        yield story_service_pb2.StoryChunk(audio=story_service_pb2.AudioChunk(
+            index=index, pcm=bytes(audio[segment["start"]:segment["end"]]),
+            sample_rate=entry["meta"]["sample_rate"]
+        ))
+    yield story_service_pb2.StoryChunk(complete=story_service_pb2.StoryComplete(
+        text=entry["text"], message="success"
+    ))
+
+def prepare_segments(segments, language, cancel, start=0):
+    """Clean, classify, translate and chunk segments from the segmenter; returns the TTS chunks."""
+    cancel.check()
+    segments = [dict(segment, text=clean_sentence(segment["text"])) for segment in segments]
+    segments = [segment for segment in segments if segment["text"]]
+    # The classifier is English-only, so dialogue is classified before translation
+    plan = current_plan()
+    # Skipped under load; dialogue then takes the request's emotion
+    dialogues = [segment for segment in segments if segment["type"] == "dialogue"
+                 and (plan is None or plan.classify_emotions)]
+    with stage("emotion"):
+        emotions = classify_emotions([segment["text"] for segment in dialogues])
+    for segment, result in zip(dialogues, emotions):
+        segment["emotion"] = result.emotion
+        if result.error:
+            print(f"⚠️ Emotion detection failed for {segment['text'][:40]!r}: {result.error}")
+    cancel.check()
+    if language != "en":
+        with stage("translation"):
+            translated = translate_batch([segment["text"] for segment in segments], src_lang="en", tgt_lang=language)
+        for segment, text in zip(segments, translated):
+            segment["text"] = text
+    # Limits are per target language, so sentences are regrouped after translation
+    return chunk_segments(segments, language, start=start)
+
+def run_story_pipeline(request, cancel):
+    """Yield TextChunk/AudioChunk messages per segment while the LLM is still writing.
+
+    ``cancel`` is checked for every LLM token, before each stage and before
+    each segment, so a request whose client left stops using the LLM and TTS.
+    """
+    language = request.language
+    speed = request.speed
+    split_voices = request.include_narration
+    narrator_voice_path = request.speaker_audio
+    dialogue_voice_path = DIALOGUE_VOICE_PATH
+
+    if language != "en":
+        prefetch_translation("en", language)
+    assembler = AudioAssembler(SAMPLE_RATE)
+    segmenter = StorySegmenter(split_dialogues=split_voices)
+    tokens = stream_llama3_response(request.prompt, split_voices, request.session_id, request_seed(request), cancel)
+    batches = prefetch_batches(iter_story_segments(cancellable(tokens, cancel), segmenter))
+
+    def submissions():
+        index = 0
+        # The scheduler's view of the story's length: at least what has been submitted, exact once the LLM is done
+        ticket = current_ticket()
+        submitted = 0
+        try:
+            for batch in batches:
+                # Everything the LLM wrote while earlier segments were prepared
+                batch = prepare_segments(batch, language, cancel, start=index)
+                index += len(batch)
+                for segment in batch:
+                    cancel.check()
+                    speaker_path = narrator_voice_path if segment["type"] == "narration" else dialogue_voice_path
+                    submitted += len(segment["text"])
+                    if ticket is not None:
+                        ticket.expected_chars = max(ticket.expected_chars, submitted)
+                    yield segment, submit_segment(segment["text"], speaker_path, language, speed)
+            if ticket is not None:
+                ticket.expected_chars = submitted
+        finally:
+            batches.close()
+
+    # Closed explicitly rather than when collected, so a failure anywhere below stops the LLM at once
+    segments = synthesize_ahead(submissions())
+    try:
+        for segment, future in segments:
+            cancel.check()
+            text = segment["text"]
+            yield story_service_pb2.StoryChunk(text=story_service_pb2.TextChunk(
+                index=segment["index"], segment_type=segment["type"], text=text,
+                emotion=segment.get("emotion", request.emotion)
+            ))
+
+            with span("segment", index=segment["index"], type=segment["type"], characters=len(text), language=language):
+                segment_pcm = receive_segment(future, cancel)
+                with stage("assembly"):
+                    pcm = assembler.render(segment_pcm)
+            SEGMENTS.inc(type=segment["type"])
+            CHARACTERS.inc(len(text), language=language)
+            yield story_service_pb2.StoryChunk(audio=story_service_pb2.AudioChunk(
+                index=segment["index"], pcm=pcm.tobytes(), sample_rate=SAMPLE_RATE
+            ))
+    finally:
+        segments.close()
+
+    yield story_service_pb2.StoryChunk(complete=story_service_pb2.StoryComplete(
+        text=segmenter.text, message="success"
+    ))
+
+def tracked_story_chunks(request, cancel):
+    story_text = ''
+    with track_request() as timings:
+        for chunk in generate_story_chunks(request, cancel):
+            if chunk.WhichOneof("chunk") == "complete":
+                story_text = chunk.complete.text
+            yield chunk
+    calibrate(current_plan() or story_plan(request), timings, story_text)
+    print(f"⏱️ Stages {current_trace_id()}: {timings.as_dict()}, busy {timings.utilization()}")
+
+def collect_story(request, cancel):
+    # Segments are encoded as they arrive, so little is left to do when the story ends
+    encoder = create_encoder(request.output_format, SAMPLE_RATE, request.output_sample_rate, request.bitrate_kbps)
+    samples = 0
+    story_text = ''
+    with track_request() as timings:
+        try:
+            for chunk in generate_story_chunks(request, cancel):
+                kind = chunk.WhichOneof("chunk")
+                if kind == "audio":
+                    with stage("encoding"):
+                        encoder.write(chunk.audio.pcm)
+                    samples += len(chunk.audio.pcm) // 2
+                elif kind == "complete":
+                    story_text = chunk.complete.text
+            with stage("encoding"):
+                if samples:
+                    audio_data = encoder.finish()
+                else:
+                    encoder.abort()
+                    audio_data = b''
+        except BaseException:
+            encoder.abort()
+            raise
+    plan = current_plan() or story_plan(request)
+    calibrate(plan, timings, story_text)
+    print(f"⏱️ Stages {current_trace_id()}: {timings.as_dict()}, busy {timings.utilization()}")
+
+    return story_service_pb2.StoryResponse(
+        audio=audio_data,
+        text=story_text,
+        message="success",
+        content_type=encoder.content_type,
+        duration_seconds=samples / SAMPLE_RATE,
+        eta_seconds=plan.eta or 0.0,
+        degradations=plan.degradations
+    )
+
+async def stream_in_thread(chunks, cancel):
+    """Drive a blocking chunk generator on the pipeline executor and yield its chunks."""
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                loop.call_soon_threadsafe(ready.put_nowait, chunk)
+            loop.call_soon_threadsafe(ready.put_nowait, done)
         except Exception as e:
-            context.set_details(str(e))
-            context.set_code(grpc.StatusCode.INTERNAL)
-            return story_service_pb2.StoryResponse(audio=b'', text='', message="error")
+            loop.call_soon_threadsafe(ready.put_nowait, e)
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
+    loop.run_in_executor(pipeline_executor, contextvars.copy_context().run, produce)
+    finished = False
+    try:
+        while True:
+            item = await ready.get()
+            if item is done:
+                finished = True
+                return
+            if isinstance(item, Exception):
+                finished = True
+                raise item
+            yield item
+    finally:
+        if not finished:
+            cancel.cancel()
+
+async def reject(context, error):
+    code = grpc.StatusCode.UNAVAILABLE if admission.draining else grpc.StatusCode.RESOURCE_EXHAUSTED
+    print(f"⛔ Rejected request: {error}")
+    await context.abort(code, str(error), trailing_metadata=(
+        ("grpc-retry-pushback-ms", str(int(error.retry_after * 1000))),
+    ))
+
+def stopped_status(error):
+    if error.reason == "deadline exceeded":
+        return grpc.StatusCode.DEADLINE_EXCEEDED
+    return grpc.StatusCode.CANCELLED
+
+@contextmanager
+def traced_rpc(rpc, request):
+    """Span, outcome counter and duration histogram for one story RPC.
+
+    Handlers set the span's ``outcome`` attribute when they fail a request;
+    anything else that escapes counts as ``error``.
+    """
+    start = time.monotonic()
+    with span(rpc, level=select_model(request.prompt)[2], language=request.language,
+              include_narration=request.include_narration, output_format=request.output_format or "wav") as rpc_span:
+        try:
+            yield rpc_span
+        except (asyncio.CancelledError, GeneratorExit):
+            rpc_span.attributes.setdefault("outcome", "cancelled")
+            raise
+        except BaseException:
+            rpc_span.attributes.setdefault("outcome", "error")
+            raise
+        finally:
+            outcome = rpc_span.attributes.setdefault("outcome", "ok")
+            REQUESTS.inc(rpc=rpc, outcome=outcome)
+            if outcome == "ok":
+                REQUEST_SECONDS.observe(time.monotonic() - start, rpc=rpc)
+
+# ---------- Jobs ----------
+
+def run_job(job, cancel):
+    """Generate a SubmitStories job, saving progress so a restart resumes where it stopped.
+
+    The story text is written in full and saved first. It is then split into
+    segments, which are saved and synthesized in order, each segment's audio
+    being saved as soon as it is ready. What is already saved is skipped.
+    """
+    job_id = job["id"]
+    request = story_service_pb2.StoryRequest.FromString(job["request"])
+    level = select_model(request.prompt)[2]
+    with span("job", job_id=job_id, attempt=job["attempts"], level=level,
+              language=request.language, include_narration=request.include_narration), \
+            scheduling(WorkTicket("batch", EXPECTED_CHARACTERS[level])):
+        with track_request() as timings:
+            text = job["text"]
+            if request.language != "en":
+                prefetch_translation("en", request.language)
+            if text is None:
+                jobs.set_stage(job_id, "llm")
+                tokens = stream_llama3_response(request.prompt, request.include_narration, request.session_id,
+                                                request_seed(request), cancel)
+                text = "".join(cancellable(tokens, cancel))
+                jobs.save_text(job_id, text)
+            segments = jobs.segments(job_id)
+            if not segments:
+                jobs.set_stage(job_id, "segmenting")
+                segmenter = StorySegmenter(split_dialogues=request.include_narration)
+                jobs.save_segments(job_id, prepare_segments(segmenter.feed(text) + segmenter.close(), request.language, cancel))
+                segments = jobs.segments(job_id)
+
+            jobs.set_stage(job_id, "synthesis")
+            ticket = current_ticket()
+            ticket.expected_chars = sum(len(segment["text"]) for segment in segments)
+            ticket.done_chars = sum(len(segment["text"]) for segment in segments if segment["done"])
+            assembler = AudioAssembler(SAMPLE_RATE)
+            # Segments saved before a restart still count, so only the first one gets the lead-in
+            assembler.rendered = sum(segment["done"] for segment in segments)
+
+            def submissions():
+                for segment in segments:
+                    if segment["done"]:
+                        continue
+                    cancel.check()
+                    speaker_path = request.speaker_audio if segment["type"] == "narration" else DIALOGUE_VOICE_PATH
+                    yield segment, submit_segment(segment["text"], speaker_path, request.language, request.speed)
+
+            for segment, future in synthesize_ahead(submissions()):
+                cancel.check()
+                with span("segment", index=segment["idx"], type=segment["type"], characters=len(segment["text"]),
+                          language=request.language):
+                    segment_pcm = receive_segment(future, cancel)
+                    with stage("assembly"):
+                        pcm = assembler.render(segment_pcm)
+                SEGMENTS.inc(type=segment["type"])
+                CHARACTERS.inc(len(segment["text"]), language=request.language)
+                jobs.save_audio(job_id, segment["idx"], pcm.tobytes())
+        calibrate(story_plan(request, "batch"), timings, text)
+        print(f"⏱️ Stages {current_trace_id()}: {timings.as_dict()}, busy {timings.utilization()}")
+
+JOB_WATCH_INTERVAL = 0.25
+
+def open_stores():
+    """Open the result cache and job store, those not opened yet.
+
+    Only in the process that serves: the TTS pool's spawned workers import
+    this module again, and opening the stores there would scan output/ and
+    create jobs.sqlite3 in every worker.
+    """
+    global result_cache, jobs, job_runner
+    if result_cache is None:
+        result_cache = ResultCache(directory=OUTPUT_DIR, persist=SAVE_OUTPUT_AUDIO)
+    if jobs is None:
+        jobs = JobStore()
+        # Jobs start once the models are ready and run next to interactive requests, outside admission
+        job_runner = JobRunner(jobs, run_job, ready=lambda: models.ready)
+
+def job_result(job, include_audio):
+    request = story_service_pb2.StoryRequest.FromString(job["request"])
+    response = story_service_pb2.StoryResponse(text=job["text"] or "", message="success")
+    if include_audio:
+        encoder = create_encoder(request.output_format, SAMPLE_RATE, request.output_sample_rate, request.bitrate_kbps)
+        samples = 0
+        try:
+            for segment in jobs.segments(job["id"], with_audio=True):
+                encoder.write(segment["pcm"])
+                samples += len(segment["pcm"]) // 2
+            if samples:
+                response.audio = encoder.finish()
+            else:
+                encoder.abort()
+        except BaseException:
+            encoder.abort()
+            raise
+        response.content_type = encoder.content_type
+        response.duration_seconds = samples / SAMPLE_RATE
+    return response
+
+def job_message(job, include_audio=False):
+    message = story_service_pb2.Job(
+        job_id=job["id"], state=job["state"], stage=job["stage"],
+        segments_done=job["segments_done"], segments_total=job["segments_total"],
+        attempts=job["attempts"], error=job["error"], created_at=job["created_at"],
+        started_at=job["started_at"] or 0, finished_at=job["finished_at"] or 0
+    )
+    if job["state"] == "done":
+        message.result.CopyFrom(job_result(job, include_audio))
+    return message
+
+def submit_jobs(stories):
+    for i, request in enumerate(stories):
+        if not request.prompt.strip():
+            raise ValueError(f"story {i}: prompt is empty")
+        try:
+            check_output(request.output_format, SAMPLE_RATE, request.output_sample_rate, request.bitrate_kbps)
+        except ValueError as e:
+            raise ValueError(f"story {i}: {e}") from None
+    for request in stories:
+        store_uploaded_voice(request)
+    return jobs.submit([request.SerializeToString() for request in stories])
+
+# ---------- Voices ----------
+
+def voice_message(voice):
+    return story_service_pb2.Voice(
+        voice_id=voice["voice_id"], name=voice["name"], duration_seconds=voice["duration_seconds"],
+        sample_rate=voice["sample_rate"], builtin=voice["builtin"], created_at=voice["created_at"]
+    )
+
+async def receive_voice(chunks):
+    """Name and audio of an UploadVoice stream; raises ValueError past VOICE_MAX_UPLOAD_MB."""
+    name = None
+    data = bytearray()
+    async for chunk in chunks:
+        if name is None:
+            name = chunk.name.strip()
+        data += chunk.data
+        if len(data) > VOICE_MAX_UPLOAD_MB * 1024 * 1024:
+            raise ValueError(f"speaker audio is larger than {VOICE_MAX_UPLOAD_MB} MB")
+    if not data:
+        raise ValueError("no audio uploaded")
+    return name, bytes(data)
+
+# ---------- gRPC Service ----------
+
+def health_response():
+    if admission.draining:
+        status = "draining"
+    elif models.ready:
+        status = "ready"
+    elif models.failed:
+        status = "failed"
+    else:
+        status = "starting"
+    return story_service_pb2.HealthResponse(
+        ready=status == "ready",
+        status=status,
+        uptime_seconds=time.monotonic() - _process_started,
+        models=[story_service_pb2.ModelStatus(
+            name=model["name"], state=model["state"], load_seconds=model["load_seconds"],
+            warmup_seconds=model["warmup_seconds"], error=model["error"] or "",
+            ram_bytes=model["ram_bytes"], vram_bytes=model["vram_bytes"],
+            loads=model["loads"], evictions=model["evictions"]
+        ) for model in models.status()]
+    )
+
+class StoryServiceServicer(story_service_pb2_grpc.StoryServiceServicer):
+    async def Health(self, request, context):
+        return health_response()
+
+    async def Ready(self, request, context):
+        response = health_response()
+        if not response.ready:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, response.status)
+        return response
+
+    async def GenerateStory(self, request, context):
+        with traced_rpc("GenerateStory", request) as rpc_span:
+            try:
+                # Before admission, so an unsupported output or a missing ffmpeg costs no slot
+                check_output(request.output_format, SAMPLE_RATE, request.output_sample_rate, request.bitrate_kbps)
+                plan = plan_request(request, context)
+                rpc_span.set(eta=round(plan.eta, 1), degradations=",".join(plan.degradations))
+                await context.send_initial_metadata(plan_metadata(plan))
+                async with admission.admit():
+                    cancel = CancelToken.for_context(context)
+                    try:
+                        # The copied context carries the request span, plan and TTS ticket into the pipeline thread
+                        with scheduling(request_ticket(plan)), planned(plan):
+                            return await asyncio.get_running_loop().run_in_executor(
+                                pipeline_executor, contextvars.copy_context().run, collect_story, request, cancel
+                            )
+                    except asyncio.CancelledError:
+                        cancel.cancel()
+                        rpc_span.set(outcome="cancelled")
+                        raise
+                    except RequestCancelled as e:
+                        code, details = stopped_status(e), str(e)
+                    except ValueError as e:
+                        code, details = grpc.StatusCode.INVALID_ARGUMENT, str(e)
+                    except FfmpegUnavailable as e:
+                        code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+                    except Exception as e:
+                        rpc_span.set(outcome="internal", error=str(e))
+                        context.set_details(str(e))
+                        context.set_code(grpc.StatusCode.INTERNAL)
+                        return story_service_pb2.StoryResponse(audio=b'', text='', message="error")
+            except AdmissionRejected as e:
+                rpc_span.set(outcome="rejected", error=str(e))
+                await reject(context, e)
+            except ValueError as e:
+                code, details = grpc.StatusCode.INVALID_ARGUMENT, str(e)
+            except FfmpegUnavailable as e:
+                code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+            rpc_span.set(outcome=code.name.lower(), error=details)
+            await context.abort(code, details)
+
+    async def GenerateStoryStream(self, request, context):
+        with traced_rpc("GenerateStoryStream", request) as rpc_span:
+            try:
+                plan = plan_request(request, context)
+                rpc_span.set(eta=round(plan.eta, 1), degradations=",".join(plan.degradations))
+                await context.send_initial_metadata(plan_metadata(plan))
+                async with admission.admit():
+                    cancel = CancelToken.for_context(context)
+                    try:
+                        with scheduling(request_ticket(plan)), planned(plan):
+                            async for chunk in stream_in_thread(tracked_story_chunks(request, cancel), cancel):
+                                yield chunk
+                        return
+                    except asyncio.CancelledError:
+                        rpc_span.set(outcome="cancelled")
+                        raise
+                    except RequestCancelled as e:
+                        code, details = stopped_status(e), str(e)
+                    except ValueError as e:
+                        code, details = grpc.StatusCode.INVALID_ARGUMENT, str(e)
+                    except FfmpegUnavailable as e:
+                        code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+                    except Exception as e:
+                        code, details = grpc.StatusCode.INTERNAL, str(e)
+            except AdmissionRejected as e:
+                rpc_span.set(outcome="rejected", error=str(e))
+                await reject(context, e)
+            except ValueError as e:
+                code, details = grpc.StatusCode.INVALID_ARGUMENT, str(e)
+            except FfmpegUnavailable as e:
+                code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+            rpc_span.set(outcome=code.name.lower(), error=details)
+            await context.abort(code, details)
+
+    async def SubmitStories(self, request, context):
+        if not request.stories:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "no stories to submit")
+        try:
+            job_ids = await asyncio.to_thread(submit_jobs, list(request.stories))
+        except ValueError as e:
+            code, details = grpc.StatusCode.INVALID_ARGUMENT, str(e)
+        except FfmpegUnavailable as e:
+            code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+        else:
+            print(f"📋 Queued {len(job_ids)} job(s)")
+            return story_service_pb2.SubmitStoriesResponse(job_ids=job_ids)
+        await context.abort(code, details)
+
+    async def GetJob(self, request, context):
+        job = await asyncio.to_thread(jobs.get, request.job_id)
+        if job is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"no job {request.job_id!r}")
+        try:
+            return await asyncio.to_thread(job_message, job, request.include_audio)
+        except FfmpegUnavailable as e:
+            code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+        await context.abort(code, details)
+
+    async def WatchJob(self, request, context):
+        seen = None
+        while True:
+            # Versions live in memory, so polling them costs nothing until the job changes
+            version = jobs.version(request.job_id)
+            if version != seen:
+                seen = version
+                job = await asyncio.to_thread(jobs.get, request.job_id)
+                if job is None:
+                    await context.abort(grpc.StatusCode.NOT_FOUND, f"no job {request.job_id!r}")
+                yield job_message(job)
+                if job["state"] in ("done", "failed"):
+                    return
+            await asyncio.sleep(JOB_WATCH_INTERVAL)
+
+    async def UploadVoice(self, request_iterator, context):
+        try:
+            name, data = await receive_voice(request_iterator)
+            voice = await asyncio.to_thread(voice_store().add, data, name)
+        except ValueError as e:
+            code, details = grpc.StatusCode.INVALID_ARGUMENT, str(e)
+        except FfmpegUnavailable as e:
+            # The upload may be fine; the server cannot decode anything until ffmpeg is installed
+            code, details = grpc.StatusCode.FAILED_PRECONDITION, str(e)
+        except OSError as e:
+            code, details = grpc.StatusCode.INTERNAL, f"could not store the voice: {e}"
+        else:
+            print(f"🎙️ Voice {voice['name'] or voice['voice_id'][:12]}: {voice['duration_seconds']:.1f}s stored as {voice['voice_id'][:12]}")
+            return voice_message(voice)
+        await context.abort(code, details)
+
+    async def ListVoices(self, request, context):
+        return story_service_pb2.ListVoicesResponse(
+            voices=[voice_message(voice) for voice in await asyncio.to_thread(voice_store().list)]
+        )
+
+async def serve():
+    print(f"⏱️ Imports done {time.monotonic() - _process_started:.1f}s after start")
+    open_stores()
+    # Only here, in the serving process, can no job be running yet
+    jobs.recover()
+    server = grpc.aio.server(options=[
+        ("grpc.max_send_message_length", GRPC_MAX_MESSAGE_MB * 1024 * 1024),
+        ("grpc.max_receive_message_length", GRPC_MAX_MESSAGE_MB * 1024 * 1024),
+        # Let the REST gateway keep its pooled channel alive between requests
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.min_ping_interval_without_data_ms", 10000),
+    ])
     story_service_pb2_grpc.add_StoryServiceServicer_to_server(StoryServiceServicer(), server)
-    print("🚀 Starting gRPC server on port 50051...")
+    print(f"🚀 Starting gRPC server on port 50051 with {TTS_WORKERS} TTS worker(s)...")
+    print(f"🧮 Emotion and translation models use the {INFERENCE_PROFILE} inference profile")
     server.add_insecure_port('[::]:50051')
-    server.start()
+    await server.start()
+    print(f"⏱️ Port bound {time.monotonic() - _process_started:.1f}s after start; loading models")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+        print(f"📈 Metrics on http://0.0.0.0:{METRICS_PORT}/metrics")
+    models.start()
+    job_runner.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C still stops the server, just without draining
+            pass
     try:
-        while True:
-            time.sleep(86400)
-    except KeyboardInterrupt:
-        server.stop(0)
+        await stop.wait()
+        # New requests get UNAVAILABLE with a retry hint while admitted ones finish
+        print(f"🛑 Draining {admission.active + admission.waiting} request(s) (up to {SHUTDOWN_GRACE:.0f}s)...")
+        drained = await admission.drain(SHUTDOWN_GRACE)
+        await server.stop(0 if drained else 1)
+    finally:
+        # Running jobs are queued again and resume from their last saved segment on the next start
+        job_runner.close()
+        tts_pool.close()
 
 if __name__ == "__main__":
-    serve()
\ No newline at end of file
+    asyncio.run(serve())
\ No newline at end of file
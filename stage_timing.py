@@ -0,0 +1,128 @@
+# Per-request pipeline stage timings
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from telemetry import Histogram
+
+STAGES = ("cache_wait", "llm_queue", "llm", "emotion", "translation", "synthesis", "trimming", "assembly", "encoding")
+
+_current = contextvars.ContextVar("stage_timings", default=None)
+
+STAGE_SECONDS = Histogram("story_stage_seconds", "Time one request spent in a pipeline stage", ["stage"])
+
+
+class StageTimings:
+    """Seconds one request spent in each stage.
+
+    Stages overlap: the LLM keeps writing on its own thread while earlier
+    segments are synthesized, so the stages do not add up to the total.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        with self._lock:
+            timings = {name: round(seconds, 4) for name, seconds in self.seconds.items()}
+        timings["total"] = round(self.total, 4)
+        return timings
+
+    def utilization(self):
+        """Share of the request's wall time spent in each stage; overlapping stages add up to more than 1."""
+        if not self.total:
+            return {}
+        with self._lock:
+            return {name: round(seconds / self.total, 3) for name, seconds in self.seconds.items()}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+class StageStats:
+    """The timings of the most recent requests, summarized per stage."""
+
+    def __init__(self, max_requests=1000):
+        self._recent = deque(maxlen=max_requests)
+        self._lock = threading.Lock()
+
+    def record(self, timings):
+        with self._lock:
+            self._recent.append(timings.as_dict())
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+
+    def summary(self):
+        with self._lock:
+            recent = list(self._recent)
+        summary = {}
+        for name in STAGES + ("total",):
+            # A request that skipped a stage spent no time in it
+            values = sorted(timings.get(name, 0.0) for timings in recent)
+            if not any(values):
+                continue
+            summary[name] = {
+                "mean": round(sum(values) / len(values), 4),
+                "p50": round(percentile(values, 0.50), 4),
+                "p95": round(percentile(values, 0.95), 4),
+                "p99": round(percentile(values, 0.99), 4),
+            }
+        return summary
+
+
+stage_stats = StageStats()
+
+
+@contextmanager
+def track_request():
+    """Collect the stages run inside this block, then add them to ``stage_stats``."""
+    timings = StageTimings()
+    token = _current.set(timings)
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.total = time.perf_counter() - start
+        _current.reset(token)
+        stage_stats.record(timings)
+        for name, seconds in timings.seconds.items():
+            STAGE_SECONDS.observe(seconds, stage=name)
+
+
+@contextmanager
+def stage(name):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def timed_iter(name, iterable):
+    """Yield from ``iterable``, counting the time spent waiting for each item as ``name``."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
@@ -1,11 +1,8 @@
 import streamlit as st
 import grpc
 import os
-import json
-import uuid
 import time
 import re
-from concurrent.futures import ThreadPoolExecutor
 from pydub import AudioSegment
 from st_audiorec import st_audiorec
 from proto import story_service_pb2
@@ -13,9 +10,7 @@ from proto import story_service_pb2_grpc
 
 # Constants
 GRPC_SERVER_ADDRESS = "localhost:50051"
-voices_dir = "voices"
-speakers_json = os.path.join(voices_dir, "speakers.json")
-os.makedirs(voices_dir, exist_ok=True)
+VOICE_UPLOAD_CHUNK = 1 << 20
 
 # Session state
 st.session_state.setdefault("recording", False)
@@ -24,52 +19,62 @@ st.session_state.setdefault("audio_jobs", [])
 st.session_state.setdefault("audio_results", [])
 st.session_state.setdefault("spinner_triggered", False)
 
-if "speaker_choices" not in st.session_state:
-    if os.path.exists(speakers_json):
-        with open(speakers_json, "r") as f:
-            st.session_state.speaker_choices = json.load(f)
-    else:
-        st.session_state.speaker_choices = {"Default": "voices/Default Speaker.wav"}
-        with open(speakers_json, "w") as f:
-            json.dump(st.session_state.speaker_choices, f, indent=4)
-
 # gRPC setup
 channel = grpc.insecure_channel(GRPC_SERVER_ADDRESS, options=[
     ('grpc.max_send_message_length', 100 * 1024 * 1024),
     ('grpc.max_receive_message_length', 100 * 1024 * 1024),
 ])
 stub = story_service_pb2_grpc.StoryServiceStub(channel)
-executor = ThreadPoolExecutor(max_workers=3)
 
-def generate_audio(prompt, emotion, speed, language, speaker_audio, split_voices):
+def load_speaker_choices():
+    # Voices live on the server, so every client sees the same list
+    try:
+        voices = stub.ListVoices(story_service_pb2.ListVoicesRequest(), timeout=10).voices
+    except grpc.RpcError as e:
+        st.error(f"Could not load voices from the server at {GRPC_SERVER_ADDRESS}: {e.details()}")
+        return {}
+    return {voice.name: voice.voice_id for voice in voices}
+
+if not st.session_state.get("speaker_choices"):
+    # Empty while the server is down or starting, so the next rerun asks again
+    st.session_state.speaker_choices = load_speaker_choices()
+
+def submit_audio_job(prompt, emotion, speed, language, voice_id, split_voices):
+    # The server keeps the job on disk, so it survives a restart of either side
     request = story_service_pb2.StoryRequest(
         prompt=prompt, emotion=emotion, speed=speed,
-        language=language, speaker_audio=speaker_audio,
+        language=language, voice_id=voice_id,
         include_narration=split_voices
     )
-    response = stub.GenerateStory(request)
+    return stub.SubmitStories(story_service_pb2.SubmitStoriesRequest(stories=[request])).job_ids[0]
+
+def fetch_audio(job_id):
+    response = stub.GetJob(story_service_pb2.JobRequest(job_id=job_id, include_audio=True)).result
     if response.audio:
-        audio_id = uuid.uuid4().hex
-        audio_filepath = f"generated_audio_{audio_id}.wav"
+        audio_filepath = f"generated_audio_{job_id}.wav"
         with open(audio_filepath, "wb") as f:
             f.write(response.audio)
-        return audio_filepath, response.text, prompt
-    return None, None, prompt
+        return audio_filepath, response.text
+    return None, None
+
+def voice_chunks(audio_bytes, speaker_name):
+    for offset in range(0, len(audio_bytes), VOICE_UPLOAD_CHUNK):
+        yield story_service_pb2.VoiceChunk(
+            name=speaker_name if offset == 0 else "", data=audio_bytes[offset:offset + VOICE_UPLOAD_CHUNK]
+        )
 
 def handle_voice_upload_bytes(audio_bytes, speaker_name):
-    if len(audio_bytes) < 15000:
-        st.error("Audio too short — must be at least 15 seconds.")
-        return False
     if speaker_name in st.session_state.speaker_choices:
         st.error(f"A speaker named '{speaker_name}' already exists.")
         return False
-    speaker_path = os.path.join(voices_dir, f"{speaker_name}.wav")
-    with open(speaker_path, "wb") as f:
-        f.write(audio_bytes)
-    st.session_state.speaker_choices[speaker_name] = speaker_path
-    with open(speakers_json, "w") as f:
-        json.dump(st.session_state.speaker_choices, f, indent=4)
-    st.success(f"'{speaker_name}' added successfully!")
+    try:
+        # The server resamples, trims and stores the voice, and rejects clips that are too short
+        voice = stub.UploadVoice(voice_chunks(audio_bytes, speaker_name))
+    except grpc.RpcError as e:
+        st.error(f"Upload failed: {e.details()}")
+        return False
+    st.session_state.speaker_choices[voice.name] = voice.voice_id
+    st.success(f"'{voice.name}' added successfully!")
     return True
 
 # UI
@@ -85,7 +90,7 @@ with st.form("audio_form"):
     emotion = st.selectbox("Emotion", ["neutral", "happy", "sad", "angry"])
     speed = st.slider("Speech Speed", 0.7, 1.3, 1.0, 0.05)
 
-    uploaded_voice = st.file_uploader("Upload Voice", type=["wav"])
+    uploaded_voice = st.file_uploader("Upload Voice", type=["wav", "flac", "mp3", "ogg"])
     upload_btn = st.form_submit_button("Upload File")
     record_name = st.text_input("Recording Name (optional)")
     record_btn = st.form_submit_button("Record Voice")
@@ -112,35 +117,40 @@ if st.session_state.recording:
         st.session_state.recording = False
 
 # Generate
-if generate_btn and prompt.strip():
+if generate_btn and not speaker_name:
+    st.warning("No speaker voices are available yet; upload one or try again once the server is up.")
+elif generate_btn and prompt.strip():
     full_prompt = f"[PARA_LEVEL:{para_choice}]\n\n{prompt}"
-    job = executor.submit(
-        generate_audio,
+    job_id = submit_audio_job(
         full_prompt, emotion, speed, language,
         st.session_state.speaker_choices[speaker_name],
         voice_mode == "Narration + Dialogue"
     )
-    st.session_state.audio_jobs.append((job, str(uuid.uuid4()), full_prompt))
+    st.session_state.audio_jobs.append((job_id, full_prompt))
     st.session_state.spinner_triggered = True
 
 # Process jobs
 pending_jobs = []
-for job, uid, stored_prompt in st.session_state.audio_jobs:
-    if job.done():
-        audio_path, story_text, _ = job.result()
+for job_id, stored_prompt in st.session_state.audio_jobs:
+    job = stub.GetJob(story_service_pb2.JobRequest(job_id=job_id))
+    if job.state == "done":
+        audio_path, story_text = fetch_audio(job_id)
         if audio_path:
             st.session_state.audio_results.append((audio_path, story_text, stored_prompt))
+    elif job.state == "failed":
+        st.error(f"Generation failed: {job.error}")
     else:
-        pending_jobs.append((job, uid, stored_prompt))
+        pending_jobs.append((job_id, stored_prompt, job))
 
-st.session_state.audio_jobs = pending_jobs
+st.session_state.audio_jobs = [(job_id, stored_prompt) for job_id, stored_prompt, _ in pending_jobs]
 
-# Show running prompts (cleaned)
+# Show running prompts (cleaned) with their progress
 if pending_jobs:
     st.info("Generating audio for:")
-    for _, _, prompt_text in pending_jobs:
+    for _, prompt_text, job in pending_jobs:
         cleaned = re.sub(r'\[PARA_LEVEL:.*?\]', '', prompt_text).strip()
-        st.markdown(f"• 🛠️ `{cleaned[:60]}...`")
+        progress = f" — {job.stage} {job.segments_done}/{job.segments_total}" if job.segments_total else f" — {job.stage or job.state}"
+        st.markdown(f"• 🛠️ `{cleaned[:60]}...`{progress}")
 
 for audio_path, story_text, original_prompt in st.session_state.audio_results:
     clean_prompt = re.sub(r'\[PARA_LEVEL:.*?\]', '', original_prompt).strip()
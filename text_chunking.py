@@ -0,0 +1,102 @@
+# Sentence-aligned chunks of story text, each sized for one TTS call
+import os
+import re
+
+# Per-language character limits of the XTTS v2 tokenizer; longer input gets
+# cut off or garbled, so no chunk may exceed them
+XTTS_CHAR_LIMITS = {
+    "en": 250, "de": 253, "fr": 273, "es": 239, "it": 213, "pt": 203, "pl": 224, "tr": 226,
+    "ru": 182, "nl": 251, "cs": 186, "ar": 166, "zh": 82, "ja": 71, "hu": 224, "ko": 95,
+}
+DEFAULT_CHAR_LIMIT = 250
+# The XTTS v2 GPT reads at most this many text tokens per call
+XTTS_MAX_TEXT_TOKENS = 400
+# Target chunk length; 0 packs chunks up to the language's limit
+TTS_CHUNK_CHARS = int(os.environ.get("TTS_CHUNK_CHARS", "0"))
+# Chunks shorter than this are merged into a neighbour when it has room
+TTS_CHUNK_MIN_CHARS = int(os.environ.get("TTS_CHUNK_MIN_CHARS", "60"))
+
+# Breaks after sentence ends (optionally closed by a quote or bracket), then
+# after clauses, then between words; CJK punctuation needs no space after it
+SENTENCE_BREAK = re.compile(r'(?:(?<=[.!?…])|(?<=[.!?…][\'")\]]))\s+|(?<=[。！？])')
+CLAUSE_BREAK = re.compile(r'(?<=[,;:—–])\s+|(?<=[，、；：])')
+WORD_BREAK = re.compile(r'\s+')
+
+
+def char_limit(language):
+    return XTTS_CHAR_LIMITS.get(language, XTTS_CHAR_LIMITS.get(language.split("-")[0], DEFAULT_CHAR_LIMIT))
+
+
+def _pack(pieces, fits):
+    # Greedily join consecutive pieces while the result still fits
+    chunks = []
+    for piece in pieces:
+        if chunks and fits(chunks[-1] + " " + piece):
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def split_text(text, fits, patterns=(SENTENCE_BREAK, CLAUSE_BREAK, WORD_BREAK)):
+    """Split ``text`` into pieces that satisfy ``fits``, at the coarsest breaks that do."""
+    if fits(text):
+        return [text]
+    for i, pattern in enumerate(patterns):
+        parts = [part.strip() for part in pattern.split(text) if part.strip()]
+        if len(parts) > 1:
+            return _pack([piece for part in parts for piece in split_text(part, fits, patterns[i:])], fits)
+    # A single word longer than the limit, e.g. CJK text without punctuation
+    size = len(text)
+    while size > 1 and not fits(text[:size]):
+        size //= 2
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def chunk_segments(segments, language, max_chars=TTS_CHUNK_CHARS, min_chars=TTS_CHUNK_MIN_CHARS,
+                   max_tokens=XTTS_MAX_TEXT_TOKENS, count_tokens=len, start=0):
+    """Regroup story segments into chunks that each fit one TTS call.
+
+    Consecutive narration sentences are packed into chunks of up to
+    ``max_chars`` characters. The language's XTTS limit is used when
+    ``max_chars`` is 0 or larger than that limit. Dialogue lines keep their
+    own chunks, since they use another voice and carry an emotion. Any
+    segment that does not fit is split at sentence, clause or word breaks.
+    A narration chunk shorter than ``min_chars`` is merged into a
+    neighbouring narration chunk when the result stays within the language
+    limit. Each chunk gets ``index``, its position in the story counting
+    from ``start``, so audio can be reassembled in order.
+    """
+    limit = char_limit(language)
+    target = min(max_chars or limit, limit)
+
+    def fits(text, size=target):
+        return len(text) <= size and count_tokens(text) <= max_tokens
+
+    chunks = []
+    for segment in segments:
+        for piece in split_text(segment["text"], fits):
+            previous = chunks[-1] if chunks else None
+            if (segment["type"] == "narration" and previous is not None and previous["type"] == "narration"
+                    and fits(previous["text"] + " " + piece)):
+                previous["text"] += " " + piece
+            else:
+                chunks.append(dict(segment, text=piece))
+
+    merged = []
+    for i, chunk in enumerate(chunks):
+        if chunk["type"] == "narration" and len(chunk["text"]) < min_chars:
+            previous = merged[-1] if merged else None
+            following = chunks[i + 1] if i + 1 < len(chunks) else None
+            if previous is not None and previous["type"] == "narration" \
+                    and fits(previous["text"] + " " + chunk["text"], limit):
+                previous["text"] += " " + chunk["text"]
+                continue
+            if following is not None and following["type"] == "narration" \
+                    and fits(chunk["text"] + " " + following["text"], limit):
+                following["text"] = chunk["text"] + " " + following["text"]
+                continue
+        merged.append(chunk)
+    for i, chunk in enumerate(merged):
+        chunk["index"] = start + i
+    return merged
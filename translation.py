@@ -0,0 +1,122 @@
+# Batched, cached MarianMT translation
+import os
+import threading
+from collections import OrderedDict
+
+from inference_profile import inference_mode, prepare_model
+from model_registry import models
+
+TRANSLATION_BATCH_SIZE = int(os.environ.get("TRANSLATION_BATCH_SIZE", "16"))
+TRANSLATION_CACHE_SIZE = int(os.environ.get("TRANSLATION_CACHE_SIZE", "4096"))
+
+
+def load_translation_model(src_lang, tgt_lang):
+    from transformers import MarianMTModel, MarianTokenizer
+
+    model_name = f"Helsinki-NLP/opus-mt-{src_lang}-{tgt_lang}"
+    model = prepare_model(model_name, lambda: MarianMTModel.from_pretrained(model_name))
+    tokenizer = MarianTokenizer.from_pretrained(model_name)
+    return model, tokenizer
+
+
+def warm_up_translation(pair):
+    model, tokenizer = pair
+    inputs = tokenizer(["Hello."], return_tensors='pt', padding=True).to(model.device)
+    with inference_mode():
+        model.generate(**inputs)
+
+
+def register_translation_model(src_lang, tgt_lang, required=False):
+    """Make a language pair known to the model registry; returns its name there."""
+    name = f"translation-{src_lang}-{tgt_lang}"
+    # Looked up when the load runs, so benchmarks can swap the loader in
+    models.register(name, lambda: load_translation_model(src_lang, tgt_lang), warmup=warm_up_translation,
+                    required=required, evictable=True)
+    return name
+
+
+def translation_model(src_lang, tgt_lang):
+    """The loaded (model, tokenizer) for a pair, not evicted while the ``with`` block runs.
+
+    Loads it on first use or after it was evicted.
+    """
+    return models.use(register_translation_model(src_lang, tgt_lang))
+
+
+def prefetch_translation(src_lang, tgt_lang):
+    # Requests call this on arrival, so the model loads while the LLM writes the story
+    models.prefetch(register_translation_model(src_lang, tgt_lang))
+
+
+class TranslationCache:
+    """Bounded LRU of translated sentences keyed by (src, tgt, text)."""
+
+    def __init__(self, max_entries=TRANSLATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+translation_cache = TranslationCache()
+
+
+def translate_batch(texts, src_lang='en', tgt_lang='es', batch_size=TRANSLATION_BATCH_SIZE):
+    """Translate a list of segments, returning one translation per input in order.
+
+    Each segment is its own sequence, so narration and dialogue boundaries
+    survive translation. Cached and duplicate segments are translated once;
+    the rest are sorted by length and run through ``generate`` a padded batch
+    at a time, which keeps padding waste low.
+    """
+    results = [None] * len(texts)
+    missing = {}
+    for i, text in enumerate(texts):
+        cached = translation_cache.get((src_lang, tgt_lang, text))
+        if cached is not None:
+            results[i] = cached
+        else:
+            missing.setdefault(text, []).append(i)
+    if not missing:
+        return results
+
+    pending = sorted(missing, key=len)
+    with translation_model(src_lang, tgt_lang) as (model, tokenizer):
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            inputs = tokenizer(batch, return_tensors='pt', padding=True, truncation=True).to(model.device)
+            with inference_mode():
+                translated = model.generate(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"]
+                )
+            for text, output in zip(batch, tokenizer.batch_decode(translated, skip_special_tokens=True)):
+                translation_cache.put((src_lang, tgt_lang, text), output)
+                for i in missing[text]:
+                    results[i] = output
+    return results
+
+
+def translate_text_huggingface(text, src_lang='en', tgt_lang='es'):
+    return translate_batch([text], src_lang, tgt_lang)[0]
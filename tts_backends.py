@@ -0,0 +1,186 @@
+# TTS backends that run inside the synthesis worker processes
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+
+SPEAKERS_JSON = os.path.join("voices", "speakers.json")
+
+
+class XTTSBackend:
+    sample_rate = 24000
+
+    def __init__(self, device="auto", threads=None, preload_speakers=True):
+        import torch
+        from TTS.api import TTS
+        from model_registry import pick_device
+        from voice_cache import VoiceLatentCache
+
+        self.device = pick_device(device)
+        if threads and self.device == "cpu":
+            # Replicas share the CPU, so each one gets its own slice of cores
+            torch.set_num_threads(threads)
+
+        self.tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2", progress_bar=False)
+        self.tts.to(self.device)
+        # Conditioning latents are computed once per voice and reused for every segment
+        self.model = self.tts.synthesizer.tts_model
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
+        self.voice_cache = VoiceLatentCache(self.model)
+        if preload_speakers and os.path.exists(SPEAKERS_JSON):
+            with open(SPEAKERS_JSON, "r") as f:
+                self.voice_cache.preload(json.load(f).values())
+
+    def synthesize(self, text, speaker_path, language, speed):
+        config = self.model.config
+        gpt_cond_latent, speaker_embedding = self.voice_cache.get(speaker_path)
+        out = self.model.inference(
+            text,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            temperature=config.temperature,
+            length_penalty=config.length_penalty,
+            repetition_penalty=config.repetition_penalty,
+            top_k=config.top_k,
+            top_p=config.top_p,
+            speed=speed,
+            enable_text_splitting=True
+        )
+        return out["wav"]
+
+    def synthesize_batch(self, payloads):
+        """Synthesize several segments: the GPT decodes each sentence on its own, the vocoder runs once.
+
+        XTTS's GPT has no padding mask for its text prompt, so only the
+        HiFi-GAN pass is batched; its latents are padded to the longest one
+        and each waveform is cut back to its own length.
+        """
+        import torch
+        import torch.nn.functional as F
+        from TTS.tts.layers.xtts.tokenizer import split_sentence
+
+        model = self.model
+        config = model.config
+        latents, embeddings, owners = [], [], []
+        with torch.inference_mode():
+            for i, payload in enumerate(payloads):
+                language = payload["language"].split("-")[0]
+                gpt_cond_latent, speaker_embedding = self.voice_cache.get(payload["speaker_path"])
+                gpt_cond_latent = gpt_cond_latent.to(model.device)
+                for sentence in split_sentence(payload["text"], language, model.tokenizer.char_limits[language]):
+                    tokens = torch.IntTensor(model.tokenizer.encode(sentence.strip().lower(), lang=language))
+                    tokens = tokens.unsqueeze(0).to(model.device)
+                    codes = model.gpt.generate(
+                        cond_latents=gpt_cond_latent,
+                        text_inputs=tokens,
+                        input_tokens=None,
+                        do_sample=True,
+                        top_p=config.top_p,
+                        top_k=config.top_k,
+                        temperature=config.temperature,
+                        num_return_sequences=model.gpt_batch_size,
+                        num_beams=1,
+                        length_penalty=config.length_penalty,
+                        repetition_penalty=config.repetition_penalty,
+                        output_attentions=False
+                    )
+                    expected_length = torch.tensor([codes.shape[-1] * model.gpt.code_stride_len], device=model.device)
+                    text_length = torch.tensor([tokens.shape[-1]], device=model.device)
+                    latent = model.gpt(tokens, text_length, codes, expected_length, cond_latents=gpt_cond_latent,
+                                       return_attentions=False, return_latent=True)
+                    if payload["speed"] != 1.0:
+                        latent = F.interpolate(latent.transpose(1, 2), scale_factor=1.0 / max(payload["speed"], 0.05),
+                                               mode="linear").transpose(1, 2)
+                    latents.append(latent.transpose(1, 2))
+                    embeddings.append(speaker_embedding.to(model.device))
+                    owners.append(i)
+            lengths = [latent.shape[-1] for latent in latents]
+            longest = max(lengths)
+            # Repeat the last frame rather than pad with zeros, so short items do not fade out early
+            padded = torch.cat([F.pad(latent, (0, longest - latent.shape[-1]), mode="replicate") for latent in latents])
+            wavs = model.hifigan_decoder(padded.transpose(1, 2), g=torch.cat(embeddings)).cpu()
+        samples_per_frame = wavs.shape[-1] / longest
+        pieces = [[] for _ in payloads]
+        for owner, length, wav in zip(owners, lengths, wavs):
+            pieces[owner].append(wav.reshape(-1)[:round(length * samples_per_frame)])
+        return [torch.cat(piece).numpy() for piece in pieces]
+
+    def stats(self):
+        return {"voice_cache": self.voice_cache.stats()}
+
+
+class StubTTSBackend:
+    """Deterministic stand-in for XTTS with a tunable cost.
+
+    Produces a tone per voice, about ``seconds_per_char`` of audio per
+    character with quiet padding at both ends like real output. ``cost``
+    controls how long each call takes: ``"sleep"`` waits ``compute_per_char``
+    seconds per character, ``"cpu"`` burns the same amount of CPU time so
+    throughput scaling across processes can be measured. ``call_seconds``
+    adds a fixed cost per call and ``compute_per_char_squared`` one that
+    grows with the square of the text length, like XTTS's attention.
+    In ``synthesize_batch`` the fixed cost is paid once and every segment
+    but the most expensive costs ``batch_item_cost`` of its solo cost, so
+    1.0 models a CPU that gains nothing from batching and small values a
+    GPU with spare parallelism.
+    """
+    sample_rate = 24000
+    device = "cpu"
+
+    def __init__(self, seconds_per_char=0.06, compute_per_char=0.0, cost="sleep", load_seconds=0.0,
+                 call_seconds=0.0, compute_per_char_squared=0.0, batch_item_cost=1.0, **kwargs):
+        self.seconds_per_char = seconds_per_char
+        self.compute_per_char = compute_per_char
+        self.call_seconds = call_seconds
+        self.compute_per_char_squared = compute_per_char_squared
+        self.batch_item_cost = batch_item_cost
+        self.cost = cost
+        # Simulated model load, for startup and readiness tests
+        time.sleep(load_seconds)
+
+    def synthesize(self, text, speaker_path, language, speed):
+        self._spend(self.call_seconds + self._text_cost(text))
+        return self._audio(text, speaker_path, speed)
+
+    def synthesize_batch(self, payloads):
+        costs = sorted((self._text_cost(payload["text"]) for payload in payloads), reverse=True)
+        self._spend(self.call_seconds + costs[0] + sum(costs[1:]) * self.batch_item_cost)
+        return [self._audio(payload["text"], payload["speaker_path"], payload["speed"]) for payload in payloads]
+
+    def _text_cost(self, text):
+        return len(text) * self.compute_per_char + len(text) ** 2 * self.compute_per_char_squared
+
+    def _audio(self, text, speaker_path, speed):
+        duration = max(0.2, len(text) * self.seconds_per_char / max(speed, 0.05))
+        frequency = 120 + zlib.crc32(str(speaker_path).encode()) % 200
+        t = np.arange(int(duration * self.sample_rate), dtype=np.float32) / self.sample_rate
+        speech = 0.3 * np.sin(2 * np.pi * frequency * t, dtype=np.float32)
+        pad = np.zeros(int(0.1 * self.sample_rate), dtype=np.float32)
+        return np.concatenate([pad, speech, pad])
+
+    def _spend(self, seconds):
+        if seconds <= 0:
+            return
+        if self.cost == "sleep":
+            time.sleep(seconds)
+            return
+        deadline = time.process_time() + seconds
+        block = np.random.default_rng(0).random((64, 64))
+        while time.process_time() < deadline:
+            block = np.tanh(block @ block)
+
+    def stats(self):
+        return {}
+
+
+BACKENDS = {
+    "xtts": XTTSBackend,
+    "stub": StubTTSBackend,
+}
+
+
+def create_backend(name, **options):
+    return BACKENDS[name](**options)
@@ -0,0 +1,438 @@
+# Pool of TTS worker processes, each holding its own model replica
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from model_registry import process_rss_bytes
+from telemetry import Histogram
+from tts_backends import BACKENDS, create_backend
+from tts_scheduler import TTS_MAX_SEGMENT_WAIT, TTS_SCHEDULE, SegmentQueue
+
+HEARTBEAT_INTERVAL = 2.0
+
+TTS_QUEUE_WAIT = Histogram("tts_queue_wait_seconds", "Time a segment waited for a free TTS worker")
+TTS_JOB_SECONDS = Histogram("tts_job_seconds", "Time a TTS worker spent on one batch of segments")
+TTS_BATCH_SIZE = Histogram("tts_batch_size", "Segments synthesized together in one TTS call",
+                           buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+
+
+def _export_samples(samples):
+    # Hand the samples over through shared memory; the pool unlinks it after copying
+    samples = np.ascontiguousarray(samples, dtype=np.float32)
+    shm = shared_memory.SharedMemory(create=True, size=max(samples.nbytes, 1))
+    np.ndarray(samples.shape, dtype=np.float32, buffer=shm.buf)[:] = samples
+    name = shm.name
+    shm.close()
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return name, len(samples)
+
+
+def _import_samples(name, length):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray((length,), dtype=np.float32, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _vram_bytes():
+    # Only a backend that already put torch on the GPU holds any
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_initialized():
+        return 0
+    return torch.cuda.memory_reserved()
+
+
+def _worker_main(worker_id, backend_name, backend_options, warmup, inbox, outbox):
+    try:
+        start = time.monotonic()
+        backend = create_backend(backend_name, **backend_options)
+        loaded = time.monotonic()
+        if warmup:
+            # The first inference pays for kernel selection and lazy allocations
+            backend.synthesize(**warmup)
+        timings = {"load_seconds": loaded - start, "warmup_seconds": time.monotonic() - loaded}
+    except Exception as e:
+        outbox.put(("failed", worker_id, None, f"{type(e).__name__}: {e}"))
+        return
+    outbox.put(("ready", worker_id, None, dict(timings, pid=os.getpid(), device=backend.device, vram_bytes=_vram_bytes())))
+    while True:
+        try:
+            job = inbox.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            outbox.put(("heartbeat", worker_id, None, None))
+            continue
+        if job is None:
+            return
+        job_ids, payloads = job
+        outbox.put(("done", worker_id, job_ids, _run_batch(backend, payloads)))
+
+
+def _run_batch(backend, payloads):
+    # One result per payload: ("done", shared memory) or ("error", message)
+    if len(payloads) > 1 and hasattr(backend, "synthesize_batch"):
+        try:
+            return [("done", _export_samples(samples)) for samples in backend.synthesize_batch(payloads)]
+        except Exception as e:
+            # Retry one by one so a single bad segment does not fail the rest
+            print(f"⚠️ Batched synthesis of {len(payloads)} segments failed ({type(e).__name__}: {e}); "
+                  f"synthesizing them one at a time")
+    results = []
+    for payload in payloads:
+        try:
+            results.append(("done", _export_samples(backend.synthesize(**payload))))
+        except Exception as e:
+            results.append(("error", f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _batch_key(payload):
+    # Segments synthesized in one call share the language and speed; voices may differ
+    return payload["language"], payload["speed"]
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.inbox = None
+        self.ready = False
+        self.job = None
+        self.tickets = {}
+        self.device = None
+        self.vram_bytes = 0
+        self.job_started = 0.0
+        self.last_seen = 0.0
+        self.restarts = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+        self.disabled = False
+        self.crash_streak = 0
+
+
+class TTSWorkerPool:
+    """Runs synthesis in N worker processes so requests are not serialized on one model.
+
+    gRPC threads submit segment jobs and get a Future back. A supervisor
+    thread hands jobs to idle workers, collects results (audio comes back
+    through shared memory, never pickled), and restarts workers that crash,
+    stop sending heartbeats or exceed ``job_timeout``. A job whose worker
+    crashed is retried once on another worker.
+
+    Queued jobs with the same language and speed, from any request, go to a
+    worker together, up to ``max_batch`` at a time, and the backend
+    synthesizes them in one call. A job that would start a batch smaller than
+    ``max_batch`` waits up to ``max_wait`` seconds for more to arrive; with
+    several idle workers the queue is spread across them instead.
+
+    Which queued job runs next is up to the ``schedule`` policy (see
+    ``tts_scheduler``), applied to the ``WorkTicket`` each job is submitted
+    with, so segments of different requests interleave.
+    """
+
+    def __init__(self, backend="xtts", workers=1, backend_options=None, job_timeout=300.0,
+                 heartbeat_timeout=60.0, max_retries=1, warmup=None, max_batch=1, max_wait=0.0,
+                 schedule=TTS_SCHEDULE, max_segment_wait=TTS_MAX_SEGMENT_WAIT):
+        self.backend = backend
+        self.sample_rate = BACKENDS[backend].sample_rate
+        self.backend_options = backend_options or {}
+        self.warmup = warmup
+        self.job_timeout = job_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._ctx = multiprocessing.get_context("spawn")
+        self._outbox = self._ctx.Queue()
+        self._workers = [_Worker(i) for i in range(max(1, workers))]
+        self._pending = SegmentQueue(schedule, max_segment_wait, workers=len(self._workers))
+        self._jobs = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._closed = False
+        self._supervisor = None
+        # When the batch that is filling has to go, None while nothing waits
+        self._send_by = None
+        self.completed = 0
+        self.characters = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.batches = 0
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        with self._lock:
+            for worker in self._workers:
+                self._spawn(worker)
+        self._supervisor = threading.Thread(target=self._supervise, name="tts-pool", daemon=True)
+        self._supervisor.start()
+        return self
+
+    def wait_ready(self, timeout=None):
+        """Wait for the first ready worker; False on timeout or if every worker is down for good."""
+        end = time.monotonic() + timeout if timeout is not None else None
+        while not self._ready.wait(1.0):
+            with self._lock:
+                if all(worker.disabled for worker in self._workers):
+                    return False
+            if end is not None and time.monotonic() >= end:
+                return False
+        return True
+
+    def close(self, timeout=5.0):
+        with self._lock:
+            self._closed = True
+            for job_id, _ in self._pending.ordered():
+                self._jobs.pop(job_id)[0].cancel()
+            self._pending.clear()
+            self._send_by = None
+            for worker in self._workers:
+                if worker.inbox is not None:
+                    worker.inbox.put(None)
+            self._outbox.put(("wakeup", None, None, None))
+        if self._supervisor is not None:
+            self._supervisor.join(timeout)
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        with self._lock:
+            # Jobs that were on a worker, or retried, when it stopped; their callers would wait forever
+            for future, _, _ in self._jobs.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("TTS pool closed"))
+            self._jobs.clear()
+
+    # ---------- Jobs ----------
+
+    def submit(self, text, speaker_path, language, speed, ticket=None):
+        future = Future()
+        payload = {"text": text, "speaker_path": speaker_path, "language": language, "speed": speed}
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("TTS pool is closed")
+            job_id = next(self._ids)
+            self._jobs[job_id] = (future, payload, 0)
+            self._pending.push(job_id, payload, ticket)
+            self._dispatch()
+        return future
+
+    def synthesize(self, text, speaker_path, language, speed, ticket=None):
+        return self.submit(text, speaker_path, language, speed, ticket).result()
+
+    def health(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "worker": worker.worker_id,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": bool(worker.process and worker.process.is_alive()),
+                "ready": worker.ready,
+                "device": worker.device,
+                "disabled": worker.disabled,
+                "busy": worker.job is not None,
+                "seconds_since_seen": round(now - worker.last_seen, 1),
+                "restarts": worker.restarts,
+                "completed": worker.completed,
+            } for worker in self._workers]
+
+    def memory(self):
+        """RAM and VRAM of the worker processes, as (ram_bytes, vram_bytes)."""
+        with self._lock:
+            workers = [(w.process.pid, w.vram_bytes) for w in self._workers if w.process and w.process.is_alive()]
+        return sum(process_rss_bytes(pid) for pid, _ in workers), sum(vram for _, vram in workers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "ready_workers": sum(w.ready for w in self._workers),
+                "queued": len(self._pending),
+                "completed": self.completed,
+                "characters": self.characters,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "batches": self.batches,
+                "restarts": sum(w.restarts for w in self._workers),
+                "busy_seconds": round(sum(w.busy_seconds for w in self._workers), 3),
+            }
+
+    # ---------- Supervisor ----------
+
+    def _spawn(self, worker):
+        worker.inbox = self._ctx.Queue()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, self.backend, self.backend_options, self.warmup, worker.inbox, self._outbox),
+            name=f"tts-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.ready = False
+        worker.job = None
+        worker.last_seen = time.monotonic()
+        worker.process.start()
+
+    def _supervise(self):
+        while True:
+            send_by = self._send_by
+            # Wake up in time to send a batch whose wait ran out
+            timeout = min(1.0, max(0.0, send_by - time.monotonic())) if send_by is not None else 1.0
+            try:
+                message = self._outbox.get(timeout=timeout)
+            except queue.Empty:
+                message = None
+            with self._lock:
+                if self._closed:
+                    return
+                if message is not None and message[0] != "wakeup":
+                    self._handle(*message)
+                self._check_workers()
+                self._dispatch()
+
+    def _handle(self, kind, worker_id, job_id, value):
+        worker = self._workers[worker_id]
+        worker.last_seen = time.monotonic()
+        if kind == "ready":
+            worker.ready = True
+            worker.crash_streak = 0
+            worker.device = value["device"]
+            worker.vram_bytes = value["vram_bytes"]
+            self._ready.set()
+            print(f"🔊 TTS worker {worker_id} ready on {value['device']} (pid {value['pid']}): "
+                  f"loaded in {value['load_seconds']:.1f}s, warm-up {value['warmup_seconds']:.1f}s")
+        elif kind == "failed":
+            # Restarting would fail the same way, so leave this slot down
+            worker.disabled = True
+            print(f"❌ TTS worker {worker_id} could not load its model: {value}")
+        elif kind == "done":
+            if worker.job != job_id:
+                # Late result from a batch we already gave up on
+                for outcome, result in value:
+                    if outcome == "done":
+                        _import_samples(*result)
+                return
+            worker.job = None
+            self._pending.finish(job_id)
+            worker.completed += len(job_id)
+            worker.busy_seconds += time.monotonic() - worker.job_started
+            TTS_JOB_SECONDS.observe(time.monotonic() - worker.job_started)
+            for one_id, (outcome, result) in zip(job_id, value):
+                future, payload, _ = self._jobs.pop(one_id)
+                if outcome == "done":
+                    self.completed += 1
+                    self.characters += len(payload["text"])
+                    future.set_result(_import_samples(*result))
+                else:
+                    self.failed += 1
+                    future.set_exception(RuntimeError(f"TTS worker {worker_id}: {result}"))
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker in self._workers:
+            if worker.disabled:
+                continue
+            if not worker.process.is_alive():
+                self._restart(worker, f"exited with code {worker.process.exitcode}")
+            elif worker.job is not None and now - worker.job_started > self.job_timeout:
+                self._restart(worker, f"job exceeded {self.job_timeout:.0f}s", retry=False)
+            elif worker.ready and worker.job is None and now - worker.last_seen > self.heartbeat_timeout:
+                self._restart(worker, "stopped sending heartbeats")
+
+    def _restart(self, worker, reason, retry=True):
+        print(f"⚠️ Restarting TTS worker {worker.worker_id}: {reason}")
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(1.0)
+        self._pending.finish(worker.job or (), measured=False)
+        # Back to the front of the queue, under the request they were charged to
+        for job_id in worker.job or ():
+            future, payload, attempts = self._jobs[job_id]
+            if retry and attempts < self.max_retries:
+                self._jobs[job_id] = (future, payload, attempts + 1)
+                self._pending.push(job_id, payload, worker.tickets[job_id], retry=True)
+            else:
+                self._jobs.pop(job_id)
+                self.failed += 1
+                future.set_exception(RuntimeError(f"TTS worker {worker.worker_id} {reason}"))
+        worker.job = None
+        worker.restarts += 1
+        if not worker.ready:
+            worker.crash_streak += 1
+            if worker.crash_streak >= 3:
+                # Dies before it can load the model; restarting again will not help
+                worker.disabled = True
+                print(f"❌ TTS worker {worker.worker_id} keeps crashing on startup, leaving it down")
+                return
+        self._spawn(worker)
+
+    def _dispatch(self):
+        idle = [worker for worker in self._workers if worker.ready and worker.job is None]
+        waiting = self._send_by
+        self._send_by = None
+        while idle and self._pending:
+            batch = self._next_batch(len(idle))
+            if batch is None:
+                if self._send_by is not None and waiting is None:
+                    # The supervisor may be asleep for a second; it has to send this batch sooner
+                    self._outbox.put(("wakeup", None, None, None))
+                return
+            if not batch:
+                continue
+            worker = idle.pop(0)
+            worker.job = tuple(job_id for job_id, _, _ in batch)
+            worker.tickets = {job_id: ticket for job_id, _, ticket in batch}
+            worker.job_started = time.monotonic()
+            worker.inbox.put((worker.job, [payload for _, payload, _ in batch]))
+            self.batches += 1
+            TTS_BATCH_SIZE.observe(len(batch))
+
+    def _next_batch(self, idle_workers):
+        """Take the job the schedule puts first and queued ones it can share a call with; None while the batch is filling."""
+        ordered = []
+        for job_id, payload in self._pending.ordered():
+            if self._jobs[job_id][0].cancelled():
+                # Cancelled while queued
+                self._pending.drop(job_id)
+                self._jobs.pop(job_id)
+                self.cancelled += 1
+            else:
+                ordered.append((job_id, payload))
+        if not ordered:
+            return None
+        key = _batch_key(ordered[0][1])
+        compatible = [(job_id, payload) for job_id, payload in ordered if _batch_key(payload) == key]
+        now = time.monotonic()
+        send_by = self._pending.queued_at(compatible[0][0]) + self.max_wait
+        if len(compatible) < self.max_batch and now < send_by:
+            self._send_by = send_by
+            return None
+        # Keep every idle worker busy before making batches bigger
+        size = min(self.max_batch, math.ceil(len(compatible) / idle_workers))
+        batch = []
+        for job_id, payload in compatible[:size]:
+            future = self._jobs[job_id][0]
+            # Jobs retried after a crash are running already. Marked running before the queue
+            # charges the job to its request, so a job cancelled just now is never charged
+            if not (future.running() or future.set_running_or_notify_cancel()):
+                self._pending.drop(job_id)
+                self._jobs.pop(job_id)
+                self.cancelled += 1
+                continue
+            TTS_QUEUE_WAIT.observe(now - self._pending.queued_at(job_id))
+            ticket = self._pending.ticket(job_id)
+            self._pending.take(job_id)
+            batch.append((job_id, payload, ticket))
+        return batch
@@ -0,0 +1,212 @@
+# Order in which queued TTS segments from concurrent requests are synthesized
+import contextvars
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# fifo: in submission order. round-robin: one segment per request in turn.
+# srpt: the request with the least estimated work left first. priority: by
+# the request's priority class, then in submission order.
+TTS_SCHEDULE = os.environ.get("TTS_SCHEDULE", "srpt")
+# No request goes longer than this without a segment served, whatever the policy says
+TTS_MAX_SEGMENT_WAIT = float(os.environ.get("TTS_MAX_SEGMENT_WAIT", "60"))
+
+POLICIES = ("fifo", "round-robin", "srpt", "priority")
+# Sent by clients as the story-priority gRPC metadata; jobs default to batch
+PRIORITY_CLASSES = {"interactive": 0, "standard": 1, "batch": 2}
+# Characters of synthesized text to expect per paragraph level while the story is still being written
+EXPECTED_CHARACTERS = {"short": 2000, "medium": 3600, "long": 5400}
+
+if TTS_SCHEDULE not in POLICIES:
+    raise ValueError(f"unknown TTS_SCHEDULE {TTS_SCHEDULE!r}; use one of {', '.join(POLICIES)}")
+
+_current = contextvars.ContextVar("tts_ticket", default=None)
+# Tickets of the requests running now, for estimating the TTS work ahead of a new one
+_active = set()
+_active_lock = threading.Lock()
+
+
+class WorkTicket:
+    """What the scheduler knows about one request's TTS work.
+
+    ``expected_chars`` starts as an estimate, is raised to the characters
+    submitted so far when the story runs past it, and is replaced by the
+    real total once the whole story is known; ``done_chars`` grows as the
+    request's segments are handed to a worker.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, priority="standard", expected_chars=0):
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"unknown priority {priority!r}; use one of {', '.join(PRIORITY_CLASSES)}")
+        self.request_id = next(self._ids)
+        self.priority = priority
+        self.expected_chars = expected_chars
+        self.done_chars = 0
+        # Round-robin turn of the request's last served segment
+        self.turn = 0
+        # When the request last had a segment served, or first queued one
+        self.served_at = None
+
+    @property
+    def remaining_chars(self):
+        return max(0, self.expected_chars - self.done_chars)
+
+
+def current_ticket():
+    return _current.get()
+
+
+@contextmanager
+def scheduling(ticket):
+    """Make ``ticket`` the one TTS segments submitted in this context are scheduled under."""
+    token = _current.set(ticket)
+    with _active_lock:
+        _active.add(ticket)
+    try:
+        yield ticket
+    finally:
+        with _active_lock:
+            _active.discard(ticket)
+        _current.reset(token)
+
+
+def work_ahead(priority="standard", expected_chars=0, policy=TTS_SCHEDULE):
+    """Characters the running requests will have synthesized before a new request's last segment.
+
+    Under srpt only requests with less work left go first; under priority,
+    those of the same or a higher class; round-robin shares the worker, so
+    each takes up to as much as the new request needs. Aging is ignored.
+    """
+    with _active_lock:
+        tickets = list(_active)
+    if policy == "srpt":
+        return sum(t.remaining_chars for t in tickets if t.remaining_chars <= expected_chars)
+    if policy == "priority":
+        rank = PRIORITY_CLASSES[priority]
+        return sum(t.remaining_chars for t in tickets if PRIORITY_CLASSES[t.priority] <= rank)
+    if policy == "round-robin":
+        return sum(min(t.remaining_chars, expected_chars) for t in tickets)
+    return sum(t.remaining_chars for t in tickets)
+
+
+class SegmentQueue:
+    """Queued TTS jobs, handed out in the order of a scheduling policy.
+
+    Jobs belong to a ``WorkTicket``; jobs submitted without one each count
+    as a request of their own. Jobs put back after a worker crash go first.
+
+    Aging puts a request first before it has waited ``max_wait``: by the
+    time the segments running on the ``workers``, one segment each of the
+    requests served longer ago and one more segment are done. Those times come from the seconds
+    per character of finished jobs, which the caller reports with
+    ``finish``; until the first report, aging waits the full ``max_wait``.
+    """
+    ALPHA = 0.2
+
+    def __init__(self, policy=TTS_SCHEDULE, max_wait=TTS_MAX_SEGMENT_WAIT, clock=time.monotonic, workers=1):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}; use one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.max_wait = max_wait
+        self.clock = clock
+        self.workers = max(1, workers)
+        self.seconds_per_char = None
+        self._entries = {}
+        # Taken jobs until they finish: job_id -> (characters, taken at)
+        self._running = {}
+        self._seq = itertools.count()
+        self._turns = itertools.count(1)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, job_id, payload, ticket=None, retry=False):
+        ticket = ticket or WorkTicket()
+        now = self.clock()
+        if ticket.served_at is None:
+            ticket.served_at = now
+        self._entries[job_id] = (payload, ticket, now, next(self._seq), retry)
+
+    def queued_at(self, job_id):
+        return self._entries[job_id][2]
+
+    def ticket(self, job_id):
+        return self._entries[job_id][1]
+
+    def take(self, job_id):
+        """Remove a job that is handed to a worker and charge it to its request."""
+        payload, ticket, _, _, retry = self._entries.pop(job_id)
+        if not retry:
+            # A retried job was charged when it first ran
+            ticket.done_chars += len(payload["text"])
+        ticket.turn = next(self._turns)
+        ticket.served_at = self.clock()
+        self._running[job_id] = (len(payload["text"]), ticket.served_at)
+        return payload
+
+    def finish(self, job_ids, measured=True):
+        """Forget taken jobs that are done; ``measured`` ones, run together, update the seconds per character."""
+        started = [self._running.pop(job_id) for job_id in job_ids if job_id in self._running]
+        chars = sum(c for c, _ in started)
+        if not measured or not chars:
+            return
+        rate = (self.clock() - min(t for _, t in started)) / chars
+        if self.seconds_per_char is None:
+            self.seconds_per_char = rate
+        else:
+            self.seconds_per_char += self.ALPHA * (rate - self.seconds_per_char)
+
+    def drop(self, job_id):
+        self._entries.pop(job_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._running.clear()
+
+    def ordered(self):
+        """Queued ``(job_id, payload)`` pairs, the next one to run first."""
+        aged = self._aged(self.clock())
+        return [(job_id, entry[0]) for job_id, entry in
+                sorted(self._entries.items(), key=lambda item: self._rank(item[1], aged))]
+
+    def _aged(self, now):
+        """Tickets that must go next so they start within ``max_wait`` of their last served segment."""
+        rate = self.seconds_per_char or 0.0
+        # Until a worker is free, then the retried jobs, which go first
+        ahead = 0.0
+        if len(self._running) >= self.workers:
+            ahead = min(max(0.0, taken + chars * rate - now) for chars, taken in self._running.values())
+        first = {}
+        for payload, ticket, _, seq, retry in self._entries.values():
+            if retry:
+                ahead += len(payload["text"]) * rate / self.workers
+            elif ticket not in first or seq < first[ticket][0]:
+                first[ticket] = (seq, len(payload["text"]))
+        # A job picked by the policy instead may start before the oldest ticket's turn
+        ahead += max((chars for _, chars in first.values()), default=0) * rate / self.workers
+        # Aged tickets go oldest first, so a ticket that is due needs every older one aged with it
+        tickets = sorted(first, key=lambda t: t.served_at)
+        due = 0
+        for i, ticket in enumerate(tickets):
+            if now + ahead - ticket.served_at >= self.max_wait:
+                due = i + 1
+            ahead += first[ticket][1] * rate / self.workers
+        return set(tickets[:due])
+
+    def _rank(self, entry, aged):
+        payload, ticket, queued_at, seq, retry = entry
+        if retry:
+            return 0, 0, seq
+        if ticket in aged:
+            # Aging: whatever the policy, no request goes longer than max_wait without progress
+            return 1, ticket.served_at, seq
+        if self.policy == "round-robin":
+            return 2, ticket.turn, seq
+        if self.policy == "srpt":
+            return 2, max(ticket.remaining_chars, len(payload["text"])), seq
+        if self.policy == "priority":
+            return 2, PRIORITY_CLASSES[ticket.priority], seq
+        return 2, 0, seq
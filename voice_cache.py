@@ -0,0 +1,149 @@
+# Voice latent cache for XTTS
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+VOICE_CACHE_DIR = os.environ.get("VOICE_CACHE_DIR", "voice_cache")
+VOICE_CACHE_SIZE = int(os.environ.get("VOICE_CACHE_SIZE", "32"))
+
+
+def hash_audio_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_path_hashes = {}
+_path_hashes_lock = threading.Lock()
+
+
+def audio_file_key(path):
+    """SHA-256 of a voice file, re-hashed only when its size or mtime changes."""
+    stat = os.stat(path)
+    fingerprint = (stat.st_size, stat.st_mtime_ns)
+    with _path_hashes_lock:
+        cached = _path_hashes.get(path)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    key = hash_audio_file(path)
+    with _path_hashes_lock:
+        _path_hashes[path] = (fingerprint, key)
+    return key
+
+
+class VoiceLatentCache:
+    """Caches XTTS conditioning latents per reference voice.
+
+    Entries are keyed by the SHA-256 of the audio bytes, so the same voice
+    uploaded under another name (or re-recorded to the same file) maps to one
+    entry. Latents live in an in-memory LRU and are persisted as ``.npy``
+    files that are memory-mapped back in after a restart.
+    """
+
+    def __init__(self, model, cache_dir=VOICE_CACHE_DIR, max_entries=VOICE_CACHE_SIZE):
+        self.model = model
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, speaker_path):
+        return audio_file_key(speaker_path)
+
+    def get(self, speaker_path):
+        key = self.key_for(speaker_path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Only one thread computes a given voice; the others wait and reuse it
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    return self._entries[key]
+            latents = self._load(key)
+            if latents is not None:
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                latents = self._compute(speaker_path)
+                self._save(key, latents)
+                with self._lock:
+                    self.misses += 1
+            self._put(key, latents)
+            with self._lock:
+                self._key_locks.pop(key, None)
+            return latents
+
+    def preload(self, speaker_paths):
+        for path in speaker_paths:
+            if os.path.exists(path):
+                self.get(path)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _put(self, key, latents):
+        with self._lock:
+            self._entries[key] = latents
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _compute(self, speaker_path):
+        config = self.model.config
+        return self.model.get_conditioning_latents(
+            audio_path=[speaker_path],
+            gpt_cond_len=config.gpt_cond_len,
+            gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+            max_ref_length=config.max_ref_len,
+            sound_norm_refs=config.sound_norm_refs,
+        )
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.gpt.npy", f"{base}.spk.npy"
+
+    def _load(self, key):
+        import torch
+
+        gpt_path, spk_path = self._paths(key)
+        if not (os.path.exists(gpt_path) and os.path.exists(spk_path)):
+            return None
+        try:
+            gpt = np.load(gpt_path, mmap_mode="r")
+            spk = np.load(spk_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        device = self.model.device
+        return torch.tensor(gpt, device=device), torch.tensor(spk, device=device)
+
+    def _save(self, key, latents):
+        gpt_path, spk_path = self._paths(key)
+        for tensor, path in zip(latents, (gpt_path, spk_path)):
+            # Write then rename so a crash never leaves a truncated entry behind
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, tensor.detach().cpu().numpy())
+            os.replace(tmp_path, path)
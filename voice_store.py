@@ -0,0 +1,178 @@
+# Content-addressed store for uploaded reference voices, preprocessed for XTTS on ingest
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+import wave
+from functools import lru_cache
+
+import numpy as np
+
+from audio_assembly import encode_wav, trim_silence
+from audio_encoding import FFMPEG_BINARY, FfmpegUnavailable
+from voice_cache import audio_file_key
+
+VOICE_UPLOAD_DIR = os.environ.get("VOICE_UPLOAD_DIR", os.path.join("voices", "uploads"))
+# XTTS conditions on at most 30 s of reference audio (max_ref_len) and needs a
+# few seconds of speech to clone a voice
+VOICE_MAX_SECONDS = float(os.environ.get("VOICE_MAX_SECONDS", "30"))
+VOICE_MIN_SECONDS = float(os.environ.get("VOICE_MIN_SECONDS", "3"))
+VOICE_MAX_UPLOAD_MB = int(os.environ.get("VOICE_MAX_UPLOAD_MB", "50"))
+SPEAKERS_JSON = os.path.join("voices", "speakers.json")
+
+# XTTS loads reference audio at 22.05 kHz mono, so stored voices need no resampling per call
+VOICE_SAMPLE_RATE = 22050
+
+
+def preprocess_voice(data, sample_rate=VOICE_SAMPLE_RATE, max_seconds=VOICE_MAX_SECONDS, min_seconds=VOICE_MIN_SECONDS):
+    """Decode any audio ffmpeg reads to mono ``sample_rate`` int16, without leading and trailing silence.
+
+    Recordings longer than ``max_seconds`` are cut there; raises ValueError
+    when the audio cannot be decoded or less than ``min_seconds`` of it is
+    left, and FfmpegUnavailable when ffmpeg cannot be run at all.
+    """
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"],
+            input=data, capture_output=True
+        )
+    except OSError as e:
+        raise FfmpegUnavailable(f"ffmpeg unavailable: cannot run {FFMPEG_BINARY!r} to decode speaker audio: {e}") from e
+    if result.returncode != 0:
+        raise ValueError(f"could not decode speaker audio: {result.stderr.decode(errors='replace').strip()}")
+    samples = trim_silence(np.frombuffer(result.stdout, dtype=np.int16), sample_rate=sample_rate)
+    samples = samples[:int(max_seconds * sample_rate)]
+    if len(samples) < min_seconds * sample_rate:
+        raise ValueError(f"speaker audio has {len(samples) / sample_rate:.1f}s of speech; "
+                         f"at least {min_seconds:g}s is needed")
+    return samples
+
+
+def wav_info(path):
+    """Duration in seconds and sample rate of a WAV file; zeros when it cannot be read."""
+    try:
+        with wave.open(path, "rb") as f:
+            return round(f.getnframes() / f.getframerate(), 3), f.getframerate()
+    except (OSError, EOFError, wave.Error):
+        return 0.0, 0
+
+
+class VoiceStore:
+    """Reference voices by ID: the built-in ones listed in speakers.json and uploads.
+
+    An upload is preprocessed (see ``preprocess_voice``) and saved as
+    ``<id>.wav``, the ID being the SHA-256 of the processed file, so
+    uploads that come out the same are stored once. The SHA-256 of each raw
+    upload is remembered too, so sending the same bytes again costs a hash
+    instead of a decode. A built-in voice's ID is the SHA-256 of its file.
+    Names and sizes are kept in ``index.json`` next to the files.
+    """
+
+    def __init__(self, directory=VOICE_UPLOAD_DIR, speakers_json=SPEAKERS_JSON):
+        self.directory = directory
+        self.speakers_json = speakers_json
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._voices = {}
+        self._uploads = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r") as f:
+                self._voices = json.load(f)
+        for voice_id, record in self._voices.items():
+            for digest in record["uploads"]:
+                self._uploads[digest] = voice_id
+
+    def add(self, data, name=""):
+        """Store an uploaded voice and return its record; a voice stored before is returned as it was."""
+        if len(data) > VOICE_MAX_UPLOAD_MB * 1024 * 1024:
+            raise ValueError(f"speaker audio is larger than {VOICE_MAX_UPLOAD_MB} MB")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            voice_id = self._uploads.get(digest)
+        if voice_id is None:
+            wav = encode_wav([preprocess_voice(data)], VOICE_SAMPLE_RATE)
+            voice_id = hashlib.sha256(wav).hexdigest()
+            path = self.path_for(voice_id)
+            if not os.path.exists(path):
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(wav)
+                os.replace(tmp_path, path)
+        with self._lock:
+            record = self._voices.setdefault(voice_id, {
+                "name": "", "duration_seconds": wav_info(self.path_for(voice_id))[0],
+                "created_at": time.time(), "uploads": [],
+            })
+            changed = digest not in record["uploads"]
+            if changed:
+                record["uploads"].append(digest)
+                self._uploads[digest] = voice_id
+            if name and not record["name"]:
+                # Voices sent inline with a request have no name until someone uploads them with one
+                record["name"] = name
+                changed = True
+            if changed:
+                self._save()
+            return self._record(voice_id, record)
+
+    def path_for(self, voice_id):
+        return os.path.join(self.directory, f"{voice_id}.wav")
+
+    def path(self, voice_id):
+        """The file of a stored or built-in voice; raises KeyError for an unknown ID."""
+        with self._lock:
+            if voice_id in self._voices:
+                return self.path_for(voice_id)
+        for record in self.builtin():
+            if record["voice_id"] == voice_id:
+                return record["path"]
+        raise KeyError(voice_id)
+
+    def builtin(self):
+        if not os.path.exists(self.speakers_json):
+            return []
+        with open(self.speakers_json, "r") as f:
+            speakers = json.load(f)
+        voices = []
+        for name, path in speakers.items():
+            if os.path.exists(path):
+                duration, sample_rate = wav_info(path)
+                voices.append({"voice_id": audio_file_key(path), "name": name.strip(), "path": path,
+                               "duration_seconds": duration, "sample_rate": sample_rate,
+                               "created_at": 0.0, "builtin": True})
+        return voices
+
+    def list(self):
+        """Built-in voices, then named uploads, oldest first."""
+        with self._lock:
+            uploaded = [self._record(voice_id, record) for voice_id, record in self._voices.items() if record["name"]]
+        return self.builtin() + sorted(uploaded, key=lambda record: record["created_at"])
+
+    def _record(self, voice_id, record):
+        return {"voice_id": voice_id, "name": record["name"], "path": self.path_for(voice_id),
+                "duration_seconds": record["duration_seconds"], "sample_rate": VOICE_SAMPLE_RATE,
+                "created_at": record["created_at"], "builtin": False}
+
+    def _save(self):
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._voices, f, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+
+@lru_cache(maxsize=1)
+def voice_store():
+    """The process's store, opened on first use rather than when the module is imported.
+
+    TTS workers import the server module too, and have no use for it.
+    """
+    return VoiceStore()
+
+
+def store_voice(data):
+    """Store audio sent inline with a request and return the path of its preprocessed file."""
+    return voice_store().add(data)["path"]